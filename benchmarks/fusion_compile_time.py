@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Compile time of the NumPy transformer with and without fusion, as the graph grows.
+
+The graph is the training step of a recurrent network unrolled over more and more
+time steps. For each size, the number of ops, the time to transform the computation
+without and with fusion, and the number of kernels are printed.
+
+Run it using
+
+python benchmarks/fusion_compile_time.py --steps 10 20 50 100
+
+"""
+from __future__ import division
+from __future__ import print_function
+import argparse
+import time
+
+from ngraph.transformers.nptransform import NumPyTransformer
+from models import rnn_training_step
+
+
+def compile_time(steps, fusion):
+    """
+    Returns:
+        The seconds taken to transform the training step, and the transformer.
+    """
+    results, inputs = rnn_training_step(steps)
+    transformer = NumPyTransformer(fusion=fusion)
+    transformer.computation(results, *inputs)
+    start = time.time()
+    transformer.initialize()
+    return time.time() - start, transformer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, nargs='+', default=[10, 20, 50, 100],
+                        help='Numbers of time steps the network is unrolled over')
+    args = parser.parse_args()
+
+    print('{:>6} {:>6} {:>10} {:>10} {:>8}'.format(
+        'steps', 'ops', 'unfused s', 'fused s', 'kernels'))
+    for steps in args.steps:
+        unfused_time, unfused = compile_time(steps, None)
+        fused_time, fused = compile_time(steps, True)
+        print('{:>6} {:>6} {:>10.2f} {:>10.2f} {:>8}'.format(
+            steps, len(unfused.ops), unfused_time, fused_time, len(fused.ops)))
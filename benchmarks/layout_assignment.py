@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Dimshuffle copies of the training step of an MLP on the NumPy transformer, with and
+without the LayoutAssignment pass, when dots are reduced to matrix products, and when
+they are computed by TensorDot.
+
+For each setting, the Dimshuffle copies left in the graph, the copies and bytes the
+pass eliminated, and the time of a training step are printed.
+
+Run it using
+
+python benchmarks/layout_assignment.py --batch-size 128 --iterations 20
+
+"""
+from __future__ import division
+from __future__ import print_function
+import argparse
+import time
+
+import numpy as np
+import ngraph as ng
+from ngraph.op_graph.op_graph import Dimshuffle, Op
+from ngraph.transformers.nptransform import NumPyTransformer
+from ngraph.transformers.passes.passes import NativeTensorDot
+
+
+def mlp_training_step(batch_size):
+    """
+    Builds the training step of an MLP.
+
+    Returns:
+        The ops computed, and the placeholders.
+    """
+    layers = [ng.make_axis(length, name='L{}'.format(i))
+              for i, length in enumerate([784, 1024, 512, 256, 128, 10])]
+    N = ng.make_axis(batch_size, name='N', batch=True)
+    x = ng.placeholder([layers[0], N])
+    y = ng.placeholder([layers[-1], N])
+    weights = []
+    h = x
+    for i, (F, H) in enumerate(zip(layers, layers[1:])):
+        w = ng.variable([H, F - 1], initial_value=0.01)
+        weights.append(w)
+        h = ng.dot(w, h)
+        h = ng.tanh(h) if i < len(layers) - 2 else ng.softmax(h)
+    cost = ng.sum(ng.cross_entropy_multi(h, y), out_axes=())
+    updates = [ng.assign(w, w - 0.01 * ng.deriv(cost, w)) for w in weights]
+    return [cost, ng.doall(updates)], [x, y]
+
+
+def run(batch_size, iterations, native_dot, layout_assignment):
+    """
+    Returns:
+        The transformer, and the seconds taken by a training step.
+    """
+    results, inputs = mlp_training_step(batch_size)
+    transformer = NumPyTransformer()
+    if not native_dot:
+        transformer.graph_passes = [graph_pass for graph_pass in transformer.graph_passes
+                                    if not isinstance(graph_pass, NativeTensorDot)]
+    if not layout_assignment:
+        transformer.graph_passes.remove(transformer.layout_assignment)
+    computation = transformer.computation(results, *inputs)
+    values = [np.random.uniform(size=x.axes.lengths).astype(np.float32) for x in inputs]
+    computation(*values)
+    start = time.time()
+    for _ in range(iterations):
+        computation(*values)
+    return transformer, (time.time() - start) / iterations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{:>8} {:>8} {:>9} {:>11} {:>14} {:>10}'.format(
+        'dots', 'layout', 'shuffles', 'eliminated', 'bytes saved', 'step s'))
+    for native_dot, layout_assignment in ((False, False), (False, True), (True, True)):
+        transformer, step_time = run(args.batch_size, args.iterations, native_dot,
+                                     layout_assignment)
+        shuffles = [op for op in Op.ordered_ops(transformer.ops) if isinstance(op, Dimshuffle)]
+        print('{:>8} {:>8} {:>9} {:>11} {:>14} {:>10.4f}'.format(
+            'native' if native_dot else 'matrix', 'on' if layout_assignment else 'off',
+            len(shuffles),
+            transformer.layout_assignment.shuffles_eliminated,
+            transformer.layout_assignment.bytes_eliminated, step_time))
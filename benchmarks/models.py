@@ -0,0 +1,46 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Graphs built by several benchmarks.
+
+The benchmarks are run as scripts from the repository root, and import these from
+the directory of the script, e.g.
+
+from models import rnn_training_step
+
+"""
+import numpy as np
+import ngraph as ng
+
+
+def rnn_training_step(steps):
+    """
+    Builds the training step of a recurrent network unrolled over steps.
+
+    Returns:
+        The ops computed, and the placeholders.
+    """
+    H = ng.make_axis(64, name='H')
+    F = ng.make_axis(32, name='F')
+    N = ng.make_axis(8, name='N', batch=True)
+    W = ng.variable([H, H - 1], initial_value=0.01)
+    U = ng.variable([H, F - 1], initial_value=0.01)
+    inputs = [ng.placeholder([F, N]) for _ in range(steps)]
+    h = ng.constant(np.zeros((H.length, N.length)), [H, N])
+    for x in inputs:
+        h = ng.tanh(ng.dot(W, h) + ng.dot(U, x))
+    cost = ng.sum(h, out_axes=())
+    updates = [ng.assign(v, v - 0.01 * ng.deriv(cost, v)) for v in (W, U)]
+    return [cost, ng.doall(updates)], inputs
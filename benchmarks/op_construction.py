@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Op construction throughput, with and without capturing debug info.
+
+The graph is the training step of a recurrent network unrolled over time steps,
+including the ops made by adjoints. For each setting, the number of ops built, the
+time to build them, and the ops built per second are printed.
+
+Run it using
+
+python benchmarks/op_construction.py --steps 50 --repeats 3
+
+"""
+from __future__ import division
+from __future__ import print_function
+import argparse
+import time
+
+from ngraph.op_graph.op_graph import DebugInfo, Op
+from models import rnn_training_step
+
+
+def build_time(steps, capture):
+    """
+    Returns:
+        The number of ops built, and the seconds taken to build them.
+    """
+    DebugInfo.capture = capture
+    try:
+        start = time.time()
+        with Op.all_ops() as ops:
+            rnn_training_step(steps)
+        return len(ops), time.time() - start
+    finally:
+        DebugInfo.capture = True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, default=50,
+                        help='Number of time steps the network is unrolled over')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print('{:>8} {:>8} {:>8} {:>10}'.format('capture', 'ops', 'build s', 'ops/s'))
+    for capture in (True, False):
+        op_count, seconds = min((build_time(args.steps, capture)
+                                 for _ in range(args.repeats)), key=lambda result: result[1])
+        print('{:>8} {:>8} {:>8.3f} {:>10.0f}'.format(
+            'on' if capture else 'off', op_count, seconds, op_count / seconds))
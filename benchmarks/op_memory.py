@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Memory taken by each op of a graph.
+
+The graph is the training step of a recurrent network unrolled over time steps,
+including the ops made by adjoints. For each size, the number of ops, the memory
+allocated while building them, and the bytes per op are printed.
+
+This needs Python 3, for tracemalloc.
+
+Run it using
+
+python benchmarks/op_memory.py --steps 10 50 100
+
+"""
+from __future__ import division
+from __future__ import print_function
+import argparse
+import gc
+import tracemalloc
+
+from ngraph.op_graph.op_graph import Op
+from models import rnn_training_step
+
+
+def graph_memory(steps):
+    """
+    Returns:
+        The number of ops built, and the bytes still allocated once they are built.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with Op.all_ops() as ops:
+            graph = rnn_training_step(steps)
+        gc.collect()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del graph
+    return len(ops), allocated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, nargs='+', default=[10, 50, 100],
+                        help='Numbers of time steps the network is unrolled over')
+    args = parser.parse_args()
+
+    print('{:>6} {:>8} {:>12} {:>10}'.format('steps', 'ops', 'bytes', 'bytes/op'))
+    for steps in args.steps:
+        op_count, allocated = graph_memory(steps)
+        print('{:>6} {:>8} {:>12} {:>10.0f}'.format(
+            steps, op_count, allocated, allocated / op_count))
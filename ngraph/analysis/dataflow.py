@@ -55,12 +55,24 @@ class DataFlowGraph(Digraph):
         Arguments:
           results(dict): Results of the desired computation
         """
-        if w not in self.successors:
-            self.successors[w] = OrderedSet()
-        for v in w.other_deps + list(w.args):
-            if v not in self.successors:
-                self._fill_successors(v)
-            self.successors[v].add(w)
+        successors = self.successors
+        if w not in successors:
+            successors[w] = OrderedSet()
+        stack = [iter(list(w.other_deps) + list(w.args))]
+        users = [w]
+        while stack:
+            for v in stack[-1]:
+                if v not in successors:
+                    successors[v] = OrderedSet()
+                    successors[v].add(users[-1])
+                    stack.append(iter(list(v.other_deps) + list(v.args)))
+                    users.append(v)
+                    break
+                successors[v].add(users[-1])
+            else:
+                stack.pop()
+                users.pop()
+        self.invalidate()
 
     @property
     def instructions(self):
@@ -68,38 +80,86 @@ class DataFlowGraph(Digraph):
 
         return self.topsort()
 
-    def liveness(self):
+    def live_segments(self):
         """
-        Liveness analysis. The goal is to find, at each program point
-        (i.e., instruction line number), which tensors need to be in
-        memory (because they will be required later on).
+        Liveness analysis as segments of the instruction order. A tensor is live from
+        its definition to its last use, so each tensor is live over a few segments,
+        and the analysis takes time linear in the number of definitions and uses
+        instead of in the total size of the live sets.
 
         Returns:
-          dict (op => set(tensor_description)): Live tensors at each point
+          order (list): The instructions
+          persistent (set(tensor_description)): Tensors live at every instruction
+          segments (dict tensor_description => list((int, int))): For the other
+            tensors, the first and last indices of the instructions of each segment
+            where the tensor is live. Each tensor is also live at the instructions
+            using it, as in-place updates are not possible.
         """
-
-        can_do_inplace = lambda x: False
         order = self.instructions
-        if len(order) == 0:
-            return {}
-
-        # Initialize
-        liveness = dict((op, set()) for op in order)
         persistent = base_tensor_descriptions(
             (x for x in self.successors if x.persistent),
         )
-        results = base_tensor_descriptions(self.results)
-        liveness[order[-1]] = results | persistent
-        # Update
-        for current, previous in reversed(list(zip(order[1:], order[:-1]))):
-            use = base_tensor_descriptions(current.args)
-            defs = base_tensor_descriptions(current.defs)
-            liveness[previous] = use | (liveness[current] - defs) | persistent
+        segments = defaultdict(list)
+        if len(order) == 0:
+            return order, persistent, segments
+
+        # Walk backwards, remembering where each live tensor stops being live
+        ends = dict((x, len(order) - 1)
+                    for x in base_tensor_descriptions(self.results) - persistent)
+        for i in range(len(order) - 1, 0, -1):
+            current = order[i]
+            # Arguments an instruction defines are written, not read, by it
+            use = base_tensor_descriptions(
+                arg for arg in current.args if arg not in current.defs) - persistent
+            for x in base_tensor_descriptions(current.defs) - use:
+                end = ends.pop(x, None)
+                if end is not None:
+                    segments[x].append((i, end))
+            for x in use:
+                if x not in ends:
+                    ends[x] = i - 1
+        for x, end in ends.items():
+            segments[x].append((0, end))
         # Inplace not possible
-        for op in order:
-            if not can_do_inplace(op):
-                liveness[op] |= base_tensor_descriptions(op.args)
+        for i, op in enumerate(order):
+            for x in base_tensor_descriptions(op.args) - persistent:
+                segments[x].append((i, i))
+        return order, persistent, segments
+
+    def live_masks(self):
+        """
+        Liveness analysis as a bitset of instruction indices per tensor.
+
+        Returns:
+          order (list): The instructions; bit i of a mask is order[i]
+          masks (dict tensor_description => int): The instructions at which each
+            tensor is live
+        """
+        order, persistent, segments = self.live_segments()
+        if len(order) == 0:
+            return order, dict()
+        everywhere = (1 << len(order)) - 1
+        masks = dict((x, everywhere) for x in persistent)
+        for x, spans in segments.items():
+            mask = 0
+            for start, end in spans:
+                mask |= ((1 << (end - start + 1)) - 1) << start
+            masks[x] = mask
+        return order, masks
+
+    def liveness(self):
+        """
+        Liveness analysis. The goal is to find, at each program point
+        (i.e., instruction line number), which tensors need to be in
+        memory (because they will be required later on).
 
-        # print max([sum(map(lambda x: reduce(mul, x.shapes, 1)*x.dtype.itemsize,
-        # l)) for l in liveness.itervalues()])*1024**-2
+        Returns:
+          dict (op => set(tensor_description)): Live tensors at each point
+        """
+        order, persistent, segments = self.live_segments()
+        liveness = dict((op, set(persistent)) for op in order)
+        for x, spans in segments.items():
+            for start, end in spans:
+                for op in order[start:end + 1]:
+                    liveness[op].add(x)
         return liveness
@@ -13,6 +13,8 @@
 # limitations under the License.
 # ----------------------------------------------------------------------------
 
+import heapq
+
 from ngraph.analysis.dataflow import DataFlowGraph
 from ngraph.util.graph import Digraph
 import ngraph as ng
@@ -78,6 +80,51 @@ def gpu_fusible(transformer, op1, op2):
     return False
 
 
+def cpu_fusible(transformer, op1, op2):
+    """
+    Fusion policies for the CPU
+
+    Chains of one dimensional elementwise operations over tensors of the same length
+    can be evaluated a chunk at a time, so that intermediate values stay in cache.
+    Views that keep the element order of their argument, such as the flattens and
+    unflattens around each elementwise operation, are aliases and can be fused too.
+
+    Arguments:
+      transformer: The transformer the graph is being fused for; unused on the CPU.
+      op1: An op computed before op2.
+      op2: An op that uses the value of op1.
+
+    Returns:
+      True if op1 and op2 walk the same number of elements in step, so they can
+      be evaluated in the same chunked loop.
+    """
+
+    def chunk_length(op):
+        """
+        Returns: The number of elements op walks in step, or None if op cannot be chunked.
+        """
+        if not isinstance(op, ng.TensorOp):
+            return None
+        td = op.tensor_description()
+        if isinstance(op, ng.ElementWise) and op.is_device_op:
+            if len(td.shape) > 1:
+                return None
+            # Arguments are either walked in step with the result or are scalars
+            for arg in op.args:
+                if arg.tensor_description().shape not in (td.shape, ()):
+                    return None
+            return td.shape
+        if isinstance(op, ng.ReshapeOp) and not op.is_device_op:
+            arg_td = op.args[0].tensor_description()
+            if td.c_contiguous and arg_td.c_contiguous and td.offset == arg_td.offset \
+                    and td.axes.size == arg_td.axes.size:
+                return (td.axes.size,)
+        return None
+
+    length = chunk_length(op1)
+    return length is not None and length == chunk_length(op2)
+
+
 class KernelFlowGraph(DataFlowGraph):
     """Class representing a fused dataflow graph"""
 
@@ -95,37 +142,81 @@ class KernelFlowGraph(DataFlowGraph):
                                               dataflow.results)
         self.fusible = lambda x, y: fusible(self.transformer, x, y)
         successors = self.successors
-        path_from, bad_path_from = self._compute_paths()
-        edges = {(a, b) for a, _ in successors.items() for b in _}
-        edges = sorted(edges, key=lambda x: (x[0].id, x[1].id))
-        clusters = dict((x, {x}) for e in edges for x in e)
+        path_from, bad_path_from, members = self._compute_paths()
+        predecessors = dict((x, set()) for x in successors)
+        for a, lst in successors.items():
+            for b in lst:
+                predecessors[b].add(a)
+        # Candidate edges, the one with the latest ops first
+        opids = self.transformer.opids
+        ops = dict((opids[x], x) for x in successors if x in opids)
+        edges = [(-opids[a], -opids[b]) for a, lst in successors.items() for b in lst]
+        heapq.heapify(edges)
+        # Union-find forest over ops, each tree rooted at the op naming its cluster
+        parent = dict((x, x) for x in successors)
+
+        def find(x):
+            root = x
+            while parent[root] is not root:
+                root = parent[root]
+            while parent[x] is not root:
+                parent[x], x = root, parent[x]
+            return root
+
         while edges:
-            # Pop edges and adjusts order if necessary
-            v, w = edges.pop()
+            a, b = heapq.heappop(edges)
+            v, w = ops[-a], ops[-b]
+            # Edge was merged away since it was queued
+            if v not in successors or w not in successors[v]:
+                continue
             # Cannot be fused
-            if w in bad_path_from[v]:
+            if bad_path_from[v] & members[w]:
                 continue
             # Merge vertices between v and w
-            to_merge = self.between(v, w, path_from)
-            for x in to_merge:
-                clusters[v] |= clusters.pop(x)
-                self.transfer_edges(v, x, successors)
-                self.transfer_edges(v, x, path_from)
-                self.transfer_edges(v, x, bad_path_from)
-            edges = {(a, b) for a, _ in successors.items() for b in _}
-            edges = sorted(edges, key=lambda x: (x[0].id, x[1].id))
+            for x in self.between(v, w, path_from, members):
+                parent[x] = v
+                members[v] |= members.pop(x)
+                path_from[v] |= path_from.pop(x)
+                bad_path_from[v] |= bad_path_from.pop(x)
+                for a, b in self.transfer_edges(v, x, predecessors):
+                    heapq.heappush(edges, (-opids[a], -opids[b]))
+        self.invalidate()
+        clusters = dict()
+        for x in dataflow.successors:
+            clusters.setdefault(find(x), []).append(x)
         # Creates adjacency list for each cluster
-        extract_subgraph = lambda R: dict(
-            (a, b & R) for a, b in list(dataflow.successors.items()) if a in R)
-        clusters = {x: extract_subgraph(y) for x, y in list(clusters.items())}
+        for x, y in list(clusters.items()):
+            R = set(y)
+            clusters[x] = dict((a, dataflow.successors[a] & R) for a in y)
         # Creates final adjacency list
-        clusters = {x: ng.Function(y) if x.is_device_op else x for x, y in list(clusters.items())}
+        clusters = {x: ng.Function(y) if x.is_device_op or len(y) > 1 else x
+                    for x, y in list(clusters.items())}
         self.successors = {
             clusters[a]: {clusters[b] for b in lst} for a, lst in list(
                 successors.items())}
+        # Maps every op to the kernel it was fused into
+        self.kernels = dict()
+        for x, kernel in clusters.items():
+            ops = kernel.instructions if isinstance(kernel, ng.Function) else [x]
+            for op in ops:
+                self.kernels[op] = kernel
         # Saves dataflow for visualization
         self.dataflow = dataflow
 
+    def can_reach(self, outs, order=None):
+        """
+        Computes the kernels that can reach the kernels containing the nodes in outs.
+
+        Arguments:
+          outs: list): nodes to reach
+          order: list): list specifying the order of the result kernels
+
+        Returns:
+          Ordered dependencies of outs
+        """
+        return super(KernelFlowGraph, self).can_reach(
+            [self.kernels.get(op, op) for op in outs], order=order)
+
     def _graphviz(self, name=''):
         """
         Export fused dataflow to graphviz.
@@ -173,21 +264,27 @@ class KernelFlowGraph(DataFlowGraph):
         """
         Computes useful data structures for fusion analysis.
 
-        path_from: maps node v to nodes that have a path from w
-        bad_path_from: map node v to nodes that have a bad path from w
+        Sets of nodes are bitsets, with one bit for each node in topological order.
+
+        path_from: maps node v to nodes that have a path from v
+        bad_path_from: map node v to nodes that have a bad path from v
+        members: maps node v to the set containing only v
 
         'bad_paths' are paths that can not be merged.
 
         Returns:
-          TODO
+          path_from, bad_path_from, members
         """
         path_from, bad_path_from = dict(), dict()
+        # Maps node v to the nodes reached from v through a reduction, by reduction axes
         reduction_paths = dict()
 
         order = self.topsort()
+        members = dict((v, 1 << i) for i, v in enumerate(order))
         for v in reversed(order):
-            path_from[v] = {v}
-            bad_path_from[v] = set()
+            path = members[v]
+            bad_path = 0
+            reduction_paths[v] = reductions = dict()
 
             if isinstance(v, ng.ReductionOp):
                 reduction = v.reduction_axes
@@ -195,65 +292,80 @@ class KernelFlowGraph(DataFlowGraph):
                 reduction = None
 
             for w in self.successors[v]:
-                path_from[v] |= path_from[w]
+                path |= path_from[w]
 
                 if self.fusible(v, w):
-                    for reachable in path_from[w]:
-                        path = (reachable, w)
-                        new_path = (reachable, v)
-
-                        if path in reduction_paths:
-                            if reduction is not None and reduction_paths[path] != reduction:
-                                bad_path_from[v] |= {reachable}
-                            else:
-                                reduction_paths[new_path] = reduction_paths[path]
-                        elif reduction is not None:
-                            reduction_paths[new_path] = reduction
-
-                    bad_path_from[v] |= bad_path_from[w]
+                    reduced = 0
+                    for axes, reachable in reduction_paths[w].items():
+                        reduced |= reachable
+                        if reduction is not None and axes != reduction:
+                            bad_path |= reachable
+                        else:
+                            reductions[axes] = reductions.get(axes, 0) | reachable
+                    if reduction is not None:
+                        reductions[reduction] = reductions.get(reduction, 0) | \
+                            (path_from[w] & ~reduced)
+
+                    bad_path |= bad_path_from[w]
                 else:
-                    bad_path_from[v] |= path_from[w]
-        return path_from, bad_path_from
+                    bad_path |= path_from[w]
+            path_from[v] = path
+            bad_path_from[v] = bad_path
+        return path_from, bad_path_from, members
 
-    def between(self, v, w, path_from):
+    def between(self, v, w, path_from, members):
         """
         Finds all the nodes on any path between v and w.
 
         Arguments:
           v (operation): start node
           w (operation): end_node
-          path_from: (dict): maps node v to nodes that have a path from w
+          path_from: (dict): maps node v to the bitset of nodes that have a path from v
+          members: (dict): maps node v to the bitset of the nodes merged into v
 
         Returns:
           set of vertices
         """
 
+        target = members[w]
         vertices = set()
         worklist = {w}
-        worklist |= {x for x in self.successors[v] if w in path_from[x]}
+        worklist |= {x for x in self.successors[v] if path_from[x] & target}
         while worklist:
             # Update worklist
             x = worklist.pop()
             if x != w:
-                worklist |= {y for y in self.successors[
-                    x] if w in path_from[y]}
+                worklist |= {y for y in self.successors[x]
+                             if y not in vertices and path_from[y] & target}
             # Add vertices
             vertices |= {x}
         return vertices
 
-    def transfer_edges(self, v, w, dct):
+    def transfer_edges(self, v, w, predecessors):
         """
         Transfers edges from a node into another
 
         Arguments:
           v: (operation): node that receives edges
           w: (operation): node that loses edges
-          dct: TODO
+          predecessors: (dict): maps each node to the nodes with an edge into it
+
+        Returns:
+          list of the edges that v gained
         """
 
-        dct[v] |= dct.pop(w, set()) - {v}
-        for node, connected in list(dct.items()):
-            if w in connected:
-                connected.remove(w)
-                if node != v:
-                    connected.add(v)
+        successors = self.successors
+        added = []
+        for x in successors.pop(w):
+            predecessors[x].discard(w)
+            if x is not v and x not in successors[v]:
+                successors[v].add(x)
+                predecessors[x].add(v)
+                added.append((v, x))
+        for x in predecessors.pop(w):
+            successors[x].remove(w)
+            if x is not v and v not in successors[x]:
+                successors[x].add(v)
+                predecessors[v].add(x)
+                added.append((x, v))
+        return added
@@ -14,13 +14,15 @@
 # ----------------------------------------------------------------------------
 
 from __future__ import division
+import bisect
+import collections
+from collections import defaultdict
 from operator import mul
 from functools import reduce
-from itertools import combinations
 from ngraph.util.graph import UndirectedGraph
-from ngraph.analysis.dataflow import DataFlowGraph
+from ngraph.analysis.dataflow import DataFlowGraph, base_tensor_descriptions
 from ngraph.analysis.fusion import KernelFlowGraph
-from ngraph.op_graph.op_graph import Buffer, TensorOp, OrderedSet
+from ngraph.op_graph.op_graph import AssignableTensorOp, Buffer, TensorOp, OrderedSet
 
 
 def _random_colors(N, alpha=.5):
@@ -44,6 +46,31 @@ def _random_colors(N, alpha=.5):
     return HEX
 
 
+class InterferenceNeighbors(collections.Mapping):
+    """
+    The neighbors of each tensor in an InterferenceGraph, found on demand from the
+    bitsets of the instructions where tensors are live, so that the edges are never
+    all built.
+
+    Arguments:
+      masks (dict tensor_description => int): The instructions at which each tensor
+        is live
+    """
+
+    def __init__(self, masks):
+        self.masks = masks
+
+    def __getitem__(self, u):
+        mask = self.masks[u]
+        return OrderedSet([v for v, v_mask in self.masks.items() if v is not u and v_mask & mask])
+
+    def __iter__(self):
+        return iter(self.masks)
+
+    def __len__(self):
+        return len(self.masks)
+
+
 class InterferenceGraph(UndirectedGraph):
     """
     Interference graph. Undirected graph containing a node for each
@@ -55,31 +82,34 @@ class InterferenceGraph(UndirectedGraph):
     buffers allocated.  in this variant of the graph coloring problem we want
     to minimize the total buffer space allocated.  In academic literature this
     variant is referred to as ____.
+
+    Two tensors interfere when the bitsets of the instructions where they are live
+    intersect, so the pairwise edges, which grow quadratically with the number of
+    tensors live at once, are not built.
     """
 
-    def __init__(self, lives):
+    def __init__(self, lives=None, masks=None):
         """
         Creates the interference graph from the provided liveness information.
         There is an edge in the interference graph whenever two variables are
         live at the same time. Each node is weighted by the memory requirement
         of the underlying tensor.
 
-        This seems to be the performance bottleneck for very large graphs.
-        Construction could be optimized, or coloring could be done directly
-        from the liveness information.
-
         Arguments:
           lives (op => set(tensor_description)): Live tensors at each point
                                                  Typically the output of dataflow.liveness()
+          masks (tensor_description => int): Instead of lives, the instructions at which
+                                             each tensor is live, as bitsets.
+                                             Typically the output of dataflow.live_masks()
         """
-        neighbors = {x: OrderedSet() for l in list(lives.values()) for x in l}
-        edges = [(u, v) for l in list(lives.values()) for u, v in combinations(l, 2)]
-        for u, v in edges:
-            neighbors[u].add(v)
-            neighbors[v].add(u)
-        super(InterferenceGraph, self).__init__(neighbors)
-        self.weights = {x: max(1, reduce(mul, x.shape, 1)) *
-                        x.dtype.itemsize for x in neighbors}
+        if masks is None:
+            masks = dict()
+            for i, l in enumerate(lives.values()):
+                for x in l:
+                    masks[x] = masks.get(x, 0) | 1 << i
+        self.masks = masks
+        super(InterferenceGraph, self).__init__(InterferenceNeighbors(masks))
+        self.weights = {x: tensor_bytes(x) for x in masks}
 
     def color(self):
         """
@@ -90,35 +120,289 @@ class InterferenceGraph(UndirectedGraph):
         https://drive.google.com/open?id=0B8aziUAQFjRTa2Mzb2VUWEFaRXM
         """
 
-        neighbors = self.neighbors
+        masks = self.masks
         weights = self.weights
-        partitions = []
         buffers = []
         queue = sorted(weights, key=lambda x: (weights[x], ), reverse=True)
         while queue:
-            u = queue.pop(0)
-            # Creates a new set and grows it as much as possible
-            S = OrderedSet([u])
-            N = neighbors[u]
-            for x in queue:
-                if x not in N:
-                    S.add(x)
-                    N |= neighbors[x]
-            partitions.append(S)
-            color = len(partitions) - 1
+            u = queue[0]
+            # Creates a new set and grows it as much as possible, with live the
+            # instructions where a tensor of the set is live
+            S = [u]
+            live = masks[u]
+            remaining = []
+            for x in queue[1:]:
+                if masks[x] & live:
+                    remaining.append(x)
+                else:
+                    S.append(x)
+                    live |= masks[x]
+            color = len(buffers)
             buffers.append(Buffer(color, weights[u]))
             # Update remaining nodes
-            queue = [x for x in queue if x not in S]
+            queue = remaining
             for s in S:
                 s.buffer = buffers[color]
         total_mem = sum([x.size for x in buffers])
         cmap = _random_colors(len(buffers), .5)
-        for tensor in neighbors:
+        for tensor in masks:
             tensor.style = {'style': 'filled', 'fillcolor': cmap[tensor.buffer.color]}
         return total_mem, buffers
 
 
-def assign_buffers(transformer, results, fusible=None):
+def tensor_bytes(tensor):
+    """
+    Returns: The bytes needed by a base tensor description.
+    """
+    return max(1, reduce(mul, tensor.shape, 1)) * tensor.dtype.itemsize
+
+
+def mask_runs(mask):
+    """
+    Returns: The first and last bit of each run of set bits of mask.
+    """
+    runs = []
+    while mask:
+        start = (mask & -mask).bit_length() - 1
+        run = mask >> start
+        length = (run ^ (run + 1)).bit_length() - 1
+        mask &= ~(((1 << length) - 1) << start)
+        runs.append((start, start + length - 1))
+    return runs
+
+
+def max_live_bytes(spans):
+    """
+    The largest total size of the tensors live at one point. No plan can use less
+    memory.
+
+    Arguments:
+      spans: The first and last points and the bytes of each span where a tensor
+        is live. The spans of a tensor must not overlap.
+
+    Returns:
+      int: The lower bound, in bytes.
+    """
+    changes = defaultdict(int)
+    for start, end, bytes in spans:
+        changes[start] += bytes
+        changes[end + 1] -= bytes
+    live = peak = 0
+    for point in sorted(changes):
+        live += changes[point]
+        peak = max(peak, live)
+    return peak
+
+
+class IntervalTree(object):
+    """
+    Holds values added with intervals, and finds the values whose intervals overlap a
+    query interval, in time proportional to their number rather than to the number of
+    values held.
+
+    Each node of the tree holds the values whose intervals contain its center, sorted
+    by the first and by the last point of the interval, and the values whose intervals
+    lie before and after the center are in its left and right subtrees. The centers
+    are chosen up front from every interval that may be added.
+
+    Arguments:
+      intervals: The first and last points of every interval that may be added.
+    """
+
+    def __init__(self, intervals):
+        self.root = None
+        # Build the nodes depth first, with a slot in the parent for each subtree
+        pending = [(list(intervals), self, 'root')]
+        while pending:
+            spans, parent, slot = pending.pop()
+            if not spans:
+                continue
+            points = sorted(point for span in spans for point in span)
+            node = IntervalTreeNode(points[len(points) // 2])
+            setattr(parent, slot, node)
+            pending.append(([span for span in spans if span[1] < node.center], node, 'left'))
+            pending.append(([span for span in spans if span[0] > node.center], node, 'right'))
+
+    def add(self, interval, value):
+        """
+        Arguments:
+          interval: The first and last points of the interval of value; one of the
+            intervals the tree was made with.
+          value: The value to add.
+        """
+        start, end = interval
+        node = self.root
+        node.count += 1
+        while not start <= node.center <= end:
+            node = node.left if end < node.center else node.right
+            node.count += 1
+        index = bisect.bisect(node.starts, start)
+        node.starts.insert(index, start)
+        node.by_start.insert(index, value)
+        index = bisect.bisect(node.ends, -end)
+        node.ends.insert(index, -end)
+        node.by_end.insert(index, value)
+
+    def overlapping(self, start, end):
+        """
+        Arguments:
+          start: The first point of the query interval.
+          end: The last point of the query interval.
+
+        Returns:
+          list: The values whose intervals share a point with the query interval.
+        """
+        result = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if node is None or node.count == 0:
+                continue
+            if end < node.center:
+                result.extend(node.by_start[:bisect.bisect(node.starts, end)])
+                nodes.append(node.left)
+            elif start > node.center:
+                result.extend(node.by_end[:bisect.bisect(node.ends, -start)])
+                nodes.append(node.right)
+            else:
+                result.extend(node.by_start)
+                nodes.append(node.left)
+                nodes.append(node.right)
+        return result
+
+
+class IntervalTreeNode(object):
+    """
+    A node of an IntervalTree.
+
+    Arguments:
+      center: A point of every interval of the node.
+
+    Attributes:
+      count (int): The number of values in the node and its subtrees.
+    """
+
+    def __init__(self, center):
+        self.center = center
+        self.count = 0
+        self.starts = []
+        self.by_start = []
+        self.ends = []
+        self.by_end = []
+        self.left = None
+        self.right = None
+
+
+class LiveIntervals(object):
+    """
+    The live interval of each tensor, i.e. the first and last instructions that
+    define or use it, and a planner placing the tensors at offsets in one arena.
+
+    Tensors share memory when their intervals do not overlap, as with
+    InterferenceGraph, but each tensor only takes its own size, rather than the size
+    of the largest tensor of its color. Unlike DataFlowGraph.liveness, which keeps
+    the value of every persistent op, only the values of persistent
+    AssignableTensorOps and of the retained results outlive their last use.
+    """
+
+    def __init__(self, order, retained=()):
+        """
+        Arguments:
+          order (list): The instructions, in execution order
+          retained (list): Ops whose values are kept between runs of the
+            instructions, or read after they run
+        """
+        self.intervals = dict()
+        for i, op in enumerate(order):
+            for x in base_tensor_descriptions(list(op.args) + list(op.defs)):
+                start, _ = self.intervals.get(x, (i, i))
+                self.intervals[x] = (start, i)
+        for x in base_tensor_descriptions(retained):
+            self.intervals[x] = (0, len(order) - 1)
+        self.weights = {x: tensor_bytes(x) for x in self.intervals}
+
+    def max_live_bytes(self):
+        """
+        The largest total size of the tensors live at one point. No placement can use
+        less memory.
+
+        Returns:
+          int: The lower bound, in bytes.
+        """
+        return max_live_bytes((start, end, self.weights[x])
+                              for x, (start, end) in self.intervals.items())
+
+    def place(self, alignment=1):
+        """
+        Places the tensors, largest first, each in the smallest gap that fits it
+        between the tensors already placed whose intervals overlap its own. The
+        placed tensors are kept in an IntervalTree, so each placement only looks at
+        the placed tensors live during its interval, rather than at all of them.
+
+        Arguments:
+          alignment (int): Offsets are multiples of this many bytes
+
+        Returns:
+          peak (int): The size of the arena
+          buffers (list): A Buffer for each tensor, with its offset in the arena
+        """
+        def aligned(offset):
+            return -(-offset // alignment) * alignment
+
+        intervals = self.intervals
+        weights = self.weights
+        placed = IntervalTree(intervals.values())
+        buffers = []
+        peak = 0
+        for x in sorted(weights, key=lambda x: (-weights[x], intervals[x])):
+            start, end = intervals[x]
+            size = weights[x]
+            conflicts = sorted(placed.overlapping(start, end))
+            offset, best_gap, bottom = None, None, 0
+            for lower, upper in conflicts:
+                gap = lower - bottom
+                if gap >= size and (best_gap is None or gap < best_gap):
+                    offset, best_gap = bottom, gap
+                if upper > bottom:
+                    bottom = aligned(upper)
+            if offset is None:
+                offset = bottom
+            buffer = Buffer(len(buffers), size)
+            buffer.offset = offset
+            buffers.append(buffer)
+            placed.add((start, end), (offset, offset + size))
+            x.buffer = buffer
+            peak = max(peak, offset + size)
+        cmap = _random_colors(len(buffers), .5)
+        for tensor in weights:
+            tensor.style = {'style': 'filled', 'fillcolor': cmap[tensor.buffer.color]}
+        return peak, buffers
+
+
+def overlapping_buffers(buffers):
+    """
+    Finds the buffers whose memory overlaps, e.g. because their tensors are live at
+    different times.
+
+    Arguments:
+      buffers: Buffers with offsets in one arena
+
+    Returns:
+      dict (Buffer => list(Buffer)): The other buffers each buffer overlaps
+    """
+    overlaps = {buffer: [] for buffer in buffers}
+    active = []
+    for buffer in sorted(buffers, key=lambda x: x.offset):
+        active = [x for x in active if x.offset + x.size > buffer.offset]
+        for x in active:
+            overlaps[x].append(buffer)
+            overlaps[buffer].append(x)
+        active.append(buffer)
+    return overlaps
+
+
+def assign_buffers(transformer, results, fusible=None, planner=None, alignment=1,
+                   retained=()):
     """
     Performs dataflow analysis of the graph defined by the provide results.
     Assigns buffer to each node.
@@ -127,23 +411,39 @@ def assign_buffers(transformer, results, fusible=None):
       transformer: TODO
       fusible: TODO
       results: results to build the graph from
+      planner (str): 'best_fit' to place tensors at offsets in one arena with
+        LiveIntervals, otherwise buffers are shared by coloring the InterferenceGraph
+      alignment (int): Alignment of the offsets of the best_fit planner
+      retained: Ops whose values are read after the computations run, e.g. their
+        returns, which the best_fit planner must not reuse
 
     Returns:
       dfg (DataFlowGraph/KernelFlowGraph): dataflow of the computation
       memory (int): Memory usage of the computations
+      lower_bound (int): The most memory live at once, which no plan can improve on
     """
 
     dfg = DataFlowGraph(transformer, results)
     all_ops = dfg.successors.keys()
     if fusible:
         dfg = KernelFlowGraph(dfg, fusible)
-    liveness = dfg.liveness()
-    ifg = InterferenceGraph(liveness)
-    memory, buffers = ifg.color()
+    if planner == 'best_fit':
+        persistent = [op for op in all_ops
+                      if isinstance(op, AssignableTensorOp) and op.persistent]
+        intervals = LiveIntervals(dfg.instructions, persistent + list(retained))
+        lower_bound = intervals.max_live_bytes()
+        memory, buffers = intervals.place(alignment)
+    else:
+        order, masks = dfg.live_masks()
+        lower_bound = max_live_bytes((start, end, tensor_bytes(x))
+                                     for x, mask in masks.items()
+                                     for start, end in mask_runs(mask))
+        ifg = InterferenceGraph(masks=masks)
+        memory, buffers = ifg.color()
     # set style
     for op in all_ops:
         if isinstance(op, TensorOp):
             tensor = op.tensor_description()
             op.style = tensor.style
     # dfg.view()
-    return dfg, memory
+    return dfg, memory, lower_bound
@@ -227,13 +227,12 @@ def loop_train(dataset, computation, callbacks):
 
 def loop_eval(dataset, computation):
     dataset.reset()
-    all_results = None
+    # Results are views that the next call overwrites, so they are summed as they come
+    totals, sizes = dict(), dict()
     for data in dataset:
-        results = computation(data)
-        if all_results is None:
-            all_results = {k: list(rs) for k, rs in results.items()}
-        else:
-            for k, rs in results.items():
-                all_results[k].extend(list(rs))
-    reduced_results = {k: np.mean(ar[:dataset.ndata]) for k, ar in all_results.items()}
+        for k, rs in computation(data).items():
+            rs = rs[:max(dataset.ndata - sizes.get(k, 0) // rs[0].size, 0)]
+            totals[k] = totals.get(k, 0) + np.sum(rs)
+            sizes[k] = sizes.get(k, 0) + rs.size
+    reduced_results = {k: total / sizes[k] for k, total in totals.items()}
     return reduced_results
@@ -14,8 +14,6 @@
 # ----------------------------------------------------------------------------
 from __future__ import division
 
-from operator import itemgetter
-
 
 class Sequential(object):
     def __init__(self, layers):
@@ -70,17 +68,49 @@ class BoundComputation(object):
         self.input_keys = tuple(named_inputs.keys())
         self.output_keys = tuple(named_outputs.keys())
 
-        outputs = itemgetter(*self.output_keys)(named_outputs)
-        outputs = [outputs] if len(self.output_keys) == 1 else list(outputs)
-
-        inputs = itemgetter(*self.input_keys)(named_inputs)
+        outputs = [named_outputs[k] for k in self.output_keys]
+        self.inputs = [named_inputs[k] for k in self.input_keys]
         self.num_outputs = len(outputs)
-        self.comp_func = transformer.computation(outputs, *inputs)
+        self.comp_func = transformer.computation(outputs, *self.inputs)
+
+    def __call__(self, named_buffers, out=None):
+        """
+        Runs the computation.
 
-    def __call__(self, named_buffers):
-        result_tuple = self.comp_func(*itemgetter(*self.input_keys)(named_buffers))
-        result_dict = {k: v for k, v in zip(self.output_keys, result_tuple)}
-        return result_dict
+        Arguments:
+            named_buffers: Arrays for the inputs, by name.
+            out: Arrays to copy some of the outputs into, by name. Other outputs are
+                views that the next call overwrites.
+
+        Returns:
+            The outputs, by name.
+        """
+        bindings = self.comp_func.bindings
+        if out is not None:
+            out = [out.get(k) for k in self.output_keys]
+        result_tuple = self.comp_func(*[named_buffers.get(k) if x in bindings else named_buffers[k]
+                                        for k, x in zip(self.input_keys, self.inputs)],
+                                      out=out)
+        return dict(zip(self.output_keys, result_tuple))
+
+    def bind(self, named_buffers):
+        """
+        Makes inputs use caller-owned arrays as their storage, without copying.
+
+        Bound inputs may be left out of the buffers passed to a call, or passed a new
+        array to be bound to instead of copied.
+
+        Arguments:
+            named_buffers: Arrays for some of the inputs, by name.
+        """
+        for k, buffer in named_buffers.items():
+            self.comp_func.bind(self.inputs[self.input_keys.index(k)], buffer)
+
+    def unbind(self):
+        """
+        Makes all inputs use their own storage again.
+        """
+        self.comp_func.unbind()
 
 
 def make_bound_computation(transformer, named_outputs, named_inputs):
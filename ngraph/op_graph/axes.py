@@ -1523,6 +1523,17 @@ class TensorDescription(NameableValue):
         """A device handle to the value."""
         return self.__value
 
+    @value.setter
+    def value(self, value):
+        """
+        Sets the device handle of a tensor whose transformation was not done here, e.g.
+        because it was loaded from a cache.
+
+        Arguments:
+            value: The device handle.
+        """
+        self.__value = value
+
     def is_base(self):
         """This tensor provides its own storage."""
         return self.__base is None
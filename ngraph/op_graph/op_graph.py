@@ -16,6 +16,8 @@ from __future__ import division
 from contextlib import contextmanager
 
 import inspect
+import linecache
+import os
 import cachetools
 import numpy as np
 from builtins import object
@@ -24,6 +26,7 @@ from functools import wraps
 from ngraph.op_graph.axes import TensorDescription, \
     make_axis, make_axes, Axes, FlattenedAxis, PaddedAxis, SlicedAxis, default_dtype, \
     default_int_dtype
+from ngraph.util.graph import postorder
 from ngraph.util.names import NameableValue
 from ngraph.util.threadstate import get_thread_state
 from ngraph.util.ordered import OrderedSet
@@ -55,6 +58,44 @@ def tdcache():
 tdcache.tensor_description_cache = {}
 
 
+class FrozenDict(dict):
+    """
+    A dict that cannot be changed, so that it can be shared.
+
+    Ops share their metadata and style dicts; to change one, give the op a new dict.
+    """
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError("{} cannot be changed".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _frozen
+
+
+def add_metadata(ops, metadata):
+    """
+    Adds metadata to the metadata of ops.
+
+    Ops that had the same metadata dict share the same new dict.
+
+    Arguments:
+        ops: The ops.
+        metadata: A dict of metadata to add.
+    """
+    if not metadata:
+        return
+    added = dict()
+    for op in ops:
+        old = op.metadata
+        # The old dict is kept, so its id is not reused while added is in use
+        _, new = added.get(id(old), (None, None))
+        if new is None:
+            new = dict(old)
+            new.update(metadata)
+            new = FrozenDict(new)
+            added[id(old)] = old, new
+        op.metadata = new
+
+
 @contextmanager
 def metadata(**metadata):
     """
@@ -63,8 +104,7 @@ def metadata(**metadata):
     """
     with Op.all_ops() as ops:
         yield
-    for op in ops:
-        op.metadata.update(metadata)
+    add_metadata(ops, metadata)
 
 
 def with_op_metadata(f, metadata=None):
@@ -85,38 +125,72 @@ def with_op_metadata(f, metadata=None):
         # variable called `metadata` then we add that to the
         if len(args) > 0 and hasattr(type(args[0]), 'metadata'):
             metadata.update(type(args[0]).metadata)
-        for op in ops:
-            op.metadata.update(metadata)
+        add_metadata(ops, metadata)
         return result
     return wrapper
 
 
 class DebugInfo(object):
-    """Mixin that captures file/line location of an object's creation."""
+    """
+    Mixin that captures file/line location of an object's creation.
+
+    Only the code object and line number are kept when the object is made; the file
+    name and source line are looked up when they are asked for. Setting
+    DebugInfo.capture to False, or NGRAPH_DEBUG_INFO=0 in the environment, turns
+    capture off, and the location is then None.
+    """
+
+    capture = os.getenv('NGRAPH_DEBUG_INFO', '1') != '0'
 
     def __init__(self, **kwargs):
         # TODO This is a good first cut for debugging info, but it would be nice to
         # TODO be able to reliably walk the stack back to user code rather than just
         # TODO back past this constructor
         super(DebugInfo, self).__init__(**kwargs)
+        self.__code = None
+        self.lineno = None
+        if not DebugInfo.capture:
+            return
         frame = None
         try:
             frame = inspect.currentframe()
             while frame.f_locals.get('self', None) is self:
                 frame = frame.f_back
             while frame:
-                filename, lineno, function, code_context, index = inspect.getframeinfo(
-                    frame)
-                if -1 == filename.find('ngraph/op_graph'):
+                code = frame.f_code
+                lineno = frame.f_lineno
+                if -1 == code.co_filename.find('ngraph/op_graph'):
                     break
                 frame = frame.f_back
 
-            self.filename = filename
+            self.__code = code
             self.lineno = lineno
-            self.code_context = code_context
         finally:
             del frame
 
+    @property
+    def filename(self):
+        """
+        Returns:
+            The name of the file that created the node, or None if it was not captured.
+        """
+        if self.__code is None:
+            return None
+        return inspect.getsourcefile(self.__code) or inspect.getfile(self.__code)
+
+    @property
+    def code_context(self):
+        """
+        Returns:
+            A list with the source line that created the node, or None if it is not
+            available.
+        """
+        filename = self.filename
+        if filename is None:
+            return None
+        line = linecache.getline(filename, self.lineno)
+        return [line] if line else None
+
     @property
     def file_info(self):
         """
@@ -157,10 +231,19 @@ class Op(NameableValue, DebugInfo):
         reference (bool): The storage is accessed via a reference.  Implies persistent.
         schemas: Information about how the Op was generated.
         metadata: Dictionary with of string keys and values used for attaching
-            arbitrary metadata to nodes.
+            arbitrary metadata to nodes.  It may be shared with other ops, and cannot
+            be changed; use add_metadata instead.
         trainable: The value is trainable.
     """
 
+    # Empty containers, shared by all Ops until an Op is given its own
+    metadata = FrozenDict()
+    style = FrozenDict()
+    schemas = ()
+    other_deps = ()
+    initializers = ()
+    ops = ()
+
     # Default is to not collect Ops as they are created
     get_thread_state().ops = [None]
 
@@ -262,7 +345,6 @@ class Op(NameableValue, DebugInfo):
                  **kwargs):
         super(Op, self).__init__(**kwargs)
         self.__args = ()
-        self.metadata = dict()
         self.args = args
         # TODO: is this ok?  __repr__ wants a .name
         if self.name is None:
@@ -272,17 +354,13 @@ class Op(NameableValue, DebugInfo):
             if not isinstance(metadata, dict):
                 raise ValueError("Metadata must be of type dict,"
                                  "not {} of {}".format(type(metadata), metadata))
-            self.metadata.update(metadata)
+            add_metadata([self], metadata)
 
-        # List to keep generation deterministic
-        self.other_deps = OrderedSet()
         for arg in self.args:
             for dep in arg.user_deps:
                 self.add_other_dep(dep)
-        self.schemas = []
         self.const = const
         self.is_constant = constant
-        self.initializers = OrderedSet()
         if initializers is not None:
             for initializer in initializers:
                 self.add_initializer(initializer)
@@ -298,8 +376,6 @@ class Op(NameableValue, DebugInfo):
         if all_ops is not None:
             all_ops.append(self)
 
-        self.style = {}
-        self.ops = []
         self.__forward = None
 
     @property
@@ -334,26 +410,25 @@ class Op(NameableValue, DebugInfo):
         """
         visited = set()
 
-        def visit(node):
+        def expand(node):
             """
-            Recursively visit all nodes used to compute this node.
+            Returns the node to visit and the nodes used to compute it, or None if it
+            was already visited.
 
             Arguments:
-                node: the node to visit
+                node: the node reached
 
             Returns:
-                None
+                The node and its inputs
             """
             node = node.forwarded
+            if node in visited:
+                return None
+            visited.add(node)
             node.update_forwards()
-            if node not in visited:
-                for n in node.other_deps + list(node.args):
-                    visit(n)
-                fun(node)
-                visited.add(node)
+            return node, list(node.other_deps) + list(node.args)
 
-        for node in roots:
-            visit(node)
+        postorder(roots, expand, fun)
 
     @property
     def forward(self):
@@ -374,7 +449,7 @@ class Op(NameableValue, DebugInfo):
         for dep in self.other_deps:
             value.add_other_dep(dep)
         tdcache.tensor_description_cache.clear()
-        value.metadata.update(self.metadata)
+        add_metadata([value], self.metadata)
 
     @property
     def forwarded(self):
@@ -385,16 +460,24 @@ class Op(NameableValue, DebugInfo):
              Follows forwarding to the op that shoud handle this op.
         """
         result = self
-        while True:
-            if not result.__forward:
-                return result
+        while result.__forward:
             result = result.__forward
+        # Compress the chain, so later lookups take one step
+        while self.__forward and self.__forward is not result:
+            self.__forward, self = result, self.__forward
+        return result
 
     def add_other_dep(self, dep):
         # Add the dep to the op that actually does the work.
-        self.device_op.other_deps.add(dep.forwarded)
+        device_op = self.device_op
+        if not device_op.other_deps:
+            # List to keep generation deterministic
+            device_op.other_deps = OrderedSet()
+        device_op.other_deps.add(dep.forwarded)
 
     def add_initializer(self, init):
+        if not self.initializers:
+            self.initializers = OrderedSet()
         self.initializers.add(init)
 
     def update_forwards(self):
@@ -404,10 +487,12 @@ class Op(NameableValue, DebugInfo):
 
         self.args = tuple(arg.forwarded for arg in self.args)
         other_deps = self.other_deps
-        self.other_deps = OrderedSet()
-        for op in other_deps:
-            self.add_other_dep(op)
-        self.initializers = [op.forwarded for op in self.initializers]
+        if other_deps:
+            self.other_deps = ()
+            for op in other_deps:
+                self.add_other_dep(op)
+        if self.initializers:
+            self.initializers = [op.forwarded for op in self.initializers]
 
     def replace_self(self, rep):
         self.forward = rep
@@ -479,7 +564,7 @@ class Op(NameableValue, DebugInfo):
         Returns:
           TODO
         """
-        self.schemas.insert(0, schema)
+        self.schemas = [schema] + list(self.schemas)
         if set_generate_adjoints:
             # generate_adjoints is normally called with *args, but for a
             # schema we call it with the associated node.
@@ -2477,6 +2562,7 @@ def create_binary_elementwise(name,
     if one_dim_generate_adjoints is not None:
         d['generate_adjoints'] = one_dim_generate_adjoints
     OneDimBinClass = type(one_dim_name, (BinaryElementWiseLowDOp,), d)
+    BinClass.one_d_class = OneDimBinClass
 
     d = {}
     if zero_dim_generate_adjoints is not None:
@@ -2785,6 +2871,30 @@ class DotTwoByOne(LowDimensionalDot):
         )
 
 
+class TensorDot(TensorOp):
+    """
+    The dot product of tensors of any rank, for transformers that contract strided
+    tensors directly rather than the matrices RequiredTensorShaping makes of them.
+
+    Arguments:
+        x: The first tensor.
+        y: The second tensor.
+        x_reduction_axes: The axes of x to contract.
+        y_reduction_axes: The axes of y contracted with each of x_reduction_axes.
+
+    The axes of the result are the other axes of x, followed by the other axes of y.
+    """
+    def __init__(self, x, y, x_reduction_axes, y_reduction_axes, **kwargs):
+        assert len(x_reduction_axes) == len(y_reduction_axes)
+        self.x_reduction_axes = x_reduction_axes
+        self.y_reduction_axes = y_reduction_axes
+        super(TensorDot, self).__init__(
+            args=(x, y),
+            axes=(x.axes - x_reduction_axes) + (y.axes - y_reduction_axes),
+            **kwargs
+        )
+
+
 class Softmax(object):
     """
     A schema to use to shortcut formula for the softmax derivative.
@@ -3248,8 +3358,8 @@ class Function(Op):
             args |= set(op.args) - defs
         self.args = args
         self.__defs = defs
-        self.initializers = [x for x in op.initializers
-                             for op in self.instructions]
+        self.initializers = [x for op in self.instructions
+                             for x in op.initializers]
 
     @property
     def defs(self):
@@ -3273,6 +3383,8 @@ class Buffer(object):
     def __init__(self, color, size):
         self.color = color
         self.size = size
+        # Byte offset in an arena shared by all buffers, if the planner placed it in one
+        self.offset = None
         self.data = None
         self.views = OrderedSet()
 
@@ -14,6 +14,8 @@
 # ----------------------------------------------------------------------------
 from __future__ import division
 
+import numpy as np
+
 from ngraph.op_graph import op_graph
 
 
@@ -32,13 +34,32 @@ def pooling(poolparams, inputs, axes, docstring=None):
     return PoolingOp(poolparams, inputs, axes=axes, docstring=docstring)
 
 
+def argmax_dtype(window_size):
+    """
+    The smallest unsigned dtype that can index every element of a pooling window.
+
+    Args:
+        window_size (int): Number of elements in a pooling window.
+
+    Returns:
+        The dtype.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if window_size <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
 class PoolingOp(op_graph.TensorOp):
     _index = 0
 
-    def __init__(self, pool_params, inputs, *args, **kwargs):
+    def __init__(self, pool_params, inputs, argmax=None, *args, **kwargs):
         """
         Arguments:
             inputs  : input tensor.
+            argmax  : optional storage for the position of the maximum within each
+                window, used by max pooling. Made with the output axes and the smallest
+                dtype that can index a window if not provided.
 
         Return:
         """
@@ -70,23 +91,59 @@ class PoolingOp(op_graph.TensorOp):
 
         PoolingOp._index += 1
 
+        if pooltype == 'max':
+            if argmax is None:
+                window_size = 1
+                for name in ('J', 'T', 'R', 'S'):
+                    window_size *= pool_params[name]
+                # Only live from the pooling to its bprop, so its storage can be shared
+                argmax = op_graph.AssignableTensorOp(graph_label_type="Temp",
+                                                     constant=False, persistent=False,
+                                                     trainable=False,
+                                                     axes=kwargs.get('axes'),
+                                                     dtype=argmax_dtype(window_size))
+            pool_args = (inputs, argmax)
+        else:
+            pool_args = (inputs,)
+
         super(PoolingOp, self).__init__(
-            args=(inputs,), *args, **kwargs
+            args=pool_args, *args, **kwargs
         )
 
-    def generate_adjoints(self, adjoints, delta, inputs):
-        inputs.generate_add_delta(adjoints, BpropPoolOp(delta, inputs, self))
+        # Windows must overlap the input, or they would have no maximum or average
+        for name, X, Y in zip(('c', 'd', 'h', 'w'), inputs.axes.lengths, self.axes.lengths):
+            F = pool_params[{'c': 'J', 'd': 'T', 'h': 'R', 'w': 'S'}[name]]
+            pad, stride = pool_params['pad_' + name], pool_params['str_' + name]
+            if pad >= F or (Y - 1) * stride - pad >= X:
+                raise ValueError((
+                    "Pooling windows along {name} lie entirely in the padding: "
+                    "window {F}, padding {pad}, stride {stride}, input length {X}, "
+                    "output length {Y}."
+                ).format(name=name, F=F, pad=pad, stride=stride, X=X, Y=Y))
+
+    @property
+    def defs(self):
+        """
+        Returns:
+            The output and, for max pooling, the argmax it writes.
+        """
+        return [self] + list(self.args[1:])
+
+    def generate_adjoints(self, adjoints, delta, inputs, argmax=None):
+        inputs.generate_add_delta(adjoints, BpropPoolOp(delta, inputs, self, argmax))
 
 
 class BpropPoolOp(op_graph.TensorOp):
-    def __init__(self, delta, inputs, fprop, *args, **kwargs):
+    def __init__(self, delta, inputs, fprop, argmax=None, *args, **kwargs):
         """
         Arguments:
             inputs  : input tensor.
+            argmax  : storage written by the max pooling fprop.
         """
         self.pool_params = fprop.pool_params
         self.index = fprop.index
 
+        bprop_args = (delta,) if argmax is None else (delta, argmax)
         super(BpropPoolOp, self).__init__(
-            args=(delta,), *args, axes=inputs.axes, **kwargs
+            args=bprop_args, *args, axes=inputs.axes, **kwargs
         )
@@ -16,16 +16,20 @@ from __future__ import division
 
 import collections
 import weakref
+from contextlib import contextmanager
 
 import abc
+import numpy as np
 from builtins import object
 from future.utils import with_metaclass
 
 from ngraph.analysis.memory import assign_buffers
 from ngraph.op_graph.op_graph import Op, TensorOp, InitTensorOp, tensor_descriptions, \
     Function, doall, ResultHandle
-from ngraph.transformers.passes.passes import RequiredTensorShaping, SimplePrune
+from ngraph.transformers.passes.passes import RequiredTensorShaping, SimplePrune, \
+    AlgebraicSimplification
 from ngraph.util.generics import generic_method
+from ngraph.util.graph import postorder
 from ngraph.util.names import NameableValue
 from ngraph.util.ordered import OrderedSet
 
@@ -40,17 +44,32 @@ class Computation(NameableValue):
             of the Op, if sequence of Ops, return the sequence of values, if
             a set return a map, if None, return None.
         *args: AllocationOps marked input will be arguments to the function.
+        result_buffers: If not None, the number of sets of arrays that results are
+            copied into in turn, so that the results of a call stay valid for that many
+            calls. Otherwise results are views of the device tensors, which are
+            overwritten by the next call, unless arrays are passed as out.
         **kwargs: Args for related classes.
     """
 
     def __init__(self, transformer, returns, *args, **kwargs):
+        result_buffers = kwargs.pop('result_buffers', None)
         super(Computation, self).__init__(**kwargs)
         self.transformer = transformer
         self.computation_name = None
+        if result_buffers is not None and result_buffers < 1:
+            raise ValueError('result_buffers must be at least 1, not {}'.format(result_buffers))
+        self.result_buffers = result_buffers
+        self.result_ring = None
+        self.result_index = 0
+
+        # Maps the ResultHandles of the returns to the ops they were made for
+        self.return_keys = dict()
 
         def wrap_op(op):
             if isinstance(op, TensorOp):
-                return ResultHandle(op)
+                handle = ResultHandle(op)
+                self.return_keys[handle] = op
+                return handle
             else:
                 return op
 
@@ -59,8 +78,9 @@ class Computation(NameableValue):
 
         self.ops = OrderedSet()
         if isinstance(returns, collections.Set):
-            returns = set(wrap_ops(returns))
-            self.ops.update(returns)
+            handles = wrap_ops(returns)
+            returns = set(handles)
+            self.ops.update(handles)
         elif isinstance(returns, collections.Sequence):
             returns = wrap_ops(returns)
             self.ops.update(returns)
@@ -108,6 +128,7 @@ class Computation(NameableValue):
         self.ops.update(control_ops)
         self.transformer.all_results.update(self.ops)
         self.executor = None
+        self.bindings = dict()
 
     def transform(self):
         """
@@ -117,10 +138,23 @@ class Computation(NameableValue):
         ordered_ops = self.transformer.dataflow.can_reach(self.ops, order=self.transformer.ops)
         self.computation_name = self.transformer.transform_ordered_ops(ordered_ops, name=self.name)
 
-    def __call__(self, *args):
+    def __call__(self, *args, **kwargs):
         """
         Executes the computation passing args in to the function.
+
+        Arguments:
+            *args: The values of the parameters.
+            out: Arrays to copy the results into, shaped like the returns: an array for
+                an Op, a sequence of arrays for a sequence and a dict of arrays by Op for
+                a set. Results with no array, or None, use the result buffers of the
+                computation if it has any, or else are views of the device tensors.
+
+        Returns:
+            The values of the returns.
         """
+        out = kwargs.pop('out', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments {}'.format(sorted(kwargs)))
         if len(args) != len(self.parameters):
             raise ValueError((
                 'Computation was expecting {expected} arguments, but was '
@@ -135,39 +169,139 @@ class Computation(NameableValue):
 
         # Get the parameters to the device
         for param, arg in zip(self.parameters, args):
-            param.value[()] = arg
+            if param not in self.bindings:
+                param.value[()] = arg
+            elif arg is not None and arg is not self.bindings[param]:
+                self.bind(param, arg)
 
         self.executor()
 
-        # TODO Should copy this out of the device to a destination when it is not scalar
-        def value(op):
+        buffers = self.next_result_buffers()
+
+        def value(op, out=None):
             """
             Returns the computed value of op, or None if it has no value.
 
-            :param op:
-            :return: Return value for op.
+            Arguments:
+                op: The op.
+                out: An array to copy the value into, or None.
+
+            Returns:
+                The value of op.
             """
-            if isinstance(op, TensorOp):
-                if op.value is None:
-                    pass
-                return op.value.get(None)
-            else:
+            if not isinstance(op, TensorOp):
                 return None
+            if out is None and buffers is not None:
+                out = buffers[op]
+            if out is None:
+                return op.value.get(None)
+            op.value.get(out)
+            return out
 
         if isinstance(self.returns, Op):
-            return value(self.returns)
+            return value(self.returns, out)
         elif isinstance(self.returns, collections.Set):
+            out = out or dict()
             result = dict()
             for op in self.returns:
-                dict[op] = value(op)
+                key = self.return_keys.get(op, op)
+                result[key] = value(op, out.get(key))
             return result
 
         elif isinstance(self.returns, collections.Sequence):
-            return tuple(value(op) for op in self.returns)
+            out = out or [None] * len(self.returns)
+            if len(out) != len(self.returns):
+                raise ValueError((
+                    'Computation has {expected} results, but {called} out arrays were '
+                    'passed.'
+                ).format(
+                    expected=len(self.returns),
+                    called=len(out),
+                ))
+            return tuple(value(op, x) for op, x in zip(self.returns, out))
 
         else:
             return None
 
+    def next_result_buffers(self):
+        """
+        Returns the next set of result buffers, allocating them on first use.
+
+        Returns:
+            A dict of arrays by result, or None if the computation has no result
+            buffers.
+        """
+        if self.result_buffers is None:
+            return None
+        if self.result_ring is None:
+            self.result_ring = [
+                dict((op, np.empty_like(op.value.get(None)))
+                     for op in self.ops if isinstance(op, ResultHandle))
+                for _ in range(self.result_buffers)
+            ]
+        buffers = self.result_ring[self.result_index]
+        self.result_index = (self.result_index + 1) % self.result_buffers
+        return buffers
+
+    def bind(self, parameter, array):
+        """
+        Makes a parameter use a caller-owned array as its storage, without copying.
+
+        Until it is unbound, the parameter reads the array when the computation is
+        called. A bound parameter may be passed None to use the array it is bound to,
+        or another array, e.g. the next of a ring of buffers, to be bound to it
+        instead of being copied.
+
+        Arguments:
+            parameter: One of the parameters of the computation.
+            array: An array with the dtype, shape and strides of the parameter.
+
+        Raises:
+            ValueError: If the array does not have the layout of the parameter, or the
+                storage of the parameter cannot be replaced.
+            NotImplementedError: If the transformer cannot use host arrays as storage.
+        """
+        if parameter not in self.parameters:
+            raise ValueError('{} is not a parameter of the computation'.format(parameter))
+        self.transformer.initialize()
+        parameter.value.bind(array)
+        self.bindings[parameter] = array
+
+    def unbind(self, parameter=None):
+        """
+        Makes a parameter, or all parameters, use their own storage again.
+
+        Arguments:
+            parameter: The parameter, or None for all bound parameters.
+        """
+        parameters = list(self.bindings) if parameter is None else [parameter]
+        for parameter in parameters:
+            if self.bindings.pop(parameter, None) is not None:
+                parameter.value.unbind()
+
+    @contextmanager
+    def bound(self, *args):
+        """
+        Binds the parameters to caller-owned arrays for the duration of a with block.
+
+        Arguments:
+            *args: An array for each parameter, or None to leave the parameter as is.
+        """
+        previous = dict(self.bindings)
+        try:
+            for parameter, arg in zip(self.parameters, args):
+                if arg is not None:
+                    self.bind(parameter, arg)
+            yield self
+        finally:
+            for parameter, arg in zip(self.parameters, args):
+                if arg is None:
+                    continue
+                elif parameter in previous:
+                    self.bind(parameter, previous[parameter])
+                else:
+                    self.unbind(parameter)
+
 
 class DeviceBuffer(with_metaclass(abc.ABCMeta, NameableValue)):
     """
@@ -298,6 +432,28 @@ class DeviceTensor(with_metaclass(abc.ABCMeta, NameableValue)):
     def transform_allocate(self):
         """Generate code for making the device tensor usable on the device."""
 
+    def bind(self, array):
+        """
+        Makes the tensor, and the other views of its storage, use a host array as
+        storage without copying.
+
+        Arguments:
+            array: The array.
+
+        Raises:
+            ValueError: If the array cannot be used as the storage of the tensor.
+            NotImplementedError: If the transformer cannot use host arrays as storage.
+        """
+        raise NotImplementedError("{} does not support binding host arrays".format(
+            type(self.transformer).__name__))
+
+    def unbind(self):
+        """
+        Makes the tensor use its own storage again.
+        """
+        raise NotImplementedError("{} does not support binding host arrays".format(
+            type(self.transformer).__name__))
+
     @abc.abstractmethod
     def get(self, tensor):
         """
@@ -360,6 +516,12 @@ class Transformer(with_metaclass(Transformer_ABC_Meta, object)):
         initialized (bool): True when variables have been initialized/restored.
         opids (dict): TODO
         fusion (bool): True when fusion was enabled.
+        memory_planner (str): 'best_fit' to place tensors at offsets of one arena,
+            otherwise tensors share buffers by graph coloring.
+        memory_alignment (int): Alignment of the offsets of the best_fit planner.
+        memory (int): Bytes of memory planned for tensors.
+        memory_lower_bound (int): The most bytes of tensors live at once, a lower
+            bound on memory.
         device_buffers (set): Set of handles for storage allocations.
         cpu_initializations (list): Initializations to be performed from the CPU after
             allocation.
@@ -375,10 +537,13 @@ class Transformer(with_metaclass(Transformer_ABC_Meta, object)):
         self.initialized = False
         self.opids = dict()
         self.fusion = fusion
+        self.memory_planner = None
+        self.memory_alignment = 1
+        self.memory_lower_bound = None
         self.device_buffers = OrderedSet()
         self.cpu_initializations = []
         self.init_computation = None
-        self.graph_passes = [SimplePrune(), RequiredTensorShaping()]
+        self.graph_passes = [SimplePrune(), AlgebraicSimplification(), RequiredTensorShaping()]
 
     def register_graph_pass(self, graph_pass):
         self.graph_passes.append(graph_pass)
@@ -416,7 +581,12 @@ class Transformer(with_metaclass(Transformer_ABC_Meta, object)):
             if op not in self.opids:
                 self.opids[op] = len(self.opids)
 
-        self.dataflow, self.memory = assign_buffers(self, all_ops, self.fusion)
+        # The returns are read after the computations run
+        returns = [op.forwarded for computation in self.computations
+                   for op in computation.ops if isinstance(op, ResultHandle)]
+        self.dataflow, self.memory, self.memory_lower_bound = assign_buffers(
+            self, all_ops, self.fusion, self.memory_planner, self.memory_alignment,
+            returns)
 
         # Initialize tensor descriptions
         for op in all_ops:
@@ -535,28 +705,27 @@ class Transformer(with_metaclass(Transformer_ABC_Meta, object)):
         visited = set()
         inits = OrderedSet()
 
-        def visit(node):
+        def expand(node):
             node = node.forwarded
             node.update_forwards()
-            if node not in visited:
-                if node.initializers:
-                    if node in inits:
-                        if node not in visited:
-                            ordered_initializer_ops.append(node)
-                            visited.add(node)
-                    else:
-                        inits.add(node)
-                        for n in node.initializers:
-                            visit(n)
-                else:
-                    for n in node.args:
-                        visit(n)
-                if node not in visited:
+            if node in visited:
+                return None
+            if node.initializers:
+                if node in inits:
+                    # Reached again from its own initializers
                     ordered_initializer_ops.append(node)
                     visited.add(node)
+                    return None
+                inits.add(node)
+                return node, list(node.initializers)
+            return node, list(node.args)
+
+        def finish(node):
+            if node not in visited:
+                ordered_initializer_ops.append(node)
+                visited.add(node)
 
-        for node in initializers:
-            visit(node)
+        postorder(initializers, expand, finish)
 
         return ordered_initializer_ops
 
@@ -638,6 +807,19 @@ class Transformer(with_metaclass(Transformer_ABC_Meta, object)):
         self.initialized = True
         self.init_computation()
 
+    def close(self):
+        """
+        Releases the resources, such as threads, held by the transformer. Its
+        computations cannot be run afterwards.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 __transformer_factory = None
 
@@ -0,0 +1,257 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+An on-disk cache of transformed computations.
+
+Transforming computations runs the graph passes, the memory planner and code
+generation, which can take much longer than running small jobs. A transformer with
+a cache directory stores what it generated under a fingerprint of the op graph, and
+a later process building the same graph loads it instead of transforming again.
+"""
+from __future__ import division
+
+import hashlib
+import inspect
+import os
+import tempfile
+
+import numpy as np
+
+from ngraph.op_graph.axes import Axis, Axes
+from ngraph.op_graph.op_graph import Op
+from ngraph.util.ordered import OrderedSet
+from ngraph.util.persist import ensure_dirs_exist, pickle, pickle_load
+
+# Op attributes that do not change what the graph computes. Names, labels and
+# indices are made from global counters, and differ between processes building the
+# same graph; styles are only used for drawing graphs.
+unfingerprinted_attributes = frozenset([
+    '_NameableValue__name', 'graph_label_type', '_Op__args', '_Op__forward', 'other_deps',
+    'initializers', 'index', '_DebugInfo__code', 'lineno', 'valfun',
+    'generate_adjoints', 'style',
+])
+
+
+def graph_ops(roots):
+    """
+    Returns the ops used by roots, through args, other_deps and initializers.
+
+    Arguments:
+        roots: The ops to start from.
+
+    Returns:
+        A list of the ops, each after the ops it uses.
+    """
+    ops = []
+    visited = set()
+    for root in roots:
+        stack = [(root.forwarded, False)]
+        while stack:
+            op, expanded = stack.pop()
+            if expanded:
+                ops.append(op)
+                continue
+            if op in visited:
+                continue
+            visited.add(op)
+            stack.append((op, True))
+            children = list(op.other_deps) + list(op.args) + list(op.initializers)
+            for child in reversed(children):
+                if child.forwarded not in visited:
+                    stack.append((child.forwarded, False))
+    return ops
+
+
+def source_files(module):
+    """
+    Returns the source files of a module, or of every module in a package.
+
+    Arguments:
+        module: The module or package.
+
+    Returns:
+        A sorted list of paths.
+    """
+    if not hasattr(module, '__path__'):
+        return [inspect.getsourcefile(module)]
+    paths = []
+    for directory in module.__path__:
+        for root, dirs, files in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in files if name.endswith('.py'))
+    return sorted(paths)
+
+
+def code_version(*modules):
+    """
+    Returns a digest of the source of modules, so that changing the code that
+    transforms graphs invalidates cached transformations. A package contributes the
+    source of all of its modules, so that no module it may use is left out.
+
+    Arguments:
+        *modules: The modules or packages.
+
+    Returns:
+        A hex digest.
+    """
+    digest = hashlib.sha1()
+    for module in modules:
+        root = os.path.dirname(inspect.getsourcefile(module))
+        for path in source_files(module):
+            # Moving code between files changes the version too
+            digest.update(os.path.relpath(path, root).encode('utf-8'))
+            with open(path, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+class GraphFingerprint(object):
+    """
+    A deterministic digest of the computations of a transformer.
+
+    Ops are numbered in the order they are reached from the results, and each op
+    contributes its type, the numbers of the ops it uses and its other attributes.
+    Axes are numbered too, since axes are told apart by identity rather than name.
+    Names are left out, so graphs built in a different order still match.
+
+    Arguments:
+        results: The ops computed by the computations.
+        computations: The computations, in the order they were made.
+        config: Hashable settings of the transformer that change its output.
+
+    Attributes:
+        ops: The numbered ops.
+        op_index: Maps the ops to their numbers.
+        digest: The hex digest.
+    """
+    def __init__(self, results, computations, config):
+        self.ops = graph_ops(results)
+        self.op_index = dict((op, i) for i, op in enumerate(self.ops))
+        self.axis_index = dict()
+        digest = hashlib.sha1(repr(config).encode('utf-8'))
+        for op in self.ops:
+            digest.update(repr(self.op_value(op)).encode('utf-8'))
+        for computation in computations:
+            digest.update(repr(self.computation_value(computation)).encode('utf-8'))
+        self.digest = digest.hexdigest()
+
+    def op_value(self, op):
+        """
+        Returns: A value that only depends on the structure of op.
+        """
+        attributes = tuple(
+            (key, self.value(value)) for key, value in sorted(vars(op).items())
+            if key not in unfingerprinted_attributes
+        )
+        return (type(op).__module__, type(op).__name__,
+                tuple(self.value(x) for x in op.args),
+                tuple(self.value(x) for x in op.other_deps),
+                tuple(self.value(x) for x in op.initializers),
+                attributes)
+
+    def computation_value(self, computation):
+        """
+        Returns: A value that only depends on the signature of computation.
+        """
+        returns = computation.returns
+        if isinstance(returns, (list, tuple)):
+            returns = tuple(self.value(x) for x in returns)
+        else:
+            returns = self.value(returns)
+        return (returns, tuple(self.value(x) for x in computation.parameters))
+
+    def value(self, x):
+        """
+        Returns: A value for an attribute that can be compared across processes.
+        """
+        if isinstance(x, Op):
+            return ('op', self.op_index.get(x.forwarded, type(x).__name__))
+        elif isinstance(x, Axis):
+            # Axes are paired by identity, and their names may be made unique by counters
+            index = self.axis_index.setdefault(x, len(self.axis_index))
+            primary = self.value(x.primary_axis) if x.primary_axis is not x else None
+            return ('axis', index, type(x).__name__, x.length, x.dual_level, primary,
+                    x.is_batch, x.is_recurrent, x.match_on_length)
+        elif isinstance(x, Axes):
+            return ('axes',) + tuple(self.value(axis) for axis in x)
+        elif isinstance(x, np.ndarray):
+            return ('array', x.dtype.str, x.shape,
+                    hashlib.sha1(np.ascontiguousarray(x).view(np.uint8)).hexdigest())
+        elif isinstance(x, dict):
+            return ('dict',) + tuple(sorted((repr(k), self.value(v)) for k, v in x.items()))
+        elif isinstance(x, (list, tuple, OrderedSet)):
+            return (type(x).__name__,) + tuple(self.value(v) for v in x)
+        elif isinstance(x, (set, frozenset)):
+            return ('set',) + tuple(sorted(repr(self.value(v)) for v in x))
+        elif isinstance(x, (str, int, float, bool, slice, np.generic, np.dtype)) \
+                or x is None:
+            return repr(x)
+        # Functions, e.g. initial values, and other objects only contribute their type
+        return type(x).__name__
+
+
+class TransformCache(object):
+    """
+    A directory of transformations, one file per graph fingerprint.
+
+    Arguments:
+        directory: The directory, made when the first transformation is saved.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, digest):
+        """
+        Returns: The file holding the transformation for a fingerprint digest.
+        """
+        return os.path.join(self.directory, digest + '.pkl')
+
+    def load(self, digest):
+        """
+        Loads the transformation saved for a fingerprint digest.
+
+        Arguments:
+            digest: The hex digest of the graph fingerprint.
+
+        Returns:
+            The saved transformation, or None if there is none or it is unreadable,
+            e.g. because it refers to code that has been changed since it was saved.
+        """
+        try:
+            with open(self.path(digest), 'rb') as f:
+                return pickle_load(f)
+        except (IOError, OSError, EOFError, AttributeError, ImportError,
+                pickle.UnpicklingError):
+            return None
+
+    def save(self, digest, transformation):
+        """
+        Saves a transformation for a fingerprint digest.
+
+        The file is written under a temporary name and then renamed, so that
+        concurrent processes never load a partial file.
+
+        Arguments:
+            digest: The hex digest of the graph fingerprint.
+            transformation: A picklable transformation.
+        """
+        path = ensure_dirs_exist(self.path(digest))
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(transformation, f, protocol=2)
+            os.rename(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -135,11 +135,11 @@ class ElementWiseKernel(GPUKernel):
         self._buffer_op("update_conv", op.dims, inputs, delta, outputs)
 
     @add_op.on_type(PoolingOp)
-    def add_op(self, op, outputs, inputs, argmax):
+    def add_op(self, op, outputs, inputs, argmax=None):
         self._buffer_op("fprop_pool", op.dims, inputs, outputs, argmax)
 
     @add_op.on_type(BpropPoolOp)
-    def add_op(self, op, outputs, delta, argmax):
+    def add_op(self, op, outputs, delta, argmax=None):
         self._buffer_op("bprop_pool", op.dims, delta, outputs, argmax)
 
     @add_op.on_type(CosOneDOp)
@@ -707,7 +707,7 @@ class GPUDeviceTensor(DeviceTensor):
 
             if tensor is None:
                 return contig_tensor.get()
-            tensor[:] = contig_tensor.get()
+            tensor[...] = contig_tensor.get()
         else:
             # Tensor is just a broadcasted scalar, get scalar value and fill output array
             view = GPUArray((1, ), dtype=self.tensor.dtype, gpudata=self.tensor.gpudata)[0]
@@ -16,7 +16,10 @@
 from __future__ import division
 from __future__ import print_function
 
-from functools import wraps
+import mmap
+import sys
+from functools import partial, reduce, wraps
+from multiprocessing.pool import ThreadPool
 from operator import itemgetter
 # These are indirectly used by the generated code
 import numpy as np  # noqa
@@ -40,195 +43,361 @@ from ngraph.op_graph.op_graph import AbsoluteOneDOp, AddOneDim, AddZeroDim, Argm
     AssignOneDOp, SignOneDOp, SinOneDOp, SqrtOneDOp, SquareOneDOp, RngOp, \
     SubtractOneDim, SubtractZeroDim, \
     Sum, TanhOneDOp, TensorSizeOp, Fill, TensorDescription, Unslice, Dimshuffle, \
-    SetItemOneDOp
+    SetItemOneDOp, Function, ElementWise, AssignableTensorOp, InitTensorOp, TensorOp, \
+    TensorDot, tensor_descriptions
 from ngraph.op_graph.convolution import ConvolutionOp, update_conv, bprop_conv
 from ngraph.op_graph.pooling import PoolingOp, BpropPoolOp
 from ngraph.op_graph.debug import PrintOp
+from ngraph.analysis.fusion import cpu_fusible
+from ngraph.analysis.memory import overlapping_buffers
+from ngraph.transformers.cache import GraphFingerprint, TransformCache, code_version
+from ngraph.transformers.passes.passes import CommonSubexpressionElimination, ConstantFolding, \
+    LayoutAssignment, NativeTensorDot, NativeReduction, NativeElementwise
+from ngraph.util.ordered import OrderedSet
 
 from ngraph.transformers.base import Transformer, DeviceBufferStorage, DeviceBufferReference, \
     DeviceTensor, make_transformer_factory, set_transformer_factory
 
 
+class NumPyConvPlan(object):
+    """
+    Geometry and scratch buffers shared by all convolutions with the same shapes,
+    padding and strides.
+
+    The input is zero-padded once into a persistent buffer, and a strided view of the
+    padded input exposes every filter window so that a convolution can be done as a
+    single GEMM against the im2col matrix.
+
+    Arguments:
+        I: The input tensor, with axes C, D, H, W, N.
+        F: The filter tensor, with axes C, T, R, S, K.
+        O: The output tensor, with axes K, M, P, Q, N.
+        conv_params: Dict with padding and strides for the convolution.
+    """
+    def __init__(self, I, F, O, conv_params):
+        self.input_shape = I.tensor_description.axes.lengths
+        self.filter_shape = F.tensor_description.axes.lengths
+        self.output_shape = O.tensor_description.axes.lengths
+        self.dtype = I.tensor_description.dtype
+        self.pads = itemgetter(*('pad_' + s for s in ('d', 'h', 'w')))(conv_params)
+        self.strides = itemgetter(*('str_' + s for s in ('d', 'h', 'w')))(conv_params)
+
+        C, D, H, W, N = self.input_shape
+        _, T, R, S, K = self.filter_shape
+        _, M, P, Q, _ = self.output_shape
+
+        # The padded extent must hold the input and the last window along each axis
+        extents = [max(pad + X, (Y - 1) * stride + F)
+                   for pad, stride, X, Y, F in zip(self.pads, self.strides,
+                                                   (D, H, W), (M, P, Q), (T, R, S))]
+        self.padded_shape = tuple([C] + extents + [N])
+        self.interior = (slice(None),) + \
+            tuple(slice(pad, pad + X) for pad, X in zip(self.pads, (D, H, W))) + \
+            (slice(None),)
+        self.needs_padding = self.padded_shape != tuple(self.input_shape)
+        self.cols_shape = (C * T * R * S, M * P * Q * N)
+        self.padded = None
+        self.cols = None
+        self.padded_grad = None
+        self.grad_cols = None
+
+    @staticmethod
+    def key(I, F, O, conv_params):
+        """
+        Returns: A hashable key identifying convolutions that can share a plan.
+        """
+        return (I.tensor_description.axes.lengths,
+                F.tensor_description.axes.lengths,
+                O.tensor_description.axes.lengths,
+                I.tensor_description.dtype,
+                tuple(sorted(conv_params.items())))
+
+    def pad(self, I):
+        """
+        Returns: I, or a zero-padded copy of I in the plan's padded buffer.
+        """
+        if not self.needs_padding:
+            return I
+        if self.padded is None:
+            self.padded = np.zeros(self.padded_shape, dtype=self.dtype)
+        self.padded[self.interior] = I
+        return self.padded
+
+    def windows(self, padded):
+        """
+        A strided view of padded with axes C, T, R, S, M, P, Q, N.
+
+        Arguments:
+            padded: The padded input.
+
+        Returns: The view.
+        """
+        C, _, _, _, N = self.padded_shape
+        _, T, R, S, _ = self.filter_shape
+        _, M, P, Q, _ = self.output_shape
+        sc, sd, sh, sw, sn = padded.strides
+        str_d, str_h, str_w = self.strides
+        return np.lib.stride_tricks.as_strided(
+            padded,
+            shape=(C, T, R, S, M, P, Q, N),
+            strides=(sc, sd, sh, sw, sd * str_d, sh * str_h, sw * str_w, sn))
+
+    def im2col(self, I):
+        """
+        Copies every filter window of I into the plan's column buffer.
+
+        Arguments:
+            I: The input tensor.
+
+        Returns: The (C*T*R*S, M*P*Q*N) column matrix.
+        """
+        if self.cols is None:
+            self.cols = np.empty(self.cols_shape, dtype=self.dtype)
+        windows = self.windows(self.pad(I))
+        np.copyto(self.cols.reshape(windows.shape), windows)
+        return self.cols
+
+    def col2im(self, F, E, gI):
+        """
+        Computes the gradient with respect to the input of a convolution.
+
+        The gradient of every filter window is computed with a single GEMM, and the
+        windows are then scatter-added into a padded gradient buffer, one filter tap
+        at a time. The filter is used in its natural layout, so no flipped copy is
+        needed.
+
+        Arguments:
+            F: The filter tensor, with axes C, T, R, S, K.
+            E: The output gradient, with axes K, M, P, Q, N.
+            gI: The input gradient, with axes C, D, H, W, N.
+        """
+        if self.grad_cols is None:
+            self.grad_cols = np.empty(self.cols_shape, dtype=self.dtype)
+        K = E.shape[0]
+        A, B = F.reshape((-1, K)), E.reshape((K, -1))
+        if np.result_type(A, B) == self.dtype:
+            np.dot(A, B, out=self.grad_cols)
+        else:
+            self.grad_cols[()] = np.dot(A, B)
+
+        if self.needs_padding:
+            if self.padded_grad is None:
+                self.padded_grad = np.empty(self.padded_shape, dtype=self.dtype)
+            padded_grad = self.padded_grad
+        else:
+            padded_grad = gI
+        padded_grad.fill(0)
+
+        C, T, R, S, _ = self.filter_shape
+        _, M, P, Q, N = self.output_shape
+        str_d, str_h, str_w = self.strides
+        grad_windows = self.grad_cols.reshape((C, T, R, S, M, P, Q, N))
+        for t, r, s in itt.product(range(T), range(R), range(S)):
+            padded_grad[:,
+                        t:t + (M - 1) * str_d + 1:str_d,
+                        r:r + (P - 1) * str_h + 1:str_h,
+                        s:s + (Q - 1) * str_w + 1:str_w,
+                        :] += grad_windows[:, t, r, s]
+
+        if self.needs_padding:
+            gI[()] = padded_grad[self.interior]
+
+
 class NumPyConvEngine(object):
     @staticmethod
     def all_conv_code():
         pycode = """
-        def fprop_conv(self, conv_slices, I, F, O):
-            mSlice, pSlice, qSlice, _, _, _ = conv_slices
-            K, M, P, Q, N = O.shape
-
-            for (m, mS), (p, pS), (q, qS) in itt.product(enumerate(mSlice),
-                                                         enumerate(pSlice),
-                                                         enumerate(qSlice)):
-                sliceT, sliceD, _ = mS
-                sliceR, sliceH, _ = pS
-                sliceS, sliceW, _ = qS
-                slicedF = F[:, sliceT, sliceR, sliceS, :].reshape((-1, K))
-                slicedI = I[:, sliceD, sliceH, sliceW, :].reshape((-1, N))
-                O[:, m, p, q, :] = np.dot(slicedF.T, slicedI)
-
-        def bprop_conv(self, conv_slices, E, F, gI):
-            _, _, _, mSlice, pSlice, qSlice = conv_slices
-            F = np.transpose(F[:, ::-1, ::-1, ::-1, :], (4, 1, 2, 3, 0)).copy()
-            K, M, P, Q, N = gI.shape
-
-            for (m, mS), (p, pS), (q, qS) in itt.product(enumerate(mSlice),
-                                                         enumerate(pSlice),
-                                                         enumerate(qSlice)):
-                sliceT, sliceD, _ = mS
-                sliceR, sliceH, _ = pS
-                sliceS, sliceW, _ = qS
-                slicedF = F[:, sliceT, sliceR, sliceS, :].reshape((-1, K))
-                slicedI = E[:, sliceD, sliceH, sliceW, :].reshape((-1, N))
-                gI[:, m, p, q, :] = np.dot(slicedF.T, slicedI)
-
-        def update_conv(self, conv_slices, I, E, U):
-            mSlice, pSlice, qSlice, _, _, _ = conv_slices
-            K, M, P, Q, N = E.shape
-            C, _, _, _, K = U.shape
-            U.fill(0.0)
-
-            for (m, mS), (p, pS), (q, qS) in itt.product(enumerate(mSlice),
-                                                         enumerate(pSlice),
-                                                         enumerate(qSlice)):
-                sliceT, sliceD, tlen = mS
-                sliceR, sliceH, rlen = pS
-                sliceS, sliceW, slen = qS
-                slicedI = I[:, sliceD, sliceH, sliceW, :].reshape((-1, N))
-                slicedE = E[:, m, p, q, :]
-                update = np.dot(slicedI, slicedE.T).reshape((C, tlen, rlen, slen, K))
-                U[:, sliceT, sliceR, sliceS, :] += update
-
-        def fprop_pool(self, pool_slices, arrI, arrO):
-            kSlice, mSlice, pSlice, qSlice, op, arrA = pool_slices
-            K, M, P, Q, N = arrO.shape
-
-
-            for (k, kS), (m, mS), (p, pS), (q, qS) in itt.product(enumerate(kSlice),
-                                                                  enumerate(mSlice),
-                                                                  enumerate(pSlice),
-                                                                  enumerate(qSlice)):
-                sliceC, _ = kS
-                sliceD, _ = mS
-                sliceH, _ = pS
-                sliceW, _ = qS
-
-                sliceI = arrI[sliceC, sliceD, sliceH, sliceW, :].reshape(-1, N)
-                if op == "max":
-                    arrA[k, m, p, q, :] = np.argmax(sliceI, axis=0)
-                    arrO[k, m, p, q, :] = np.max(sliceI, axis=0)
-                elif op == "avg":
-                    arrO[k, m, p, q, :] = np.mean(sliceI, axis=0)
-                elif op == "l2":
-                    arrO[k, m, p, q, :] = np.sqrt(np.sum(np.square(sliceI), axis=0))
-
-        def bprop_pool(self, pool_slices, arrE, arrD):
-            kSlice, mSlice, pSlice, qSlice, op, arrA = pool_slices
-            arrD[:] = 0
-            K, M, P, Q, N = arrE.shape
-
-            for (k, kS), (m, mS), (p, pS), (q, qS) in itt.product(enumerate(kSlice),
-                                                                  enumerate(mSlice),
-                                                                  enumerate(pSlice),
-                                                                  enumerate(qSlice)):
-                sliceC, clen = kS
-                sliceD, dlen = mS
-                sliceH, hlen = pS
-                sliceW, wlen = qS
-
-                patch_in = (sliceC, sliceD, sliceH, sliceW, slice(None))
-                patch_out = (k, m, p, q, slice(None))
-                sliceB = arrD[patch_in].reshape((-1, N))
-                if op == "max":
-                    max_n = arrA[patch_out]
-                    sliceB[max_n, list(range(N))] += arrE[patch_out]
-                elif op == "avg":
-                    sliceB += arrE[patch_out] * (1.0 / sliceB.shape[0])
-                else:
-                    raise NotImplementedError
-                arrD[patch_in] = sliceB.reshape((clen, dlen, hlen, wlen, N))
+        def conv_gemm(self, A, B, out):
+            if out.flags.c_contiguous and out.dtype == np.result_type(A, B):
+                np.dot(A, B, out=out.reshape((A.shape[0], B.shape[1])))
+            else:
+                out[()] = np.dot(A, B).reshape(out.shape)
+
+        def fprop_conv(self, conv_plan, I, F, O):
+            K = O.shape[0]
+            self.conv_gemm(F.reshape((-1, K)).T, conv_plan.im2col(I), O)
+
+        def bprop_conv(self, conv_plan, E, F, gI):
+            conv_plan.col2im(F, E, gI)
+
+        def update_conv(self, conv_plan, I, E, U, reuse_cols=False):
+            cols = conv_plan.cols if reuse_cols else conv_plan.im2col(I)
+            K = E.shape[0]
+            self.conv_gemm(cols, E.reshape((K, -1)).T, U)
+
+        def fprop_pool(self, pool_plan, arrI, arrO, arrA=None):
+            pool_plan.fprop(arrI, arrO, arrA)
+
+        def bprop_pool(self, pool_plan, arrE, arrD, arrA=None):
+            pool_plan.bprop(arrE, arrD, arrA)
         """
         return pycode
 
-    @staticmethod
-    def get_slices(I, F, O, conv_params):
-        C, D, H, W, _ = I.tensor_description.axes.lengths
-        C, T, R, S, K = F.tensor_description.axes.lengths
-        K, M, P, Q, _ = O.tensor_description.axes.lengths
-        pad_d, pad_h, pad_w = itemgetter(*('pad_' + s for s in ('d', 'h', 'w')))(conv_params)
-        str_d, str_h, str_w = itemgetter(*('str_' + s for s in ('d', 'h', 'w')))(conv_params)
-        mSlice = [NumPyConvEngine.fprop_slice(m, T, D, pad_d, str_d) for m in range(M)]
-        pSlice = [NumPyConvEngine.fprop_slice(p, R, H, pad_h, str_h) for p in range(P)]
-        qSlice = [NumPyConvEngine.fprop_slice(q, S, W, pad_w, str_w) for q in range(Q)]
-        dSlice = [NumPyConvEngine.bprop_slice(d, T, M, pad_d, str_d) for d in range(D)]
-        hSlice = [NumPyConvEngine.bprop_slice(h, R, P, pad_h, str_h) for h in range(H)]
-        wSlice = [NumPyConvEngine.bprop_slice(w, S, Q, pad_w, str_w) for w in range(W)]
-
-        return (mSlice, pSlice, qSlice, dSlice, hSlice, wSlice)
 
-    @staticmethod
-    def fprop_slice(q, S, X, padding, strides):
-        firstF = 0
-        lastF = S - 1
-        qs = q * strides - padding
-        x2 = qs + lastF
-        if qs < 0:
-            firstF = -qs
-            qs = 0
-        if x2 >= X:
-            dif = x2 - X + 1
-            lastF -= dif
-            x2 -= dif
-        return (slice(firstF, lastF + 1), slice(qs, x2 + 1), lastF - firstF + 1)
+class NumPyPoolPlan(object):
+    """
+    Geometry and scratch buffers shared by all poolings with the same shapes and
+    pool_params.
+
+    The input is padded once into a persistent buffer, with -inf for max pooling so that
+    padding is never selected, and a strided view of the padded input exposes every
+    window. Average and l2 pooling are a single reduction over the view; max pooling
+    walks the window positions, keeping the maximum so far and the index within the
+    window where it was found.
+
+    Arguments:
+        I: The input tensor, with axes C, D, H, W, N.
+        O: The output tensor, with axes K, M, P, Q, N.
+        pool_params: Dict with the window shape, padding, strides and pooling op.
+    """
+    def __init__(self, I, O, pool_params):
+        self.input_shape = I.tensor_description.axes.lengths
+        self.output_shape = O.tensor_description.axes.lengths
+        self.dtype = I.tensor_description.dtype
+        self.op = pool_params['op']
+        self.window = itemgetter('J', 'T', 'R', 'S')(pool_params)
+        self.pads = itemgetter(*('pad_' + s for s in ('c', 'd', 'h', 'w')))(pool_params)
+        self.strides = itemgetter(*('str_' + s for s in ('c', 'd', 'h', 'w')))(pool_params)
+
+        C, D, H, W, N = self.input_shape
+        K, M, P, Q, _ = self.output_shape
+
+        # The padded extent must hold the input and the last window along each axis
+        extents = [max(pad + X, (Y - 1) * stride + F)
+                   for pad, stride, X, Y, F in zip(self.pads, self.strides, (C, D, H, W),
+                                                   (K, M, P, Q), self.window)]
+        self.padded_shape = tuple(extents + [N])
+        self.interior = tuple(slice(pad, pad + X)
+                              for pad, X in zip(self.pads, (C, D, H, W))) + (slice(None),)
+        self.needs_padding = self.padded_shape != tuple(self.input_shape)
+        self.pad_value = -np.inf if self.op == 'max' else 0
+
+        # Average pooling divides by the number of input elements in each window
+        counts = [np.minimum(np.arange(Y) * stride - pad + F, X)
+                  - np.maximum(np.arange(Y) * stride - pad, 0)
+                  for pad, stride, X, Y, F in zip(self.pads, self.strides, (C, D, H, W),
+                                                  (K, M, P, Q), self.window)]
+        scale = 1.0 / reduce(np.multiply.outer, counts)
+        self.scale = scale[..., np.newaxis].astype(self.dtype)
+
+        self.padded = None
+        self.padded_grad = None
+        self.scratch = None
+        self.mask = None
 
     @staticmethod
-    def bprop_slice(x, S, Q, padding, strides):
-        qs = x - (S - padding - 1)
-        firstF = None
-        for s in range(S):  # TODO remove loop logic here.
-            q = qs + s
-            if q % strides == 0:
-                q //= strides
-                if q >= 0 and q < Q:
-                    if firstF is None:
-                        firstF = s
-                        firstE = q
-                    lastF = s
-                    lastE = q
-        if firstF is None:
-            return (slice(0, 0, 1), slice(0, 0, 1), 0)
-        return (slice(firstF, lastF + 1, strides), slice(firstE, lastE + 1, 1), 0)
-
-
-class NumPyPoolEngine(object):
-    @staticmethod
-    def get_slices(I, O, pool_params):
-        C, D, H, W, _ = I.tensor_description.axes.lengths
-        K, M, P, Q, N = O.tensor_description.axes.lengths
+    def key(I, O, pool_params):
+        """
+        Returns: A hashable key identifying poolings that can share a plan.
+        """
+        return (I.tensor_description.axes.lengths,
+                O.tensor_description.axes.lengths,
+                I.tensor_description.dtype,
+                tuple(sorted(pool_params.items())))
 
-        J, T, R, S, op = itemgetter(*('J', 'T', 'R', 'S', 'op'))(pool_params)
-        p_c, p_d, p_h, p_w = itemgetter(*('pad_' + s for s in ('c', 'd', 'h', 'w')))(pool_params)
-        s_c, s_d, s_h, s_w = itemgetter(*('str_' + s for s in ('c', 'd', 'h', 'w')))(pool_params)
+    def pad(self, I):
+        """
+        Returns: I, or a padded copy of I in the plan's padded buffer.
+        """
+        if not self.needs_padding:
+            return I
+        if self.padded is None:
+            self.padded = np.full(self.padded_shape, self.pad_value, dtype=self.dtype)
+        self.padded[self.interior] = I
+        return self.padded
+
+    def windows(self, padded):
+        """
+        A strided view of padded with axes J, T, R, S, K, M, P, Q, N.
 
-        kSlice = [NumPyPoolEngine.pool_slice(k, J, C, p_c, s_c) for k in range(K)]
-        mSlice = [NumPyPoolEngine.pool_slice(m, T, D, p_d, s_d) for m in range(M)]
-        pSlice = [NumPyPoolEngine.pool_slice(p, R, H, p_h, s_h) for p in range(P)]
-        qSlice = [NumPyPoolEngine.pool_slice(q, S, W, p_w, s_w) for q in range(Q)]
-        array_argmax = np.empty((K, M, P, Q, N), dtype=np.uint32) if op == "max" else None
+        Arguments:
+            padded: The padded input.
 
-        return (kSlice, mSlice, pSlice, qSlice, op, array_argmax)
+        Returns: The view.
+        """
+        K, M, P, Q, N = self.output_shape
+        sc, sd, sh, sw, sn = padded.strides
+        str_c, str_d, str_h, str_w = self.strides
+        return np.lib.stride_tricks.as_strided(
+            padded,
+            shape=self.window + (K, M, P, Q, N),
+            strides=(sc, sd, sh, sw, sc * str_c, sd * str_d, sh * str_h, sw * str_w, sn))
+
+    def fprop(self, I, O, A):
+        """
+        Pools I into O.
 
-    @staticmethod
-    def pool_slice(q, S, X, padding, strides):
-        qs = q * strides - padding
-        firstI = None
-        for s in range(S):
-            x = qs + s
-            if x >= 0 and x < X:
-                if firstI is None:
-                    firstI = x
-                lastI = x
-        return (slice(firstI, lastI + 1), lastI - firstI + 1)
+        Arguments:
+            I: The input tensor.
+            O: The output tensor.
+            A: For max pooling, receives the index of the maximum within each window.
+        """
+        windows = self.windows(self.pad(I))
+        window_axes = (0, 1, 2, 3)
+        if self.op == 'max':
+            if self.mask is None:
+                self.mask = np.empty(self.output_shape, dtype=np.bool_)
+            taps = enumerate(np.ndindex(*self.window))
+            _, first = next(taps)
+            O[()] = windows[first]
+            A.fill(0)
+            for index, tap in taps:
+                # Strictly greater, so ties keep the first position, as np.argmax does
+                np.greater(windows[tap], O, out=self.mask)
+                np.copyto(A, index, where=self.mask)
+                np.maximum(O, windows[tap], out=O)
+        elif self.op == 'avg':
+            np.sum(windows, axis=window_axes, out=O)
+            np.multiply(O, self.scale, out=O)
+        elif self.op == 'l2':
+            np.sqrt(np.sum(np.square(windows), axis=window_axes), out=O)
+        else:
+            raise NotImplementedError
+
+    def bprop(self, E, D, A):
+        """
+        Computes the gradient D of the pooling input from the output gradient E.
+
+        Every window position is handled for all outputs at once, scatter-adding into a
+        padded gradient buffer through a strided slice.
+
+        Arguments:
+            E: The output gradient.
+            D: The input gradient.
+            A: For max pooling, the window indices written by fprop.
+        """
+        if self.needs_padding:
+            if self.padded_grad is None:
+                self.padded_grad = np.empty(self.padded_shape, dtype=self.dtype)
+            padded_grad = self.padded_grad
+        else:
+            padded_grad = D
+        padded_grad.fill(0)
+
+        if self.scratch is None:
+            self.scratch = np.empty(self.output_shape, dtype=self.dtype)
+        if self.op == 'max':
+            if self.mask is None:
+                self.mask = np.empty(self.output_shape, dtype=np.bool_)
+        elif self.op == 'avg':
+            np.multiply(E, self.scale, out=self.scratch)
+        else:
+            raise NotImplementedError
+
+        K, M, P, Q, _ = self.output_shape
+        str_c, str_d, str_h, str_w = self.strides
+        for index, (j, t, r, s) in enumerate(np.ndindex(*self.window)):
+            if self.op == 'max':
+                np.equal(A, index, out=self.mask)
+                np.multiply(E, self.mask, out=self.scratch)
+            padded_grad[j:j + (K - 1) * str_c + 1:str_c,
+                        t:t + (M - 1) * str_d + 1:str_d,
+                        r:r + (P - 1) * str_h + 1:str_h,
+                        s:s + (Q - 1) * str_w + 1:str_w,
+                        :] += self.scratch
+
+        if self.needs_padding:
+            D[()] = padded_grad[self.interior]
 
 
 class NumPyDeviceBufferStorage(DeviceBufferStorage):
@@ -243,6 +412,13 @@ class NumPyDeviceBufferStorage(DeviceBufferStorage):
                                                           tensor_description.name,
                                                           shape_str))
 
+    @property
+    def planned_buffer(self):
+        """
+        :return: The Buffer the memory planner made for the tensors of this storage.
+        """
+        return next(iter(self.views)).tensor_description.buffer
+
     @property
     def alloc_name(self):
         """
@@ -269,11 +445,21 @@ class NumPyDeviceBufferStorage(DeviceBufferStorage):
         self.transformer.allocate_storage_code.append("def {}(self):", self.alloc_name)
         with indenting(self.transformer.allocate_storage_code):
             elts = self.bytes // self.dtype.itemsize
-            self.transformer.allocate_storage_code.append(
-                """
-                self.{}(np.empty({}, dtype=np.dtype('{}')))
-                """,
-                self.update_name, elts, self.dtype.name)
+            if self.transformer.arena_alignment is None:
+                self.transformer.allocate_storage_code.append(
+                    """
+                    self.{}(np.empty({}, dtype=np.dtype('{}')))
+                    """,
+                    self.update_name, elts, self.dtype.name)
+            else:
+                offset = self.transformer.arena_offset(elts * self.dtype.itemsize,
+                                                       self.planned_buffer.offset)
+                self.transformer.allocate_storage_code.append(
+                    """
+                    self.{}(self.arena[{}:{}].view(np.dtype('{}')))
+                    """,
+                    self.update_name, offset, offset + elts * self.dtype.itemsize,
+                    self.dtype.name)
             self.transformer.allocate_storage_code.endl()
 
         self.transformer.allocate_storage_code.append("def {}(self, buffer):",
@@ -295,13 +481,61 @@ class NumPyDeviceTensor(DeviceTensor):
     def __init__(self, transformer, device_buffer, tensor_description, **kwargs):
         super(NumPyDeviceTensor, self).__init__(transformer, device_buffer, tensor_description,
                                                 **kwargs)
-        self.__tensor = None
+        self.own_storage = None
 
     @property
     def tensor(self):
-        if self.__tensor is None:
-            self.__tensor = getattr(self.transformer.model, self.name)
-        return self.__tensor
+        # Not cached, since the storage of the model may be rebound
+        return getattr(self.transformer.model, self.name)
+
+    @property
+    def storage_name(self):
+        """
+        :return: Name of the storage of the tensor in the model.
+        """
+        return self.device_buffer.name
+
+    @property
+    def storage_bytes(self):
+        """
+        :return: Size of the storage of the tensor.
+        """
+        return self.device_buffer.bytes
+
+    def bind(self, array):
+        tensor_description = self.tensor_description
+        if not isinstance(array, np.ndarray) or array.dtype != tensor_description.dtype \
+                or array.shape != tuple(tensor_description.shape) \
+                or array.strides != tuple(tensor_description.strides):
+            raise ValueError((
+                'Cannot bind {name} to an array of type {type}, shape {shape} and '
+                'strides {strides}; it needs a {dtype} array with shape {td_shape} '
+                'and strides {td_strides}.'
+            ).format(
+                name=self.name,
+                type=getattr(array, 'dtype', type(array).__name__),
+                shape=getattr(array, 'shape', None),
+                strides=getattr(array, 'strides', None),
+                dtype=tensor_description.dtype,
+                td_shape=tuple(tensor_description.shape),
+                td_strides=tuple(tensor_description.strides),
+            ))
+        # The array replaces the whole storage, which must hold exactly this tensor
+        if tensor_description.offset != 0 or self.storage_bytes != array.nbytes \
+                or not array.flags.c_contiguous:
+            raise ValueError((
+                'Cannot bind {name}, because its storage is not a contiguous tensor '
+                'of its own.'
+            ).format(name=self.name))
+        model = self.transformer.model
+        if self.own_storage is None:
+            self.own_storage = getattr(model, self.storage_name)
+        getattr(model, 'update_' + self.storage_name)(array.reshape(-1))
+
+    def unbind(self):
+        if self.own_storage is not None:
+            getattr(self.transformer.model, 'update_' + self.storage_name)(self.own_storage)
+            self.own_storage = None
 
     @property
     def ref_str(self):
@@ -331,7 +565,7 @@ class NumPyDeviceTensor(DeviceTensor):
     def get(self, tensor):
         if tensor is None:
             return self.tensor
-        tensor[:] = self.tensor
+        tensor[...] = self.tensor
 
     def __getitem__(self, key):
         return self.tensor.__getitem__(key)
@@ -343,6 +577,43 @@ class NumPyDeviceTensor(DeviceTensor):
         self.tensor.__setitem__(key, value)
 
 
+class NumPyCachedDeviceTensor(NumPyDeviceTensor):
+    """
+    A device tensor of a model loaded from a TransformCache.
+
+    Arguments:
+        transformer: The associated transformer.
+        tensor_description: The description of the tensor.
+        model_name: The name of the tensor in the model, which may differ from the name
+            of the device tensor if the name is already used in this process.
+        model_storage_name: The name of the storage of the tensor in the model.
+        model_storage_bytes: The size of the storage of the tensor.
+    """
+    def __init__(self, transformer, tensor_description, model_name, model_storage_name,
+                 model_storage_bytes, **kwargs):
+        super(NumPyCachedDeviceTensor, self).__init__(transformer, None, tensor_description,
+                                                      name=model_name, **kwargs)
+        self.model_name = model_name
+        self.model_storage_name = model_storage_name
+        self.model_storage_bytes = model_storage_bytes
+
+    @property
+    def tensor(self):
+        return getattr(self.transformer.model, self.model_name)
+
+    @property
+    def ref_str(self):
+        return "self." + self.model_name
+
+    @property
+    def storage_name(self):
+        return self.model_storage_name
+
+    @property
+    def storage_bytes(self):
+        return self.model_storage_bytes
+
+
 def get_tensors(f):
     def tensor(x):
         if isinstance(x, NumPyDeviceTensor):
@@ -356,13 +627,104 @@ def get_tensors(f):
     return helper
 
 
+def run_parallel(thread_pool, tasks):
+    """
+    Runs independent tasks of a computation concurrently and waits for all of them.
+
+    The calling thread runs the first task itself, so a pool with one thread less than
+    the number of tasks keeps every task busy.
+
+    Arguments:
+        thread_pool: The ThreadPool running the other tasks.
+        tasks: Functions without arguments.
+    """
+    results = [thread_pool.apply_async(task) for task in tasks[1:]]
+    tasks[0]()
+    for result in results:
+        result.get()
+
+
+def run_chunks(thread_pool, task, length, chunks):
+    """
+    Splits range(length) into contiguous chunks of about the same size and runs a task
+    on each of them concurrently.
+
+    Arguments:
+        thread_pool: The ThreadPool running all but the first chunk.
+        task: A function called with the index, start and end of a chunk.
+        length: The length of the range.
+        chunks: The number of chunks.
+    """
+    bounds = [length * i // chunks for i in range(chunks + 1)]
+    run_parallel(thread_pool, [partial(task, i, lo, hi)
+                               for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))])
+
+
+def merges_in_place(td, flattened):
+    """
+    Returns: True if the flattened axes of a tensor can be flattened, in order, without a
+    copy.
+    """
+    positions = [td.axes.index(axis) for axis in flattened]
+    strides = [td.strides[i] for i in positions]
+    lengths = [td.shape[i] for i in positions]
+    return all(outer == inner * length
+               for outer, inner, length in zip(strides, strides[1:], lengths[1:]))
+
+
+def matrix_view(td, rows, columns):
+    """
+    Makes the code viewing a tensor as a matrix.
+
+    Arguments:
+        td (TensorDescription): The tensor.
+        rows: The axes flattened into the rows of the matrix, in order.
+        columns: The axes flattened into the columns of the matrix, in order.
+
+    Returns:
+        A format string for the code, with {} for the tensor. The view only copies the
+        tensor if the rows or the columns cannot be flattened in place.
+    """
+    code = '{}'
+    positions = tuple(td.axes.index(axis) for axis in list(rows) + list(columns))
+    if positions != tuple(range(len(positions))):
+        code = 'np.transpose({}, {})'.format(code, positions)
+    shape = tuple(reduce(lambda size, axis: size * axis.length, group, 1)
+                  for group in (rows, columns))
+    if tuple(td.shape[i] for i in positions) != shape:
+        code = '{}.reshape({})'.format(code, shape)
+    return code
+
+
+def reduction_axis(op):
+    """
+    Describes a NumPy reduction computing a ReductionOp.
+
+    Arguments:
+        op (ReductionOp): The reduction.
+
+    Returns:
+        The axis argument of the reduction, and the permutation viewing the result of
+        op in the order of the axes of its argument that are not reduced.
+    """
+    x, = op.args
+    axis = tuple(x.axes.index(reduction_axis) for reduction_axis in op.reduction_axes)
+    kept = x.axes - op.reduction_axes
+    order = tuple(op.axes.index(kept_axis) for kept_axis in kept)
+    return axis[0] if len(axis) == 1 else axis, order
+
+
 class NumPyCodeGenerator(PyGen):
     def __init__(self, **kwargs):
         super(NumPyCodeGenerator, self).__init__(**kwargs)
         self.conv_params = dict()
-        self.conv_slices = dict()
+        self.conv_plans = []
+        self.conv_plan_ids = dict()
+        self.conv_cols = dict()
         self.pool_params = dict()
-        self.pool_slices = dict()
+        self.pool_plans = []
+        self.pool_plan_ids = dict()
+        self.chunk_buffers = []
 
     def name(self, x):
         if isinstance(x, NumPyDeviceBufferStorage):
@@ -371,6 +733,187 @@ class NumPyCodeGenerator(PyGen):
             return x.ref_str
         return x
 
+    def generate_fused(self, instructions, outs, call_infos, exported, chunk_bytes,
+                       threads=1, threshold=0):
+        """
+        Generates one cache-blocked loop for a kernel of fused elementwise ops.
+
+        The tensors are walked in chunks small enough for everything touched by the
+        kernel to stay in cache, and the whole chain is applied to each chunk. Values
+        that are only used inside the kernel are kept in chunk-sized buffers instead of
+        being written to their tensors, and views inside the kernel are aliases for the
+        chunk of their argument.
+
+        With more than one thread, large kernels are split into contiguous ranges that
+        run concurrently on the intra-op thread pool, each walking its own range in
+        chunks, with its own row of the chunk-sized buffers.
+
+        Arguments:
+            instructions: The ops of the kernel, in order.
+            outs: The output device tensor of each instruction.
+            call_infos: The argument device tensors of each instruction.
+            exported: The instructions whose values must be written to their tensors.
+            chunk_bytes: Approximate number of bytes touched by one chunk.
+            threads: The number of ranges the kernel may be split into.
+            threshold: The smallest number of elements worth splitting.
+        """
+        device_ops = [op for op in instructions if op.is_device_op]
+        if not device_ops:
+            return
+        tensors = set(out for op, out in zip(instructions, outs) if op.is_device_op)
+        for op, call_info in zip(instructions, call_infos):
+            if op.is_device_op:
+                tensors.update(call_info)
+        shape = device_ops[0].tensor_description().shape
+        itemsize = max(tensor.dtype.itemsize for tensor in tensors)
+        # Tensors are read or written once per chunk, and every op may need a buffer
+        arrays = len(tensors) + len(device_ops)
+        chunk = None
+        split = False
+        if len(shape) == 1:
+            length, = shape
+            if length * arrays * itemsize > chunk_bytes:
+                # Very small chunks would be dominated by the cost of the numpy calls
+                chunk = max(4096, chunk_bytes // (arrays * itemsize))
+            split = threads > 1 and length >= max(threshold, threads)
+            if split and chunk is None:
+                chunk = -(-length // threads)
+
+        def tensor_value(tensor):
+            ndim = len(tensor.tensor_description.shape)
+            value = self.name(tensor)
+            if ndim > 1:
+                value += ".reshape(-1)"
+            if chunk is not None and ndim > 0:
+                value += "[lo:lo + n]"
+            return value
+
+        values = dict()
+        for op, out in zip(instructions, outs):
+            if not op.is_device_op:
+                arg, = op.args
+                values[op] = values[arg] if arg in values else tensor_value(out)
+            elif op in exported:
+                values[op] = tensor_value(out)
+            else:
+                buffer_name = "self.chunk_{}".format(len(self.chunk_buffers))
+                if split:
+                    self.chunk_buffers.append((buffer_name, (threads, chunk), out.dtype))
+                    values[op] = buffer_name + "[i, :n]"
+                elif chunk is not None:
+                    self.chunk_buffers.append((buffer_name, (chunk,), out.dtype))
+                    values[op] = buffer_name + "[:n]"
+                else:
+                    self.chunk_buffers.append((buffer_name, shape, out.dtype))
+                    values[op] = buffer_name
+
+        if split:
+            self.append("def chunk_task(i, start, stop):")
+            self.indent(1)
+            self.append("for lo in range(start, stop, {}):", chunk)
+            self.indent(1)
+            self.append("n = min({}, stop - lo)", chunk)
+        elif chunk is not None:
+            self.append("for lo in range(0, {}, {}):", length, chunk)
+            self.indent(1)
+            self.append("n = min({}, {} - lo)", chunk, length)
+        for op, call_info in zip(instructions, call_infos):
+            if op.is_device_op:
+                args = [values[arg] if arg in values else tensor_value(tensor)
+                        for arg, tensor in zip(op.args, call_info)]
+                self.generate_op(op, values[op], *args)
+        if split:
+            self.indent(-2)
+            self.append("run_chunks(self.intra_op_pool, chunk_task, {}, {})", length, threads)
+        elif chunk is not None:
+            self.indent(-1)
+
+    def generate_chunked(self, op, out, call_info, chunks, threshold):
+        """
+        Generates code splitting a large elementwise op or reduction into contiguous
+        chunks that run concurrently on the intra-op thread pool.
+
+        Elementwise ops are split along their flattened tensors. Reductions with enough
+        outputs are split along the axis that is kept; other reductions are split along
+        a reduced axis into partial results, which are then reduced again.
+
+        Arguments:
+            op: The op.
+            out: The output device tensor of the op.
+            call_info: The argument device tensors of the op.
+            chunks: The number of chunks.
+            threshold: The smallest number of elements worth splitting.
+
+        Returns:
+            True if code was generated, False if the op should run in one piece.
+        """
+        if isinstance(op, ElementWise):
+            shape = out.tensor_description.shape
+            if len(shape) != 1 or shape[0] < max(threshold, chunks):
+                return False
+            if any(x.tensor_description.shape not in (shape, ()) for x in call_info):
+                return False
+            args = [self.name(x) + "[lo:hi]" if len(x.tensor_description.shape) else x
+                    for x in call_info]
+            self.append("def chunk_task(i, lo, hi):")
+            with indenting(self):
+                self.generate_op(op, self.name(out) + "[lo:hi]", *args)
+            self.append("run_chunks(self.intra_op_pool, chunk_task, {}, {})", shape[0], chunks)
+            return True
+        elif isinstance(op, (Sum, Max, Min)):
+            x, = call_info
+            shape = x.tensor_description.shape
+            out_shape = out.tensor_description.shape
+            if len(shape) not in (1, 2) or np.prod(shape) < threshold:
+                return False
+            axis, _ = reduction_axis(op)
+
+            def chunk_of(name, chunk_axis):
+                return name + ("[:, lo:hi]" if chunk_axis == 1 else "[lo:hi]")
+
+            if len(out_shape) == 1 and out_shape[0] >= chunks * 64:
+                # Every chunk reduces its own slice of the axis that is kept
+                self.append("def chunk_task(i, lo, hi):")
+                with indenting(self):
+                    self.generate_op(op, self.name(out) + "[lo:hi]",
+                                     chunk_of(self.name(x), 1 - axis))
+                self.append("run_chunks(self.intra_op_pool, chunk_task, {}, {})",
+                            out_shape[0], chunks)
+                return True
+            chunk_axis = axis if isinstance(axis, int) else axis[0]
+            if shape[chunk_axis] < chunks:
+                return False
+            partials = "self.chunk_{}".format(len(self.chunk_buffers))
+            self.chunk_buffers.append((partials, (chunks,) + out_shape, out.dtype))
+            self.append("def chunk_task(i, lo, hi):")
+            with indenting(self):
+                self.generate_op(op, partials + "[i, ...]", chunk_of(self.name(x), chunk_axis))
+            self.append("run_chunks(self.intra_op_pool, chunk_task, {}, {})",
+                        shape[chunk_axis], chunks)
+            function = next(function for reduction, function
+                            in ((Sum, "np.sum"), (Max, "np.max"), (Min, "np.min"))
+                            if isinstance(op, reduction))
+            self.append("{}({{}}, axis=0, out={{}})".format(function), partials, out)
+            return True
+        return False
+
+    def generate_reduction(self, function, op, out, x):
+        """
+        Generates a NumPy reduction of x over the reduction axes of op. The result is
+        written through a view of out with the axes in the order they have in x, and
+        NumPy walks x in the order of its strides.
+
+        Arguments:
+            function: The NumPy reduction.
+            op: The ReductionOp.
+            out: The output device tensor of op.
+            x: The argument device tensor of op.
+        """
+        axis, order = reduction_axis(op)
+        if order != tuple(range(len(order))):
+            out = "np.transpose({}, {})".format(self.name(out), order)
+        self.append("{}({{}}, axis={}, out={{}})".format(function, axis), x, out)
+
     @generic_method(Op)
     def generate_op(self, op, *args):
         if op.is_device_op:
@@ -397,41 +940,104 @@ class NumPyCodeGenerator(PyGen):
 
     @generate_op.on_type(Argmax)
     def generate_op(self, op, out, x):
-        self.append("np.ndarray.argmax({}, 0, out={})", x, out)
+        self.generate_reduction("np.argmax", op, out, x)
 
     @generate_op.on_type(Argmin)
     def generate_op(self, op, out, x):
-        self.append("np.ndarray.argmin({}, 0, out={})", x, out)
+        self.generate_reduction("np.argmin", op, out, x)
+
+    def conv_plan_id(self, inputs, filters, outputs, conv_params):
+        """
+        Finds the plan shared by convolutions with this geometry, making it if needed.
+
+        Arguments:
+            inputs: Device tensor for the convolution input.
+            filters: Device tensor for the filters.
+            outputs: Device tensor for the convolution output.
+            conv_params: Padding and strides of the convolution.
+
+        Returns:
+            The index of the plan in conv_plans.
+        """
+        key = NumPyConvPlan.key(inputs, filters, outputs, conv_params)
+        plan_id = self.conv_plan_ids.get(key, None)
+        if plan_id is None:
+            plan_id = len(self.conv_plans)
+            self.conv_plans.append(NumPyConvPlan(inputs, filters, outputs, conv_params))
+            self.conv_plan_ids[key] = plan_id
+        return plan_id
+
+    def invalidate_conv_cols(self, written):
+        """
+        Forgets column buffers whose input may have been overwritten.
+
+        conv_cols maps a plan to the input tensor whose im2col matrix is in the plan's
+        column buffer, so that update_conv can reuse the matrix made by fprop_conv. Once
+        the storage of that input is written, e.g. because the memory planner gave it to
+        another tensor, the column buffer is stale.
+
+        Arguments:
+            written: Device tensors written by the op just generated.
+        """
+        buffers = set(getattr(tensor, 'device_buffer', None) for tensor in written)
+        for plan_id, inputs in list(self.conv_cols.items()):
+            if inputs.device_buffer in buffers:
+                del self.conv_cols[plan_id]
 
     @generate_op.on_type(ConvolutionOp)
     def generate_op(self, op, outputs, inputs, filters):
         self.conv_params[op.index] = op.conv_params
-        self.conv_slices[op.index] = \
-            NumPyConvEngine.get_slices(inputs, filters, outputs, op.conv_params)
-        self.append("self.fprop_conv(self.conv_slices[{}], I={}, F={}, O={})",
-                    op.index, inputs, filters, outputs)
+        plan_id = self.conv_plan_id(inputs, filters, outputs, op.conv_params)
+        self.append("self.fprop_conv(self.conv_plans[{}], I={}, F={}, O={})",
+                    plan_id, inputs, filters, outputs)
+        self.conv_cols[plan_id] = inputs
 
     @generate_op.on_type(bprop_conv)
     def generate_op(self, op, outputs, delta, filters):
-        self.append("self.bprop_conv(self.conv_slices[{}], E={}, F={}, gI={})",
-                    op.index, delta, filters, outputs)
+        plan_id = self.conv_plan_id(outputs, filters, delta, op.conv_params)
+        self.append("self.bprop_conv(self.conv_plans[{}], E={}, F={}, gI={})",
+                    plan_id, delta, filters, outputs)
 
     @generate_op.on_type(update_conv)
     def generate_op(self, op, outputs, delta, inputs):
-        self.append("self.update_conv(self.conv_slices[{}], I={}, E={}, U={})",
-                    op.index, inputs, delta, outputs)
+        plan_id = self.conv_plan_id(inputs, outputs, delta, op.conv_params)
+        reuse_cols = self.conv_cols.get(plan_id, None) is inputs
+        self.append("self.update_conv(self.conv_plans[{}], I={}, E={}, U={}, reuse_cols={})",
+                    plan_id, inputs, delta, outputs, reuse_cols)
+        self.conv_cols[plan_id] = inputs
+
+    def pool_plan_id(self, inputs, outputs, pool_params):
+        """
+        Finds the plan shared by poolings with this geometry, making it if needed.
+
+        Arguments:
+            inputs: Device tensor for the pooling input.
+            outputs: Device tensor for the pooling output.
+            pool_params: Window shape, padding, strides and op of the pooling.
+
+        Returns:
+            The index of the plan in pool_plans.
+        """
+        key = NumPyPoolPlan.key(inputs, outputs, pool_params)
+        plan_id = self.pool_plan_ids.get(key, None)
+        if plan_id is None:
+            plan_id = len(self.pool_plans)
+            self.pool_plans.append(NumPyPoolPlan(inputs, outputs, pool_params))
+            self.pool_plan_ids[key] = plan_id
+        return plan_id
 
     @generate_op.on_type(PoolingOp)
-    def generate_op(self, op, outputs, inputs):
+    def generate_op(self, op, outputs, inputs, argmax=None):
         self.pool_params[op.index] = op.pool_params
-        self.pool_slices[op.index] = NumPyPoolEngine.get_slices(inputs, outputs, op.pool_params)
-        self.append("self.fprop_pool(self.pool_slices[{}], arrI={}, arrO={})",
-                    op.index, inputs, outputs)
+        plan_id = self.pool_plan_id(inputs, outputs, op.pool_params)
+        self.append("self.fprop_pool(self.pool_plans[{}], arrI={}, arrO={}, arrA={})",
+                    plan_id, inputs, outputs, argmax)
 
     @generate_op.on_type(BpropPoolOp)
-    def generate_op(self, op, outputs, delta):
-        self.append("self.bprop_pool(self.pool_slices[{}], arrE={}, arrD={})",
-                    op.index, delta, outputs)
+    def generate_op(self, op, outputs, delta, argmax=None):
+        plan_id = self.pool_plan_id(outputs, delta, op.pool_params)
+        self.append("self.bprop_pool(self.pool_plans[{}], arrE={}, arrD={}, arrA={})",
+                    plan_id, delta, outputs, argmax)
 
     @generate_op.on_type(RngOp)
     def generate_op(self, op, out, x):
@@ -481,6 +1087,33 @@ class NumPyCodeGenerator(PyGen):
     def generate_op(self, op, out, x, y):
         self.append("""np.dot({}, {}, out={})""", x, y, out)
 
+    @generate_op.on_type(TensorDot)
+    def generate_op(self, op, out, x, y):
+        x_td, y_td = (arg.tensor_description() for arg in op.args)
+        x_out_axes = op.args[0].axes - op.x_reduction_axes
+        y_out_axes = op.args[1].axes - op.y_reduction_axes
+        # Contract the axes in the order of the strides of one of the arguments, so that
+        # they are flattened in place if they are contiguous; if only one argument can
+        # be flattened in place, the other, smaller one is copied
+        pairs = list(zip(op.x_reduction_axes, op.y_reduction_axes))
+
+        def copied_bytes(order):
+            x_order, y_order = zip(*order) if order else ((), ())
+            return sum(td.axes.size * td.dtype.itemsize
+                       for td, flattened in ((x_td, x_order), (y_td, y_order))
+                       if not merges_in_place(td, flattened))
+
+        order = min((sorted(pairs, key=lambda pair: -x_td.strides[x_td.axes.index(pair[0])]),
+                     sorted(pairs, key=lambda pair: -y_td.strides[y_td.axes.index(pair[1])])),
+                    key=copied_bytes)
+        x_axes = [x_axis for x_axis, _ in order]
+        y_axes = [y_axis for _, y_axis in order]
+        self.append("np.dot({}, {}, out={})".format(
+            matrix_view(x_td, x_out_axes, x_axes),
+            matrix_view(y_td, y_axes, y_out_axes),
+            matrix_view(op.tensor_description(), x_out_axes, y_out_axes)),
+            x, y, out)
+
     @generate_op.on_type(EqualOneDim)
     def generate_op(self, op, out, x, y):
         self.append("np.equal({}, {}, out={})", x, y, out)
@@ -535,7 +1168,7 @@ class NumPyCodeGenerator(PyGen):
 
     @generate_op.on_type(Max)
     def generate_op(self, op, out, x):
-        self.append("np.max({}, 0, out={})", x, out)
+        self.generate_reduction("np.max", op, out, x)
 
     @generate_op.on_type(MaximumOneDim)
     def generate_op(self, op, out, x, y):
@@ -547,7 +1180,7 @@ class NumPyCodeGenerator(PyGen):
 
     @generate_op.on_type(Min)
     def generate_op(self, op, out, x):
-        self.append("np.min({}, 0, out={})", x, out)
+        self.generate_reduction("np.min", op, out, x)
 
     @generate_op.on_type(MinimumOneDim)
     def generate_op(self, op, out, x, y):
@@ -638,7 +1271,7 @@ class NumPyCodeGenerator(PyGen):
 
     @generate_op.on_type(Sum)
     def generate_op(self, op, out, x):
-        self.append("np.sum({}, axis=0, out={})", x, out)
+        self.generate_reduction("np.sum", op, out, x)
 
     @generate_op.on_type(TanhOneDOp)
     def generate_op(self, op, out, x):
@@ -653,6 +1286,83 @@ class NumPyCodeGenerator(PyGen):
         self.append("{}.fill(0)", out)
         self.append("{}.__setitem__((), {})", out_sliced, x)
 
+    @generic_method(Op)
+    def written_args(self, op, out, *args):
+        """
+        Returns the argument device tensors that the code for an op writes in place,
+        in addition to its output.
+
+        Arguments:
+            op: The op.
+            out: The output device tensor of the op.
+            *args: The argument device tensors of the op.
+
+        Returns:
+            A list of the written device tensors.
+        """
+        return []
+
+    @written_args.on_type(Fill)
+    def written_args(self, op, out, x):
+        return [x]
+
+    @written_args.on_type(AssignOneDOp)
+    def written_args(self, op, out, tensor, value):
+        return [tensor]
+
+    @written_args.on_type(SetItemOneDOp)
+    def written_args(self, op, out, tensor, item, value):
+        return [tensor]
+
+    @written_args.on_type(PoolingOp)
+    def written_args(self, op, out, inputs, argmax=None):
+        return [] if argmax is None else [argmax]
+
+    @generic_method(Op)
+    def shared_state(self, op, *args):
+        """
+        Returns the state, other than its tensors, that the code for an op modifies.
+
+        Ops sharing state must run in order, even when their tensors are independent.
+
+        Arguments:
+            op: The op.
+            *args: The output and argument device tensors of the op.
+
+        Returns:
+            A list of hashable keys for the modified state.
+        """
+        return []
+
+    @shared_state.on_type(ConvolutionOp)
+    def shared_state(self, op, outputs, inputs, filters):
+        return [('conv', self.conv_plan_id(inputs, filters, outputs, op.conv_params))]
+
+    @shared_state.on_type(bprop_conv)
+    def shared_state(self, op, outputs, delta, filters):
+        return [('conv', self.conv_plan_id(outputs, filters, delta, op.conv_params))]
+
+    @shared_state.on_type(update_conv)
+    def shared_state(self, op, outputs, delta, inputs):
+        return [('conv', self.conv_plan_id(inputs, outputs, delta, op.conv_params))]
+
+    @shared_state.on_type(PoolingOp)
+    def shared_state(self, op, outputs, inputs, argmax=None):
+        return [('pool', self.pool_plan_id(inputs, outputs, op.pool_params))]
+
+    @shared_state.on_type(BpropPoolOp)
+    def shared_state(self, op, outputs, delta, argmax=None):
+        return [('pool', self.pool_plan_id(outputs, delta, op.pool_params))]
+
+    @shared_state.on_type(RngOp)
+    def shared_state(self, op, out, x):
+        # The global numpy generator must be drawn from in a fixed order
+        return ['rng']
+
+    @shared_state.on_type(PrintOp)
+    def shared_state(self, op, out, x):
+        return ['print']
+
 
 class NumPyTransformer(Transformer):
     """
@@ -661,12 +1371,66 @@ class NumPyTransformer(Transformer):
     Given a list of ops you want to compute the results of, this transformer
     will compile the graph required to compute those results and exposes an
     evaluate method to execute the compiled graph.
+
+    Arguments:
+        fusion: A fusion policy, or True to fuse chains of elementwise ops into
+            cache-blocked loops with cpu_fusible, which is the default. None disables
+            fusion.
+        fusion_chunk_bytes (int): Approximate number of bytes touched by one iteration
+            of a fused loop. Should fit in the L2 cache.
+        inter_op_threads (int): Number of threads running independent ops of a
+            computation concurrently. With 1, ops run one at a time.
+        intra_op_threads (int): Number of chunks large elementwise ops, reductions and
+            fused kernels are split into, each run by its own thread. With 1, ops are
+            not split.
+        intra_op_threshold (int): Number of elements below which ops are not split.
+        cache_dir (str): If not None, a directory where transformations are saved under
+            a fingerprint of the graph, and loaded by later transformers of the same
+            graph instead of transforming again.
+        arena_alignment (int): If not None, all buffers are placed in one arena
+            allocated at once, each buffer starting at a multiple of this many bytes.
+            Otherwise each buffer is allocated separately.
+        pretouch (bool): If True, a page of the arena is written to at a time when it
+            is allocated, so that the first computation does not wait for page faults.
+        memory_planner (str): If 'best_fit', each tensor is placed at its own offset in
+            the arena, reusing the memory of tensors that are no longer live, and the
+            arena is aligned to 64 bytes unless arena_alignment is given. Otherwise
+            tensors share buffers by graph coloring, each buffer as large as its
+            largest tensor.
+        **kwargs: Args for related classes.
     """
 
     transformer_name = "numpy"
 
-    def __init__(self, **kwargs):
-        super(NumPyTransformer, self).__init__(**kwargs)
+    def __init__(self, fusion=True, fusion_chunk_bytes=1024 * 1024, inter_op_threads=1,
+                 intra_op_threads=1, intra_op_threshold=1 << 18, cache_dir=None,
+                 arena_alignment=None, pretouch=False, memory_planner=None, **kwargs):
+        if fusion is True:
+            fusion = cpu_fusible
+        super(NumPyTransformer, self).__init__(fusion=fusion, **kwargs)
+        # Duplicated subgraphs are merged, and constant subgraphs computed, before they are
+        # reduced to low dimensional ops. Dots, reductions and elementwise ops of views are
+        # computed on strided views of their arguments, rather than on copies of them.
+        self.graph_passes[:0] = [CommonSubexpressionElimination(), ConstantFolding(),
+                                 NativeTensorDot(), NativeReduction(), NativeElementwise()]
+        # NumPy reads views with any strides, so most shuffles made for shaping are not needed
+        self.layout_assignment = LayoutAssignment()
+        self.graph_passes.append(self.layout_assignment)
+        self.fusion_chunk_bytes = fusion_chunk_bytes
+        self.inter_op_threads = inter_op_threads
+        self.intra_op_threads = intra_op_threads
+        self.intra_op_threshold = intra_op_threshold
+        self.thread_pool = None
+        self.intra_op_pool = None
+        self.cache = TransformCache(cache_dir) if cache_dir is not None else None
+        self.cached_constants = []
+        if memory_planner == 'best_fit' and arena_alignment is None:
+            arena_alignment = 64
+        self.arena_alignment = arena_alignment
+        self.pretouch = pretouch
+        self.memory_planner = memory_planner
+        self.memory_alignment = arena_alignment or 1
+        self.arena_bytes = 0
         self.conv_engine = NumPyConvEngine()
         self.init_code = NumPyCodeGenerator()
         self.allocate_storage_code = NumPyCodeGenerator()
@@ -703,9 +1467,44 @@ class NumPyTransformer(Transformer):
         self.init_code.indent(1)
         self.allocate_code.append("""def allocate(self):""")
         self.allocate_code.indent(1)
+        if self.arena_alignment is not None:
+            self.arena_bytes = 0
+            self.allocate_code.append("self.alloc_arena()")
 
     def finish_transform_allocate(self):
-        pass
+        if self.arena_alignment is None:
+            return
+        # Over-allocate, and start the arena at the first aligned byte
+        self.allocate_storage_code.append("def alloc_arena(self):")
+        with indenting(self.allocate_storage_code):
+            self.allocate_storage_code.append(
+                """
+                buffer = np.empty({}, dtype=np.uint8)
+                start = -buffer.ctypes.data % {}
+                self.arena = buffer[start:start + {}]
+                """,
+                self.arena_bytes + self.arena_alignment, self.arena_alignment,
+                self.arena_bytes)
+            if self.pretouch:
+                self.allocate_storage_code.append("self.arena[::{}] = 0", mmap.PAGESIZE)
+        self.allocate_storage_code.endl()
+
+    def arena_offset(self, bytes, offset=None):
+        """
+        Places a buffer in the arena.
+
+        Arguments:
+            bytes: The size of the buffer.
+            offset: The offset the memory planner chose, or None to place the buffer
+                after the others.
+
+        Returns:
+            The offset of the buffer in the arena, a multiple of arena_alignment.
+        """
+        if offset is None:
+            offset = -(-self.arena_bytes // self.arena_alignment) * self.arena_alignment
+        self.arena_bytes = max(self.arena_bytes, offset + bytes)
+        return offset
 
     def transform_ordered_ops(self, ordered_ops, name):
         if name is None:
@@ -714,25 +1513,193 @@ class NumPyTransformer(Transformer):
         self.compute_code.append("def {}(self):", name)
         code = self.compute_code.code
 
-        def tensor_description_value(x):
-            if isinstance(x, TensorDescription):
-                return x.value
-            return x
-
+        # Column buffers may be changed by other computations between calls
+        self.compute_code.conv_cols.clear()
         with indenting(self.compute_code):
-            for op in ordered_ops:
-                out = tensor_description_value(op.tensor_description())
-                call_info = (tensor_description_value(_) for _ in op.call_info())
-                self.compute_code.generate_op(op, out, *call_info)
+            if self.inter_op_threads > 1:
+                self.transform_parallel_ops(ordered_ops)
+            else:
+                for op in ordered_ops:
+                    self.transform_op(op)
             if code is self.compute_code.code:
                 self.compute_code.append("pass")
         self.compute_code.endl()
         return name
 
+    def transform_op(self, op):
+        """
+        Generates code for an op, or for a kernel of fused ops.
+
+        Arguments:
+            op: The op or Function.
+        """
+        if isinstance(op, Function) and len(op.instructions) > 1:
+            self.transform_function(op)
+            return
+        elif isinstance(op, Function):
+            op, = op.instructions
+        out, call_info = self.op_tensors(op)
+        if self.intra_op_threads < 2 or not self.compute_code.generate_chunked(
+                op, out, call_info, self.intra_op_threads, self.intra_op_threshold):
+            self.compute_code.generate_op(op, out, *call_info)
+        self.compute_code.invalidate_conv_cols(
+            [out] + self.compute_code.written_args(op, out, *call_info))
+
+    def op_tensors(self, op):
+        """
+        Returns the device tensors used by the code for an op.
+
+        Arguments:
+            op: The op.
+
+        Returns:
+            The output device tensor and the list of argument device tensors.
+        """
+        def tensor_description_value(x):
+            if isinstance(x, TensorDescription):
+                return x.value
+            return x
+
+        out = tensor_description_value(op.tensor_description())
+        call_info = [tensor_description_value(_) for _ in op.call_info()]
+        return out, call_info
+
+    def parallel_stages(self, ordered_ops):
+        """
+        Groups ops into stages of ops that can run concurrently.
+
+        An op must run after the earlier ops it depends on through its args or
+        other_deps, and after the earlier ops it conflicts with. Two ops conflict when
+        one writes a device buffer, or other shared state, that the other reads or
+        writes. Since device buffers are shared by all the tensors the memory planner
+        places in them, this also orders ops whose tensors merely reuse the same memory,
+        including device buffers that overlap in the arena. Each op goes in the stage
+        after the last stage it must follow.
+
+        Arguments:
+            ordered_ops: The ops of a computation, in execution order.
+
+        Returns:
+            A list of stages, each a list of ops in execution order.
+        """
+        op_index = dict()
+        for i, op in enumerate(ordered_ops):
+            instructions = op.instructions if isinstance(op, Function) else [op]
+            for x in instructions:
+                op_index[x] = i
+
+        overlaps = self.overlapping_device_buffers()
+        op_stages = []
+        last_writer = dict()
+        readers = dict()
+        for i, op in enumerate(ordered_ops):
+            instructions = op.instructions if isinstance(op, Function) else [op]
+            deps = set()
+            reads = set()
+            writes = set()
+            for x in instructions:
+                deps.update(op_index.get(dep) for dep in x.other_deps)
+                deps.update(op_index.get(arg) for arg in x.args)
+                if not x.is_device_op:
+                    continue
+                out, call_info = self.op_tensors(x)
+                reads.update(getattr(tensor, 'device_buffer', None) for tensor in call_info)
+                writes.update(getattr(tensor, 'device_buffer', None) for tensor in
+                              [out] + self.compute_code.written_args(x, out, *call_info))
+                writes.update(self.compute_code.shared_state(x, out, *call_info))
+            reads.discard(None)
+            writes.discard(None)
+            for key in reads | writes:
+                deps.add(last_writer.get(key))
+                deps.update(last_writer.get(x) for x in overlaps.get(key, ()))
+            for key in writes:
+                deps.update(readers.pop(key, ()))
+                for x in overlaps.get(key, ()):
+                    deps.update(readers.get(x, ()))
+                last_writer[key] = i
+            for key in reads - writes:
+                readers.setdefault(key, []).append(i)
+            deps.discard(None)
+            deps.discard(i)
+            op_stages.append(max([op_stages[dep] + 1 for dep in deps if dep < i] or [0]))
+
+        stages = [[] for _ in range(max(op_stages or [-1]) + 1)]
+        for op, stage in zip(ordered_ops, op_stages):
+            stages[stage].append(op)
+        return stages
+
+    def overlapping_device_buffers(self):
+        """
+        Returns:
+            A dict from each device buffer the memory planner placed in the arena to
+            the others whose memory it overlaps.
+        """
+        if self.memory_planner != 'best_fit':
+            return dict()
+        storages = dict((device_buffer.planned_buffer, device_buffer)
+                        for device_buffer in self.device_buffers
+                        if isinstance(device_buffer, NumPyDeviceBufferStorage))
+        return dict((storages[buffer], [storages[x] for x in buffers])
+                    for buffer, buffers in overlapping_buffers(storages).items())
+
+    def transform_parallel_ops(self, ordered_ops):
+        """
+        Generates code running the independent ops of each stage on the thread pool.
+
+        Arguments:
+            ordered_ops: The ops of a computation, in execution order.
+        """
+        for stage in self.parallel_stages(ordered_ops):
+            tasks = [op for op in stage
+                     if any(x.is_device_op for x in
+                            (op.instructions if isinstance(op, Function) else [op]))]
+            if len(tasks) < 2:
+                for op in stage:
+                    self.transform_op(op)
+                continue
+            names = []
+            for op in tasks:
+                names.append("task_{}".format(len(names)))
+                self.compute_code.append("def {}():", names[-1])
+                code = self.compute_code.code
+                with indenting(self.compute_code):
+                    self.transform_op(op)
+                    if code is self.compute_code.code:
+                        self.compute_code.append("pass")
+            self.compute_code.append("run_parallel(self.thread_pool, [{}])", ", ".join(names))
+
+    def transform_function(self, function):
+        """
+        Generates code for a kernel of fused ops.
+
+        Arguments:
+            function: The Function holding the ops.
+        """
+        instructions = function.instructions
+        outs, call_infos = zip(*(self.op_tensors(op) for op in instructions))
+        successors = self.dataflow.dataflow.successors
+        kernel_ops = set(instructions)
+        exported = {op for op in instructions
+                    if not successors[op] or any(x not in kernel_ops for x in successors[op])}
+        # A view is only valid if the op it aliases writes its tensor
+        for op in reversed(instructions):
+            if op in exported and not op.is_device_op:
+                exported.update(arg for arg in op.args if arg in kernel_ops)
+        self.compute_code.generate_fused(instructions, outs, call_infos, exported,
+                                         self.fusion_chunk_bytes, self.intra_op_threads,
+                                         self.intra_op_threshold)
+        self.compute_code.invalidate_conv_cols(
+            [tensor for op, out, call_info in zip(instructions, outs, call_infos)
+             for tensor in [out] + self.compute_code.written_args(op, out, *call_info)])
+
     def finish_transform(self):
         if self.model is not None:
             return
 
+        for name, shape, dtype in self.compute_code.chunk_buffers:
+            self.init_code.append("{} = np.empty({}, dtype=np.dtype('{}'))", name, shape,
+                                  dtype.name)
+
         self.code.append(" class Model(object):")
         with indenting(self.code):
             if len(self.device_buffers) == 0:
@@ -754,19 +1721,156 @@ class NumPyTransformer(Transformer):
             # print(self.code.code)
             # print(self.code.filename)
 
-        r = self.code.compile("op", globals())
-        self.model = r['Model']()
-        self.model.conv_params = self.compute_code.conv_params
-        self.model.pool_params = self.compute_code.pool_params
-        self.model.conv_slices = self.compute_code.conv_slices
-        self.model.pool_slices = self.compute_code.pool_slices
+        self.compile_model(self.compute_code.conv_params, self.compute_code.pool_params,
+                           self.compute_code.conv_plans, self.compute_code.pool_plans)
 
         for computation in self.computations:
             executor = getattr(self.model, computation.name)
             computation.executor = executor
 
+    def compile_model(self, conv_params, pool_params, conv_plans, pool_plans):
+        """
+        Compiles the generated code and makes the model.
+
+        Arguments:
+            conv_params: Padding and strides of each convolution.
+            pool_params: Parameters of each pooling.
+            conv_plans: The plans of the convolutions.
+            pool_plans: The plans of the poolings.
+        """
+        r = self.code.compile("op", globals())
+        self.model = r['Model']()
+        if self.inter_op_threads > 1 and self.thread_pool is None:
+            self.thread_pool = ThreadPool(self.inter_op_threads - 1)
+        self.model.thread_pool = self.thread_pool
+        # Separate pools, so that chunks of an op never wait behind the op itself
+        if self.intra_op_threads > 1 and self.intra_op_pool is None:
+            self.intra_op_pool = ThreadPool(self.intra_op_threads - 1)
+        self.model.intra_op_pool = self.intra_op_pool
+        self.model.conv_params = conv_params
+        self.model.pool_params = pool_params
+        self.model.conv_plans = conv_plans
+        self.model.pool_plans = pool_plans
+
+    def close(self):
+        """
+        Closes the thread pools, once the tasks already given to them are done.
+        """
+        for name in ('thread_pool', 'intra_op_pool'):
+            pool = getattr(self, name)
+            if pool is not None:
+                pool.close()
+                pool.join()
+                setattr(self, name, None)
+                if self.model is not None:
+                    setattr(self.model, name, None)
+
+    def cache_config(self):
+        """
+        Returns: The settings and code that change the transformation of a graph.
+        """
+        return (type(self).__name__,
+                code_version(sys.modules['ngraph']),
+                getattr(self.fusion, '__name__', repr(self.fusion)),
+                self.fusion_chunk_bytes, self.inter_op_threads, self.intra_op_threads,
+                self.intra_op_threshold, self.arena_alignment, self.pretouch,
+                self.memory_planner,
+                tuple(type(graph_pass).__name__ for graph_pass in self.graph_passes))
+
+    def _transform_computations(self):
+        if self.cache is None:
+            super(NumPyTransformer, self)._transform_computations()
+            return
+
+        fingerprint = GraphFingerprint(self.all_results, self.computations,
+                                       self.cache_config())
+        transformation = self.cache.load(fingerprint.digest)
+        if transformation is not None:
+            self.load_transformation(fingerprint, transformation)
+            return
+
+        computations = list(self.computations)
+        super(NumPyTransformer, self)._transform_computations()
+        self.cache.save(fingerprint.digest, self.saved_transformation(fingerprint, computations))
+
+    def saved_transformation(self, fingerprint, computations):
+        """
+        Collects what a later process needs to run the computations without transforming.
+
+        The values of the parameters, results and persistent tensors of the graph are
+        recorded by the name of their tensor in the model. Constants made by the graph
+        passes are not in the fingerprinted graph, so their values are saved.
+
+        Arguments:
+            fingerprint: The GraphFingerprint of the graph before the passes.
+            computations: The computations made by the user.
+
+        Returns:
+            A picklable dict.
+        """
+        bound_ops = set(op for op in fingerprint.ops if isinstance(op, AssignableTensorOp))
+        for computation in computations:
+            bound_ops.update(computation.parameters)
+            returns = computation.returns
+            bound_ops.update(returns if isinstance(returns, (list, tuple)) else [returns])
+
+        bindings = []
+        for op in bound_ops:
+            if not isinstance(op, TensorOp):
+                continue
+            value = op.forwarded.tensor_description().value
+            if isinstance(value, NumPyDeviceTensor):
+                bindings.append((fingerprint.op_index[op], value.name, value.storage_name,
+                                 value.storage_bytes))
+
+        constants = []
+        for op in OrderedSet(self.inits + self.ops):
+            if isinstance(op, InitTensorOp) and op not in fingerprint.op_index:
+                tensor_description, = tensor_descriptions(op.args)
+                constants.append((tensor_description.value.name,
+                                  np.array(op.valfun(tensor_description))))
+
+        return dict(source=self.code.code,
+                    computations=[computation.name for computation in computations],
+                    init=self.init_computation.name,
+                    bindings=sorted(bindings),
+                    constants=constants,
+                    conv_params=self.compute_code.conv_params,
+                    pool_params=self.compute_code.pool_params,
+                    conv_plans=self.compute_code.conv_plans,
+                    pool_plans=self.compute_code.pool_plans)
+
+    def load_transformation(self, fingerprint, transformation):
+        """
+        Makes the model from a transformation saved by an earlier process.
+
+        Arguments:
+            fingerprint: The GraphFingerprint of the graph.
+            transformation: The dict made by saved_transformation.
+        """
+        self.code.append_raw(transformation['source'], lines=0)
+        self.compile_model(transformation['conv_params'], transformation['pool_params'],
+                           transformation['conv_plans'], transformation['pool_plans'])
+        for computation, name in zip(self.computations, transformation['computations']):
+            computation.executor = getattr(self.model, name)
+            computation.computation_name = name
+        self.init_computation = getattr(self.model, transformation['init'])
+
+        for index, name, storage_name, storage_bytes in transformation['bindings']:
+            op = fingerprint.ops[index]
+            tensor_description = op.tensor_description()
+            tensor_description.value = NumPyCachedDeviceTensor(
+                self, tensor_description, name, storage_name, storage_bytes)
+        self.cached_constants = transformation['constants']
+        self.inits = [op for op in fingerprint.ops if isinstance(op, InitTensorOp)
+                      and op.args[0].tensor_description().value is not None]
+        self.ops = []
+        self.finalized = True
+
     def allocate_storage(self):
         self.model.allocate()
+        for name, value in self.cached_constants:
+            getattr(self.model, name)[()] = value
 
     def consume(self, buf_index, hostlist, devlist):
         '''
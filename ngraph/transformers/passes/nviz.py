@@ -39,7 +39,7 @@ class JSONPass(GraphPass):
             opid = get_id(op)
             if opid not in nodes:
                 op_name = op.__class__.__name__
-                filename = op.filename.split('/')[-1]
+                filename = (op.filename or '').split('/')[-1]
                 axes = ''
                 description = op_name
                 if hasattr(op, 'axes'):
@@ -14,8 +14,9 @@
 # ----------------------------------------------------------------------------
 import abc
 
+import numpy as np
 from future.utils import with_metaclass
-from collections import Iterable
+from collections import Iterable, defaultdict
 
 from ngraph.op_graph.axes import make_axis
 from ngraph.op_graph.op_graph import BroadcastOp, broadcast, DotOp, ReductionOp, make_axes, \
@@ -23,9 +24,15 @@ from ngraph.op_graph.op_graph import BroadcastOp, broadcast, DotOp, ReductionOp,
     OneHotTwoDimOp, BinaryElementWiseAxesOp, AssignOp, DotOneDimensional, DotTwoDimensional, \
     DotTwoByOne, ExpOp, LogOp, NegativeOp, OneHotOp, AssignOneDOp, ReshapeOp, flatten, constant, \
     Multiply, Add, Divide, Op, Sum, Dimshuffle, UnaryElementwiseAxesOp, \
-    negative, cast_axes
+    negative, cast_axes, TensorOp, AssignableTensorOp, RngOp, ResultHandle, Axes, AxesCastOp, \
+    ExpandDims, TensorSizeOp, AbsoluteOp, SinOp, CosOp, TanhOp, ReciprocalOp, SignOp, \
+    SquareOp, SqrtOp, Subtract, Mod, Maximum, Minimum, Power, Equal, NotEqual, Greater, Less, \
+    GreaterEqual, LessEqual, Max, Min, is_constant, square, sqrt, Flatten, ElementWise, \
+    LowDimensionalDot, TensorDot, Argmax, Argmin
+from ngraph.op_graph.debug import PrintOp
 
 from ngraph.util.generics import generic_method
+from ngraph.util.graph import postorder
 
 
 class GraphPass(with_metaclass(abc.ABCMeta, object)):
@@ -38,22 +45,70 @@ class GraphPass(with_metaclass(abc.ABCMeta, object)):
 
 
 class PeepholeGraphPass(GraphPass):
+    """
+    Visits every op, replacing ops as visit asks, until there is nothing left to replace.
+
+    After the first visit of every op, only the ops created by replacements and the
+    users of replaced ops are visited again. visit may look at an op and its arguments,
+    including tensor descriptions that views pass through from further down.
+    """
     def __init__(self):
         super(PeepholeGraphPass, self).__init__()
 
     def do_pass(self, ops):
         assert isinstance(ops, Iterable), "Ops passed into do_pass must be an iterable"
-        has_work = True
-        while has_work:
+        ops = list(ops)
+        # Ops in the order they were first reached, and the ops using each op
+        position = dict()
+        users = defaultdict(set)
+        worklist = []
+
+        def expand(op):
+            op = op.forwarded
+            if op in position:
+                return None
+            position[op] = None
+            op.update_forwards()
+            return op, list(op.other_deps) + list(op.args)
+
+        def add(op):
+            position[op] = len(position)
+            for arg in list(op.other_deps) + list(op.args):
+                users[arg].add(op)
+            worklist.append(op)
+
+        postorder(ops, expand, add)
+        while worklist:
             self.replacement_list = []
-            ops = set(op.forwarded for op in ops)
-            for op in Op.ordered_ops(ops):
-                op.update_forwards()
-                self.visit(op)
+            for op in worklist:
+                if op.forward is None:
+                    self.visit(op)
+            worklist = []
+
+            # Users of replaced ops see new arguments, and users of views see new
+            # tensor descriptions through them
+            changed = []
             for old, rep in self.replacement_list:
-                old.forwarded.replace_self(rep.forwarded)
-            has_work = len(self.replacement_list) > 0
-        return ops
+                old = old.forwarded
+                old.replace_self(rep.forwarded)
+                changed.append(old)
+            stale = set()
+            while changed:
+                op = changed.pop()
+                for user in users.pop(op, ()):
+                    if user not in stale:
+                        stale.add(user)
+                        if isinstance(user, ReshapeOp):
+                            changed.append(user)
+
+            postorder([rep for _, rep in self.replacement_list], expand, add)
+            for op in sorted(stale, key=position.get):
+                if op.forward is None:
+                    op.update_forwards()
+                    for arg in list(op.other_deps) + list(op.args):
+                        users[arg].add(op)
+                    worklist.append(op)
+        return set(op.forwarded for op in ops)
 
     def replace_op(self, op, replacement):
         """
@@ -221,6 +276,102 @@ class RequiredTensorShaping(PeepholeGraphPass):
             pass
 
 
+class NativeTensorDot(PeepholeGraphPass):
+    """
+    Replaces each DotOp with a TensorDot of its arguments, for transformers that
+    contract strided tensors of any rank, so that RequiredTensorShaping does not reorder
+    and flatten the arguments into matrices. Dots of scalars are left to
+    RequiredTensorShaping, which turns them into cheaper ops.
+    """
+    @generic_method(dispatch_base_type=Op)
+    def visit(self, op):
+        """
+        Replaces op if it is a dot of tensors.
+
+        Arguments:
+          op: The op.
+        """
+        pass
+
+    @visit.on_type(DotOp)
+    def visit(self, op):
+        x, y = op.args
+        if x.is_scalar or y.is_scalar:
+            return
+        self.replace_op(op, TensorDot(x, y, op.x_reduction_axes, op.y_reduction_axes))
+
+
+class NativeReduction(PeepholeGraphPass):
+    """
+    Keeps reductions over axes of their argument from being reduced to two dimensions by
+    RequiredTensorShaping, for transformers that reduce strided tensors over any of their
+    axes. Argmax and Argmin are kept only when they reduce one axis.
+    """
+    reductions = (Sum, Max, Min, Argmax, Argmin)
+
+    @generic_method(dispatch_base_type=Op)
+    def visit(self, op):
+        """
+        Marks op to be computed as it is, if it is a reduction of a tensor over its axes.
+
+        Arguments:
+          op: The op.
+        """
+        pass
+
+    @visit.on_type(ReductionOp)
+    def visit(self, op):
+        x, = op.args
+        reduction_axes = op.reduction_axes
+        if not op.must_reduce or not isinstance(op, self.reductions) \
+                or x.is_scalar or len(reduction_axes) == 0:
+            return
+        if isinstance(op, (Argmax, Argmin)) and len(reduction_axes) > 1:
+            return
+        out_axes = x.axes - reduction_axes
+        if len(out_axes) + len(reduction_axes) == len(x.axes) \
+                and op.axes.has_same_axes(out_axes):
+            op.must_reduce = False
+
+
+class NativeElementwise(PeepholeGraphPass):
+    """
+    Applies the low dimensional op of an elementwise op to its arguments as they are,
+    when one of them is a view that cannot be flattened without a copy, such as a
+    broadcast, sliced or reordered tensor, for transformers whose elementwise ops read
+    strided arguments of any rank. RequiredTensorShaping flattens the other elementwise
+    ops, which costs nothing.
+    """
+    @staticmethod
+    def flattens_in_place(x):
+        """
+        Returns: True if x is flattened to one dimension without a copy.
+        """
+        return x.is_scalar or x.tensor_description().c_contiguous
+
+    @generic_method(dispatch_base_type=Op)
+    def visit(self, op):
+        """
+        Replaces op if it is an elementwise op of strided tensors.
+
+        Arguments:
+          op: The op.
+        """
+        pass
+
+    @visit.on_type(UnaryElementwiseAxesOp)
+    def visit(self, op):
+        x, = op.args
+        if not self.flattens_in_place(x):
+            self.replace_op(op, op.one_d_class(x))
+
+    @visit.on_type(BinaryElementWiseAxesOp)
+    def visit(self, op):
+        x, y = op.args
+        if not all(self.flattens_in_place(arg) for arg in op.args):
+            self.replace_op(op, op.one_d_class(x, y, axes=op.axes, **op.kwargs))
+
+
 class SimplePrune(PeepholeGraphPass):
     """TODO."""
     @generic_method()
@@ -336,3 +487,391 @@ class SimplePrune(PeepholeGraphPass):
         elif isinstance(x, ExpOp):
             exp_x, = x.args
             self.replace_op(op, exp_x)
+
+
+def constant_scalar(op):
+    """
+    Returns:
+        The value of op if it is a constant scalar, possibly broadcast, otherwise None.
+    """
+    if op.is_scalar and is_constant(op.scalar_op):
+        return op.scalar_op.const
+    return None
+
+
+class AlgebraicSimplification(PeepholeGraphPass):
+    """
+    Rewrites elementwise and axes ops into cheaper equivalents.
+
+    Rules:
+        power(x, 2) -> square(x), power(x, 0.5) -> sqrt(x)
+        x / c -> x * (1 / c), for a constant c
+        -(-x) -> x
+        ReorderAxes(ReorderAxes(x)) -> ReorderAxes(x)
+        Transpose(Transpose(x)) -> x
+        Dimshuffle(x) -> x, when the shuffle keeps the axis order of a contiguous x
+    """
+    @generic_method(dispatch_base_type=Op)
+    def visit(self, op):
+        """
+        Rewrites op if a rule applies to it.
+
+        Arguments:
+          op: The op.
+        """
+        pass
+
+    @visit.on_type(Power)
+    def visit(self, op):
+        x, y = op.args
+        exponent = constant_scalar(y)
+        if exponent == 2:
+            self.replace_op(op, square(x))
+        elif exponent == 0.5:
+            self.replace_op(op, sqrt(x))
+
+    @visit.on_type(Divide)
+    def visit(self, op):
+        x, y = op.args
+        divisor = constant_scalar(y)
+        if divisor is not None:
+            if divisor != 0:
+                self.replace_op(op, x * constant(1. / divisor, dtype=op.dtype))
+        elif is_constant(y) and np.all(y.const != 0):
+            self.replace_op(op, x * constant(1. / y.const, y.axes, dtype=op.dtype))
+
+    @visit.on_type(NegativeOp)
+    def visit(self, op):
+        x, = op.args
+        if isinstance(x, NegativeOp):
+            self.replace_op(op, x.args[0])
+
+    @visit.on_type(ReorderAxes)
+    def visit(self, op):
+        x, = op.args
+        if isinstance(x, ReorderAxes):
+            self.replace_op(op, axes_with_order(x.args[0], op.axes))
+
+    @visit.on_type(Transpose)
+    def visit(self, op):
+        x, = op.args
+        if isinstance(x, Transpose):
+            self.replace_op(op, x.args[0])
+
+    @visit.on_type(Dimshuffle)
+    def visit(self, op):
+        x, = op.args
+        if op.old_axis_positions == tuple(range(len(op.old_axis_positions))) \
+                and x.tensor_description().c_contiguous:
+            self.replace_op(op, x)
+
+
+class CommonSubexpressionElimination(GraphPass):
+    """
+    Forwards each op to an earlier op computing the same value, so the value is only
+    computed once.
+
+    Ops compute the same value when they have the same type, forwarded arguments and
+    other_deps, and attributes. Ops with side effects, and tensors that can be assigned
+    to, are never merged.
+    """
+
+    # Attributes that do not change what an op computes
+    ignored_attributes = frozenset((
+        '_NameableValue__name', '_Op__args', '_Op__forward', '__doc__', '_DebugInfo__code',
+        'lineno', 'graph_label_type', 'metadata', 'ops', 'style', 'schemas',
+        'other_deps', 'initializers', 'generate_adjoints'))
+
+    def do_pass(self, ops):
+        assert isinstance(ops, Iterable), "Ops passed into do_pass must be an iterable"
+        ops = list(ops)
+        canonical = dict()
+        for op in Op.ordered_ops([op.forwarded for op in ops]):
+            key = self.key(op)
+            if key is None:
+                continue
+            try:
+                rep = canonical.setdefault(key, op)
+            except TypeError:
+                # Some attribute cannot be hashed
+                continue
+            if rep is not op:
+                op.replace_self(rep)
+        return set(op.forwarded for op in ops)
+
+    @generic_method(dispatch_base_type=Op)
+    def key(self, op):
+        """
+        Returns the key of the value op computes, or None if op must not be merged.
+
+        Arguments:
+          op: The op.
+
+        Returns:
+          A tuple, or None.
+        """
+        return None
+
+    @key.on_type(TensorOp)
+    def key(self, op):
+        if op.initializers:
+            return None
+        attributes = tuple(sorted(
+            ((name, self.frozen(value)) for name, value in vars(op).items()
+             if name not in self.ignored_attributes),
+            key=lambda item: item[0]))
+        return (type(op),
+                tuple(arg.forwarded for arg in op.args),
+                tuple(dep.forwarded for dep in op.other_deps),
+                attributes)
+
+    @key.on_type(AssignableTensorOp)
+    def key(self, op):
+        return None
+
+    @key.on_type(RngOp)
+    def key(self, op):
+        return None
+
+    @key.on_type(PrintOp)
+    def key(self, op):
+        return None
+
+    @key.on_type(ResultHandle)
+    def key(self, op):
+        return None
+
+    @staticmethod
+    def frozen(value):
+        """
+        Returns: value, with containers made hashable and ops forwarded.
+        """
+        frozen = CommonSubexpressionElimination.frozen
+        if isinstance(value, Op):
+            return value.forwarded
+        if isinstance(value, slice):
+            return slice, value.start, value.stop, value.step
+        if isinstance(value, dict):
+            return tuple(sorted(((k, frozen(v)) for k, v in value.items()),
+                                key=lambda item: str(item[0])))
+        if isinstance(value, (set, frozenset)):
+            return frozenset(frozen(x) for x in value)
+        if isinstance(value, (list, tuple)):
+            return tuple(frozen(x) for x in value)
+        return value
+
+
+def aligned(value, axes, new_axes):
+    """
+    Lays out a value the way a view with new_axes lays out a tensor with axes.
+
+    Arguments:
+        value (np.ndarray): The value of the tensor.
+        axes (Axes): The axes of the tensor.
+        new_axes (Axes): The axes of the view. Axes not in axes are broadcast.
+
+    Returns:
+        The value of the view.
+    """
+    positions = [Axes.find_axis(axes, axis) if axis in axes else None for axis in new_axes]
+    kept = [position for position in positions if position is not None]
+    if sorted(kept) != list(range(len(axes))):
+        raise ValueError()
+    value = np.transpose(value, kept)[
+        tuple(np.newaxis if position is None else slice(None) for position in positions)]
+    return np.broadcast_to(value, new_axes.lengths)
+
+
+class ConstantFolding(GraphPass):
+    """
+    Replaces tensors computed only from constants with constants holding their values,
+    which are computed once with NumPy.
+
+    Views of constants are left as views, since they are not computed.
+
+    Arguments:
+        max_size (int): Tensors with more elements are computed when the graph runs, so
+            that small constants are not expanded into large ones.
+    """
+
+    unary_functions = {
+        NegativeOp: np.negative, AbsoluteOp: np.abs, SinOp: np.sin, CosOp: np.cos,
+        TanhOp: np.tanh, ExpOp: np.exp, LogOp: np.log, ReciprocalOp: np.reciprocal,
+        SignOp: np.sign, SquareOp: np.square, SqrtOp: np.sqrt}
+
+    binary_functions = {
+        Add: np.add, Subtract: np.subtract, Multiply: np.multiply, Divide: np.divide,
+        Mod: np.mod, Maximum: np.maximum, Minimum: np.minimum, Power: np.power,
+        Equal: np.equal, NotEqual: np.not_equal, Greater: np.greater, Less: np.less,
+        GreaterEqual: np.greater_equal, LessEqual: np.less_equal}
+
+    reduction_functions = {Sum: np.sum, Max: np.max, Min: np.min}
+
+    def __init__(self, max_size=1 << 16):
+        super(ConstantFolding, self).__init__()
+        self.max_size = max_size
+
+    def do_pass(self, ops):
+        assert isinstance(ops, Iterable), "Ops passed into do_pass must be an iterable"
+        ops = list(ops)
+        values = dict()
+        for op in Op.ordered_ops([op.forwarded for op in ops]):
+            if isinstance(op, AssignableTensorOp):
+                if op.is_constant and op.const is not None:
+                    values[op] = np.asarray(op.const).reshape(op.axes.lengths)
+                continue
+            if not isinstance(op, TensorOp) or not op.has_axes or op.axes.size > self.max_size:
+                continue
+            args = [arg.forwarded for arg in op.args]
+            if not all(arg in values for arg in args):
+                continue
+            try:
+                with np.errstate(all='ignore'):
+                    value = self.evaluate(op, *[values[arg] for arg in args])
+            except ValueError:
+                continue
+            if value is None:
+                continue
+            values[op] = value
+            if not isinstance(op, ReshapeOp):
+                folded = constant(np.array(value, dtype=op.dtype), op.axes, op.dtype)
+                values[folded] = value
+                op.replace_self(folded)
+        return set(op.forwarded for op in ops)
+
+    @generic_method(dispatch_base_type=Op)
+    def evaluate(self, op, *args):
+        """
+        Computes the value of op.
+
+        Arguments:
+          op: The op.
+          *args: The values of the arguments of op.
+
+        Returns:
+          The value, or None if op cannot be computed here.
+        """
+        return None
+
+    @evaluate.on_type(UnaryElementwiseAxesOp)
+    def evaluate(self, op, x):
+        function = self.unary_functions.get(type(op))
+        if function is not None:
+            return function(aligned(x, op.args[0].axes, op.axes)).astype(op.dtype)
+
+    @evaluate.on_type(BinaryElementWiseAxesOp)
+    def evaluate(self, op, x, y):
+        function = self.binary_functions.get(type(op))
+        if function is not None:
+            return function(aligned(x, op.args[0].axes, op.axes),
+                            aligned(y, op.args[1].axes, op.axes)).astype(op.dtype)
+
+    @evaluate.on_type(ReductionOp)
+    def evaluate(self, op, x):
+        function = self.reduction_functions.get(type(op))
+        if function is not None:
+            x_axes = op.args[0].axes
+            reduced = tuple(i for i, axis in enumerate(x_axes) if axis in op.reduction_axes)
+            out_axes = make_axes([axis for axis in x_axes if axis not in op.reduction_axes])
+            return aligned(function(x, axis=reduced), out_axes, op.axes).astype(op.dtype)
+
+    @evaluate.on_type(TensorSizeOp)
+    def evaluate(self, op):
+        return np.array(op.reduction_axes.size, dtype=op.dtype)
+
+    @evaluate.on_type(BroadcastOp)
+    def evaluate(self, op, x):
+        return aligned(x, op.args[0].axes, op.axes)
+
+    @evaluate.on_type(ReorderAxes)
+    def evaluate(self, op, x):
+        return aligned(x, op.args[0].axes, op.axes)
+
+    @evaluate.on_type(ExpandDims)
+    def evaluate(self, op, x):
+        return aligned(x, op.args[0].axes, op.axes)
+
+    @evaluate.on_type(AxesCastOp)
+    def evaluate(self, op, x):
+        return x.reshape(op.axes.lengths)
+
+    @evaluate.on_type(Dimshuffle)
+    def evaluate(self, op, x):
+        return np.transpose(x, op.old_axis_positions)
+
+
+def flattens_in_place(tensor_description, axes):
+    """
+    Tests if a tensor can be flattened to axes without copying it.
+
+    Each group of axes flattened together must be laid out contiguously, in order; the
+    groups themselves may have any strides.
+
+    Arguments:
+        tensor_description (TensorDescription): The tensor.
+        axes (Axes): The flattened axes.
+
+    Returns:
+        True if a view with axes can describe the tensor.
+    """
+    strides = tensor_description.strides
+    lengths = tensor_description.shape
+    idx = 0
+    for axis in axes:
+        n = 1 if axis == tensor_description.axes[idx] else len(axis.axes)
+        for i in range(idx, idx + n - 1):
+            if strides[i] != strides[i + 1] * lengths[i + 1]:
+                return False
+        idx += n
+    return True
+
+
+class LayoutAssignment(GraphPass):
+    """
+    Lets ops read views in the layout their tensors are stored in, instead of a copy
+    laid out in the order of the view's axes.
+
+    Flattening a view makes a Dimshuffle copy of it. The copy is not needed when every
+    group of axes flattened together is already contiguous, and the flattened view
+    is only read by ops that take arguments with any strides, as NumPy does for dots
+    (e.g. a transposed matrix), elementwise ops and reductions.
+
+    Attributes:
+        shuffles_eliminated (int): The number of Dimshuffle copies removed.
+        bytes_eliminated (int): The number of bytes those copies would have written.
+    """
+
+    # Ops that only read their arguments, with any strides
+    strided_readers = (LowDimensionalDot, ElementWise, ReductionOp)
+
+    def __init__(self):
+        super(LayoutAssignment, self).__init__()
+        self.shuffles_eliminated = 0
+        self.bytes_eliminated = 0
+
+    def do_pass(self, ops):
+        assert isinstance(ops, Iterable), "Ops passed into do_pass must be an iterable"
+        ops = list(ops)
+        all_ops = Op.ordered_ops([op.forwarded for op in ops])
+        users = defaultdict(list)
+        for op in all_ops:
+            for arg in op.args:
+                users[arg].append(op)
+
+        for op in all_ops:
+            if not isinstance(op, Dimshuffle):
+                continue
+            x, = op.args
+            flattens = users[op]
+            if not flattens or not all(
+                    isinstance(flat, Flatten)
+                    and flattens_in_place(x.tensor_description(), flat.axes)
+                    and all(isinstance(user, self.strided_readers) for user in users[flat])
+                    for flat in flattens):
+                continue
+            op.replace_self(x)
+            for flat in flattens:
+                flat.update_forwards()
+            self.shuffles_eliminated += 1
+            self.bytes_eliminated += op.axes.size * op.dtype.itemsize
+        return set(op.forwarded for op in ops)
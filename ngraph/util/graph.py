@@ -13,7 +13,7 @@
 # limitations under the License.
 # ----------------------------------------------------------------------------
 
-from ngraph.op_graph.op_graph import OrderedSet
+from ngraph.util.ordered import OrderedSet
 
 try:
     import graphviz
@@ -21,6 +21,37 @@ except:
     graphviz = None
 
 
+def postorder(roots, expand, fun):
+    """
+    Depth-first postorder traversal, without recursion, so that deep graphs do not
+    reach Python's recursion limit.
+
+    Arguments:
+      roots: Nodes to start from, in order
+      expand: Function called each time the traversal reaches a node. Returns None to
+        skip the node, or the node to visit, e.g. the node it was forwarded to, and
+        the nodes to visit before it, in order
+      fun: Function applied to each visited node, after the nodes visited before it
+    """
+    for root in roots:
+        expanded = expand(root)
+        if expanded is None:
+            continue
+        node, children = expanded
+        stack = [(node, iter(children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                expanded = expand(child)
+                if expanded is not None:
+                    child, grandchildren = expanded
+                    stack.append((child, iter(grandchildren)))
+                    break
+            else:
+                stack.pop()
+                fun(node)
+
+
 class Digraph(object):
     """
     Base class for Directed graph.
@@ -41,6 +72,55 @@ class Digraph(object):
         """
         self.successors = successors
 
+    @property
+    def successors(self):
+        """
+        dict (op => set(op)): Maps each op to all its users. Code changing the sets
+        in place must call invalidate.
+        """
+        return self.__successors
+
+    @successors.setter
+    def successors(self, successors):
+        self.__successors = successors
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forgets what was computed from the successors, after they are changed.
+        """
+        self.__predecessors = None
+        self.__ordered_nexts = dict()
+        self.__topsort = None
+
+    @property
+    def predecessors(self):
+        """
+        dict (op => set(op)): Maps each op to the ops it uses, computed once.
+        """
+        if self.__predecessors is None:
+            self.__predecessors = Digraph._invert(self.successors)
+        return self.__predecessors
+
+    def ordered_nexts(self, reverse=False):
+        """
+        The successors, or predecessors, of each node, sorted by name once so that
+        traversals are deterministic.
+
+        Arguments:
+          reverse: bool): whether to order the predecessors
+
+        Returns:
+          dict (op => list(op))
+        """
+        nexts = self.__ordered_nexts.get(reverse)
+        if nexts is None:
+            adjacency = self.predecessors if reverse else self.successors
+            nexts = dict((u, sorted(vs, key=lambda x: x.name))
+                         for u, vs in adjacency.items())
+            self.__ordered_nexts[reverse] = nexts
+        return nexts
+
     def _graphviz(self, name=''):
         """
         Export the current Digraph to Graphviz
@@ -100,36 +180,21 @@ class Digraph(object):
           reverse: bool): whether to do DFS on the reversed graph
         """
         visited = set()
-        nexts = self.successors
-        if reverse:
-            nexts = Digraph._invert(nexts)
-
-        # Visit single node
-        def visit(u, fun):
-            """
-            TODO.
-
-            Arguments:
-              u: TODO
-              fun: TODO
-            """
-            if u not in visited:
-                visited.add(u)
-                vs = nexts[u]
-                for v in sorted(vs, key=lambda x: x.name):
-                    if v not in visited:
-                        visit(v, fun)
-                fun(u)
+        nexts = self.ordered_nexts(reverse)
+
+        def expand(u):
+            if u in visited:
+                return None
+            visited.add(u)
+            return u, nexts.get(u, ())
 
         # Get output nodes
-        for x in sorted(starts, key=lambda x: x.name):
-            visit(x, fun)
+        postorder(sorted(starts, key=lambda x: x.name), expand, fun)
 
     @property
     def inputs(self):
-        """TODO."""
-        predecessors = Digraph._invert(self.successors)
-        return [u for u, vs in iter(list(predecessors.items())) if len(vs) == 0]
+        """The nodes without predecessors."""
+        return [u for u, vs in iter(list(self.predecessors.items())) if len(vs) == 0]
 
     def can_reach(self, outs, order=None):
         """
@@ -156,9 +221,12 @@ class Digraph(object):
         Returns:
           Sorted list of nodes.
         """
-        result = []
-        self.dfs(self.inputs, lambda x: result.insert(0, x))
-        return result
+        if self.__topsort is None:
+            result = []
+            self.dfs(self.inputs, result.append)
+            result.reverse()
+            self.__topsort = result
+        return list(self.__topsort)
 
 
 class UndirectedGraph(object):
@@ -22,6 +22,7 @@ import ngraph as ng
 import ngraph.transformers as ngt
 import ngraph.analysis as an
 from builtins import range, zip
+from itertools import combinations
 
 
 def build_graphs(L, BS):
@@ -77,3 +78,77 @@ def test_topsort():
     for u, v in edges:
         assert(order.index(u) < order.index(v))
     print('pass topsort')
+
+
+def test_best_fit_placement():
+    """
+    Tensors live at the same time do not overlap, and the arena is as small as the
+    most memory live at once on this graph.
+    """
+    dfg, _ = build_graphs([32, 16, 24, 8], 4)
+    intervals = an.LiveIntervals(dfg.instructions, dfg.results)
+    peak, buffers = intervals.place(alignment=64)
+    assert peak == intervals.max_live_bytes()
+
+    placed = [(x.buffer, interval) for x, interval in intervals.intervals.items()]
+    for (u, (u_start, u_end)), (v, (v_start, v_end)) in combinations(placed, 2):
+        assert u.offset % 64 == 0
+        if u_start <= v_end and v_start <= u_end:
+            assert u.offset + u.size <= v.offset or v.offset + v.size <= u.offset
+    overlaps = an.overlapping_buffers(buffers)
+    assert any(overlaps.values())
+
+
+def test_interval_tree():
+    """
+    The tree finds exactly the added values whose intervals overlap the query.
+    """
+    intervals = [(start, start + length) for start in range(12) for length in (0, 2, 7)]
+    tree = an.IntervalTree(intervals)
+    for interval in intervals[::2]:
+        tree.add(interval, interval)
+    for start, end in combinations(range(-1, 22), 2):
+        expected = [(s, e) for s, e in intervals[::2] if s <= end and start <= e]
+        assert sorted(tree.overlapping(start, end)) == expected
+
+
+def test_live_masks():
+    """
+    The bitsets of live instructions agree with the live sets, also when tensors stop
+    being live before the end.
+    """
+    dfg, _ = build_graphs([32, 16, 24, 8], 4)
+    for op in dfg.successors:
+        if not isinstance(op, ng.AssignableTensorOp):
+            op.persistent = False
+    liveness = dfg.liveness()
+    order, masks = dfg.live_masks()
+    for i, op in enumerate(order):
+        assert liveness[op] == {x for x, mask in masks.items() if mask >> i & 1}
+    assert any(mask != (1 << len(order)) - 1 for mask in masks.values())
+
+    ifg = an.InterferenceGraph(masks=masks)
+    ifg.color()
+    for u, vs in iter(ifg.neighbors.items()):
+        for v in vs:
+            assert u.buffer.color != v.buffer.color
+
+
+def test_deep_graph():
+    """
+    Graphs deeper than the recursion limit can be ordered and sorted.
+    """
+    C = ng.make_axis(length=4, name='C')
+    x = ng.placeholder([C])
+    chain = [x]
+    for _ in range(2000):
+        chain.append(chain[-1] + 1)
+
+    ordered = ng.Op.ordered_ops([chain[-1]])
+    positions = {op: i for i, op in enumerate(ordered)}
+    assert all(positions[u] < positions[v] for u, v in zip(chain, chain[1:]))
+
+    dfg = an.DataFlowGraph(ngt.make_transformer(), [chain[-1]])
+    order = dfg.topsort()
+    assert order.index(x) < order.index(chain[1000]) < order.index(chain[-1])
+    assert dfg.can_reach([chain[3]], order=order)[-1] is chain[3]
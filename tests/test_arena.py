@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test allocating the buffers of the NumPy transformer in one arena.
+"""
+import numpy as np
+import pytest
+
+import ngraph as ng
+from ngraph.transformers.nptransform import NumPyTransformer
+
+
+def mlp_step(**kwargs):
+    """
+    Builds a small layer and its update.
+
+    Returns:
+        The transformer and the computation.
+    """
+    C = ng.make_axis(7, name='C')
+    D = ng.make_axis(5, name='D')
+    N = ng.make_axis(3, name='N', batch=True)
+    x = ng.placeholder([C, N])
+    w = ng.variable([D, C - 1], initial_value=np.arange(35, dtype=np.float32).reshape(5, 7))
+    hidden = ng.tanh(ng.dot(w, x))
+    cost = ng.sum(hidden * hidden, out_axes=())
+    update = ng.assign(w, w - 0.01 * ng.deriv(cost, w))
+
+    transformer = NumPyTransformer(**kwargs)
+    return transformer, transformer.computation([cost, update], x)
+
+
+@pytest.mark.parametrize('alignment', [64, 4096])
+def test_arena_buffers_are_aligned(alignment):
+    """
+    Every buffer is a view of the arena, starting at an aligned address, and the
+    buffers do not overlap.
+    """
+    transformer, computation = mlp_step(arena_alignment=alignment, pretouch=True)
+    computation(np.ones((7, 3), dtype=np.float32))
+
+    arena = transformer.model.arena
+    assert arena.ctypes.data % alignment == 0
+    extents = []
+    for device_buffer in transformer.device_buffers:
+        buffer = getattr(transformer.model, device_buffer.name)
+        assert np.may_share_memory(buffer, arena)
+        assert buffer.ctypes.data % alignment == 0
+        extents.append((buffer.ctypes.data, buffer.ctypes.data + buffer.nbytes))
+    extents.sort()
+    for (_, end), (start, _) in zip(extents, extents[1:]):
+        assert end <= start
+
+
+def test_arena_matches_separate_buffers():
+    """
+    Training steps give the same values with and without the arena.
+    """
+    x = np.random.RandomState(0).uniform(-1, 1, (7, 3)).astype(np.float32)
+    _, separate = mlp_step()
+    expected = [np.copy(separate(x)[0]) for _ in range(3)]
+    _, arena = mlp_step(arena_alignment=64)
+    for expected_cost in expected:
+        np.testing.assert_allclose(arena(x)[0], expected_cost, rtol=1e-6)
+
+
+def test_best_fit_planner():
+    """
+    The best_fit planner reuses memory, and training steps give the same values.
+    """
+    x = np.random.RandomState(0).uniform(-1, 1, (7, 3)).astype(np.float32)
+    colored, separate = mlp_step(arena_alignment=64)
+    expected = [np.copy(separate(x)[0]) for _ in range(3)]
+    planned, best_fit = mlp_step(memory_planner='best_fit')
+    for expected_cost in expected:
+        np.testing.assert_allclose(best_fit(x)[0], expected_cost, rtol=1e-6)
+
+    # Compare arenas with the same alignment, which pads small tensors
+    assert planned.arena_alignment == 64
+    assert planned.memory_lower_bound <= planned.memory < colored.arena_bytes
@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test binding computation parameters to caller-owned arrays.
+"""
+import numpy as np
+import pytest
+
+import ngraph as ng
+from ngraph.transformers.base import DeviceTensor
+from ngraph.transformers.nptransform import NumPyTransformer
+
+
+def scaled_sum(**kwargs):
+    """
+    Returns:
+        The placeholders and a computation of 2 * x + y.
+    """
+    C = ng.make_axis(6, name='C')
+    N = ng.make_axis(4, name='N')
+    x = ng.placeholder([C, N])
+    y = ng.placeholder([C, N])
+    transformer = NumPyTransformer(**kwargs)
+    return x, y, transformer.computation(2 * x + y, x, y)
+
+
+def arrays(n):
+    return [np.arange(24, dtype=np.float32).reshape(6, 4) * (i + 1) for i in range(n)]
+
+
+def test_bound_parameter_reads_caller_array():
+    """
+    A bound parameter uses the caller's memory, so changes to it are seen by later calls.
+    """
+    x, y, computation = scaled_sum()
+    a, b = arrays(2)
+    computation.bind(x, a)
+    assert np.may_share_memory(x.value.get(None), a)
+
+    np.testing.assert_allclose(computation(None, b), 2 * a + b)
+    a[...] = 1
+    np.testing.assert_allclose(computation(None, b), 2 + b)
+
+
+def test_ring_of_bound_buffers():
+    """
+    Passing another array to a bound parameter binds it instead of copying it.
+    """
+    x, y, computation = scaled_sum()
+    ring = arrays(3)
+    b, = arrays(1)
+    computation.bind(x, ring[0])
+    for step in range(5):
+        a = ring[step % 3]
+        np.testing.assert_allclose(computation(a, b), 2 * a + b)
+        assert np.may_share_memory(x.value.get(None), a)
+
+
+def test_bound_for_a_block():
+    """
+    Parameters bound in a with block use their own storage again after it.
+    """
+    x, y, computation = scaled_sum()
+    a, b = arrays(2)
+    with computation.bound(a, None):
+        np.testing.assert_allclose(computation(None, b), 2 * a + b)
+
+    saved = np.copy(a)
+    np.testing.assert_allclose(computation(b, b), 3 * b)
+    assert not np.may_share_memory(x.value.get(None), a)
+    np.testing.assert_array_equal(a, saved)
+
+
+@pytest.mark.parametrize('array', [
+    np.zeros((6, 4), dtype=np.float64),
+    np.zeros((4, 6), dtype=np.float32),
+    np.zeros((4, 6), dtype=np.float32).T,
+    np.zeros((6, 8), dtype=np.float32)[:, ::2],
+])
+def test_bind_checks_layout(array):
+    """
+    Arrays with another dtype, shape or strides cannot be bound.
+    """
+    x, y, computation = scaled_sum()
+    with pytest.raises(ValueError):
+        computation.bind(x, array)
+
+
+class UnbindableTensor(DeviceTensor):
+    """
+    A device tensor of a transformer without host array binding.
+    """
+    transform_allocate = get = __getitem__ = __setitem__ = None
+
+
+def test_bind_unsupported():
+    """
+    Transformers that cannot bind host arrays say so.
+    """
+    tensor = UnbindableTensor(NumPyTransformer(), None, None)
+    with pytest.raises(NotImplementedError) as error:
+        tensor.bind(np.zeros(4))
+    assert 'NumPyTransformer does not support binding' in str(error.value)
+
+
+def test_bind_cached_transformation(tmpdir):
+    """
+    Parameters of a computation loaded from the cache can be bound too.
+    """
+    for _ in range(2):
+        x, y, computation = scaled_sum(cache_dir=str(tmpdir))
+        a, b = arrays(2)
+        computation.bind(x, a)
+        np.testing.assert_allclose(computation(None, b), 2 * a + b)
+        assert np.may_share_memory(x.value.get(None), a)
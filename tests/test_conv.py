@@ -16,7 +16,7 @@
 import numpy as np
 
 import ngraph as ng
-from ngraph.util.utils import executor
+from ngraph.util.utils import executor, ExecutorFactory
 from ngraph.util.utils import RandomTensorGenerator
 from ngraph.op_graph.axes import spatial_axis
 from ngraph.frontends.neon import ax, ar
@@ -118,3 +118,167 @@ def test_convolution(transformer_factory):
 
     # Compare update
     np.testing.assert_allclose(gradF_ng, gradF_ne, rtol=0, atol=1e-4)
+
+
+def reference_conv(input_value, filter_value, pads, strides, out_shape):
+    """
+    Direct convolution over a zero-padded copy of the input.
+    """
+    C, D, H, W, N = input_value.shape
+    _, T, R, S, K = filter_value.shape
+    _, M, P, Q, _ = out_shape
+    padded = np.zeros((C,
+                       max(D + pads[0], (M - 1) * strides[0] + T),
+                       max(H + pads[1], (P - 1) * strides[1] + R),
+                       max(W + pads[2], (Q - 1) * strides[2] + S),
+                       N))
+    padded[:, pads[0]:pads[0] + D, pads[1]:pads[1] + H, pads[2]:pads[2] + W] = input_value
+    result = np.zeros(out_shape)
+    for m, p, q in np.ndindex(M, P, Q):
+        d, h, w = m * strides[0], p * strides[1], q * strides[2]
+        window = padded[:, d:d + T, h:h + R, w:w + S, :]
+        result[:, m, p, q, :] = np.tensordot(filter_value, window,
+                                             axes=([0, 1, 2, 3], [0, 1, 2, 3]))
+    return result
+
+
+def reference_conv_bprop(filter_value, delta, input_shape, pads, strides):
+    """
+    Gradient of a direct convolution with respect to its input.
+    """
+    C, D, H, W, N = input_shape
+    _, T, R, S, K = filter_value.shape
+    _, M, P, Q, _ = delta.shape
+    padded = np.zeros((C,
+                       max(D + pads[0], (M - 1) * strides[0] + T),
+                       max(H + pads[1], (P - 1) * strides[1] + R),
+                       max(W + pads[2], (Q - 1) * strides[2] + S),
+                       N))
+    for m, p, q in np.ndindex(M, P, Q):
+        d, h, w = m * strides[0], p * strides[1], q * strides[2]
+        padded[:, d:d + T, h:h + R, w:w + S, :] += np.tensordot(filter_value,
+                                                                delta[:, m, p, q, :],
+                                                                axes=([4], [0]))
+    return padded[:, pads[0]:pads[0] + D, pads[1]:pads[1] + H, pads[2]:pads[2] + W]
+
+
+def reference_conv_update(input_value, delta, filter_shape, pads, strides):
+    """
+    Gradient of a direct convolution with respect to its filters.
+    """
+    C, D, H, W, N = input_value.shape
+    _, T, R, S, K = filter_shape
+    _, M, P, Q, _ = delta.shape
+    padded = np.zeros((C,
+                       max(D + pads[0], (M - 1) * strides[0] + T),
+                       max(H + pads[1], (P - 1) * strides[1] + R),
+                       max(W + pads[2], (Q - 1) * strides[2] + S),
+                       N))
+    padded[:, pads[0]:pads[0] + D, pads[1]:pads[1] + H, pads[2]:pads[2] + W] = input_value
+    result = np.zeros(filter_shape)
+    for m, p, q in np.ndindex(M, P, Q):
+        d, h, w = m * strides[0], p * strides[1], q * strides[2]
+        window = padded[:, d:d + T, h:h + R, w:w + S, :]
+        result += np.tensordot(window, delta[:, m, p, q, :], axes=([4], [1]))
+    return result
+
+
+def strided_convolution(pads, strides):
+    """
+    Builds a small convolution with the given padding and strides.
+
+    Returns: The input and filter placeholders and the convolution output.
+    """
+    N = 4
+    C, K = 3, 5
+    D, T = 3, 2
+    H, W = 9, 7
+    R, S = 3, 2
+
+    conv_params = dict(pad_d=pads[0], pad_h=pads[1], pad_w=pads[2],
+                       str_d=strides[0], str_h=strides[1], str_w=strides[2])
+
+    ax_i = ng.make_axes([ax.C, ax.D, ax.H, ax.W, ax.N])
+    ax_f = ng.make_axes([ax.C, ax.T, ax.R, ax.S, ax.K])
+    ax_i.set_shape((C, D, H, W, N))
+    ax_f.set_shape((C, T, R, S, K))
+    ax_o = ng.make_axes([
+        ng.make_axis(ax_f.role_axes(ar.Channelout)[0].length, name='C', roles=[ar.Channel]),
+        spatial_axis(ax_i, ax_f, pads[0], strides[0], role=ar.Depth),
+        spatial_axis(ax_i, ax_f, pads[1], strides[1], role=ar.Height),
+        spatial_axis(ax_i, ax_f, pads[2], strides[2], role=ar.Width),
+        ax.N
+    ])
+
+    inputs = ng.placeholder(ax_i)
+    filters = ng.placeholder(ax_f)
+    output = ng.convolution(conv_params, inputs, filters, axes=ax_o)
+    return inputs, filters, output
+
+
+def test_convolution_padding_strides(transformer_factory):
+    """
+    test convolution forward path with padding and strides against a direct convolution
+    """
+    pads = (1, 2, 1)
+    strides = (2, 1, 3)
+    inputs, filters, output = strided_convolution(pads, strides)
+
+    input_value = rng.uniform(-1, 1, inputs.axes)
+    filter_value = rng.uniform(-1, 1, filters.axes)
+
+    result_ng = executor(output, inputs, filters)(input_value, filter_value)
+    result_np = reference_conv(input_value, filter_value, pads, strides, output.axes.lengths)
+
+    np.testing.assert_allclose(result_ng, result_np, rtol=0, atol=1e-5)
+
+
+def test_convolution_bprop_padding_strides(transformer_factory):
+    """
+    test convolution input gradient with padding and strides against a direct convolution
+    """
+    pads = (1, 2, 1)
+    strides = (2, 1, 3)
+    inputs, filters, output = strided_convolution(pads, strides)
+    delta = ng.placeholder(output.axes)
+    error = ng.sum(output * delta, out_axes=())
+    grad_inputs = ng.deriv(error, inputs)
+
+    input_value = rng.uniform(-1, 1, inputs.axes)
+    filter_value = rng.uniform(-1, 1, filters.axes)
+    delta_value = rng.uniform(-1, 1, output.axes)
+
+    result_ng = executor(grad_inputs, inputs, filters, delta)(input_value, filter_value,
+                                                              delta_value)
+    result_np = reference_conv_bprop(filter_value, delta_value, input_value.shape, pads,
+                                     strides)
+
+    np.testing.assert_allclose(result_ng, result_np, rtol=0, atol=1e-5)
+
+
+def test_convolution_update_padding_strides(transformer_factory):
+    """
+    test convolution filter gradient with padding and strides against a direct convolution,
+    both with and without the forward pass in the same computation
+    """
+    pads = (1, 2, 1)
+    strides = (2, 1, 3)
+    inputs, filters, output = strided_convolution(pads, strides)
+    delta = ng.placeholder(output.axes)
+    error = ng.sum(output * delta, out_axes=())
+    grad_filters = ng.deriv(error, filters)
+
+    input_value = rng.uniform(-1, 1, inputs.axes)
+    filter_value = rng.uniform(-1, 1, filters.axes)
+    delta_value = rng.uniform(-1, 1, output.axes)
+    result_np = reference_conv_update(input_value, delta_value, filter_value.shape, pads,
+                                      strides)
+
+    ex = ExecutorFactory()
+    update = ex.executor(grad_filters, inputs, filters, delta)
+    both = ex.executor([output, grad_filters], inputs, filters, delta)
+    update_ng = update(input_value, filter_value, delta_value)
+    _, both_ng = both(input_value, filter_value, delta_value)
+
+    np.testing.assert_allclose(update_ng, result_np, rtol=0, atol=1e-5)
+    np.testing.assert_allclose(both_ng, result_np, rtol=0, atol=1e-5)
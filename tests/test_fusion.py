@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test fusion of elementwise ops on the NumPy transformer.
+"""
+import numpy as np
+
+import ngraph as ng
+from ngraph.transformers.nptransform import NumPyTransformer
+
+rng = np.random.RandomState(0)
+
+
+def rmsprop_update(fusion, **kwargs):
+    """
+    Builds an RMSProp style update and the transformer computing it.
+
+    Returns:
+        The transformer and the computation.
+    """
+    C = ng.make_axis(100, name='C')
+    N = ng.make_axis(50, name='N')
+    param = ng.placeholder([C, N])
+    grad = ng.placeholder([C, N])
+    state = ng.placeholder([C, N])
+
+    new_state = 0.9 * state + 0.1 * ng.square(grad)
+    new_param = param - 0.01 * grad / (ng.sqrt(new_state) + 1e-8) * ng.tanh(param)
+
+    transformer = NumPyTransformer(fusion=fusion, **kwargs)
+    computation = transformer.computation([new_param, new_state], param, grad, state)
+    return transformer, computation
+
+
+def test_fused_chain_matches_unfused():
+    """
+    A fused chain walked in several chunks, the last one partial, gives the same values.
+    """
+    values = [rng.uniform(0.1, 1, (100, 50)).astype(np.float32) for _ in range(3)]
+    _, unfused = rmsprop_update(None)
+    expected = [np.copy(x) for x in unfused(*values)]
+
+    # The smallest chunks have 4096 elements, so the 5000 elements take two chunks
+    _, fused = rmsprop_update(True, fusion_chunk_bytes=1)
+    for result, expected_result in zip(fused(*values), expected):
+        np.testing.assert_allclose(result, expected_result, rtol=1e-6)
+
+
+def test_fused_chain_is_one_kernel():
+    """
+    The elementwise ops of the update, and the views between them, become one kernel.
+    """
+    transformer, computation = rmsprop_update(True)
+    computation(*[rng.uniform(0.1, 1, (100, 50)).astype(np.float32) for _ in range(3)])
+
+    kernels = [op for op in transformer.ops if isinstance(op, ng.Function)]
+    device_ops = [[x for x in kernel.instructions if x.is_device_op] for kernel in kernels]
+    assert max(len(ops) for ops in device_ops) >= 8
+
+
+def test_no_fusion_through_unfusible_ops():
+    """
+    Elementwise ops joined by a path through a dot stay in separate kernels.
+    """
+    C = ng.make_axis(20, name='C')
+    N = ng.make_axis(10, name='N')
+    x = ng.placeholder([C, N])
+    w = ng.placeholder([C, C - 1])
+    h = ng.tanh(x)
+    result = h + ng.dot(w, h)
+    values = [rng.uniform(-1, 1, (20, 10)).astype(np.float32),
+              rng.uniform(-1, 1, (20, 20)).astype(np.float32)]
+
+    transformer = NumPyTransformer(fusion=True)
+    computation = transformer.computation(result, x, w)
+    expected = np.tanh(values[0]) + np.dot(values[1], np.tanh(values[0]))
+    np.testing.assert_allclose(computation(*values), expected, rtol=1e-5)
+
+    # Fusing the tanh with the add would pull in the dot between them
+    kernels = [op for op in transformer.ops if isinstance(op, ng.Function)]
+    device_ops = [[x for x in kernel.instructions if x.is_device_op] for kernel in kernels]
+    assert sorted(len(ops) for ops in device_ops) == [1, 1, 1]
@@ -12,9 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ----------------------------------------------------------------------------
+import numpy as np
+
 import ngraph as ng
-from ngraph.op_graph.op_graph import AssignableTensorOp, Op
-from ngraph.transformers.passes.passes import PeepholeGraphPass, GraphPass, SimplePrune
+from ngraph.op_graph.op_graph import AssignableTensorOp, Op, SquareOp, SqrtOp, Multiply, \
+    ReorderAxes, Transpose, Dimshuffle, TensorDot, LowDimensionalDot, ReductionOp
+from ngraph.transformers.nptransform import NumPyTransformer
+from ngraph.transformers.passes.passes import PeepholeGraphPass, GraphPass, SimplePrune, \
+    CommonSubexpressionElimination, ConstantFolding, AlgebraicSimplification, NativeTensorDot, \
+    NativeElementwise
 from ngraph.util.generics import generic_method
 
 
@@ -61,3 +67,212 @@ def test_simple_pass():
     pass_inst = MySimpleGraphPass()
     output_val = pass_inst.do_pass([simple_graph])
     assert output_val == 3
+
+
+def test_peephole_revisits_users_of_replaced_ops():
+    base_op = ng.constant(5.0)
+    simple_graph = ng.negative(ng.negative(base_op))
+    output_graph = SimplePrune().do_pass([simple_graph]).pop()
+    assert output_graph.is_constant
+    assert output_graph.const == 5.0
+
+
+def test_forwarding_chains_are_compressed():
+    ops = [ng.constant(float(i)) for i in range(4)]
+    for op, rep in zip(ops, ops[1:]):
+        op.replace_self(rep)
+    assert ops[0].forwarded is ops[-1]
+    assert all(op.forward is ops[-1] for op in ops[:-1])
+
+
+def test_cse_merges_duplicated_subgraphs():
+    x = ng.placeholder([ng.make_axis(4, name='C')])
+    first = ng.tanh(x) * ng.exp(x)
+    second = ng.tanh(x) * ng.exp(x)
+    output_graph = CommonSubexpressionElimination().do_pass([first, second])
+    assert output_graph == {first}
+    assert second.forwarded is first
+
+
+def test_cse_keeps_assignable_and_random_ops():
+    C = ng.make_axis(4, name='C')
+    x, y = ng.placeholder([C]), ng.placeholder([C])
+    first, second = ng.uniform(x), ng.uniform(x)
+    output_graph = CommonSubexpressionElimination().do_pass([x, y, first, second])
+    assert output_graph == {x, y, first, second}
+
+
+def test_constant_folding():
+    C = ng.make_axis(4, name='C')
+    N = ng.make_axis(3, name='N')
+    np_a = np.arange(12, dtype=np.float32).reshape(4, 3) / 10
+    np_b = np.array([1, 2, 3], dtype=np.float32)
+    a, b = ng.constant(np_a, [C, N]), ng.constant(np_b, [N])
+    result = ng.sum(ng.exp(a) * b + ng.tensor_size(a), out_axes=[N])
+    output_graph = ConstantFolding().do_pass([result]).pop()
+    assert isinstance(output_graph, AssignableTensorOp) and output_graph.is_constant
+    np.testing.assert_allclose(output_graph.const,
+                               np.sum(np.exp(np_a) * np_b + 12, axis=0), rtol=1e-6)
+
+
+def test_constant_folding_size_cap():
+    C = ng.make_axis(4, name='C')
+    N = ng.make_axis(3, name='N')
+    x = ng.constant(np.ones((4, 3)), [C, N])
+    result = ng.sum(x * 2, out_axes=[N])
+    output_graph = ConstantFolding(max_size=10).do_pass([result]).pop()
+    assert output_graph is result
+
+
+def simplify(op):
+    return AlgebraicSimplification().do_pass([op]).pop()
+
+
+def test_simplify_power_to_square():
+    x = ng.placeholder([ng.make_axis(4)])
+    result = simplify(ng.power(x, 2))
+    assert isinstance(result, SquareOp)
+    assert result.args[0] is x
+
+    result = simplify(ng.power(x, 0.5))
+    assert isinstance(result, SqrtOp)
+    assert result.args[0] is x
+
+
+def test_simplify_divide_by_constant():
+    x = ng.placeholder([ng.make_axis(4)])
+    result = simplify(x / 4.0)
+    assert isinstance(result, Multiply)
+    assert result.args[1].scalar_op.const == 0.25
+
+    result = simplify(x / 0.0)
+    assert not isinstance(result, Multiply)
+
+
+def test_simplify_double_negation():
+    x = ng.placeholder([ng.make_axis(4)])
+    assert simplify(-(-x)) is x
+
+
+def test_simplify_reorder_of_reorder():
+    C, D, E = ng.make_axis(2), ng.make_axis(3), ng.make_axis(4)
+    x = ng.placeholder([C, D, E])
+    result = simplify(ReorderAxes(ReorderAxes(x, ng.make_axes([D, C, E])),
+                                  ng.make_axes([E, D, C])))
+    assert isinstance(result, ReorderAxes)
+    assert result.args[0] is x
+    assert result.axes == ng.make_axes([E, D, C])
+
+    result = simplify(ReorderAxes(ReorderAxes(x, ng.make_axes([D, C, E])), x.axes))
+    assert result is x
+
+
+def test_simplify_transpose_of_transpose():
+    x = ng.placeholder([ng.make_axis(3), ng.make_axis(4)])
+    assert simplify(Transpose(Transpose(x))) is x
+
+
+def test_simplify_identity_dimshuffle():
+    x = ng.placeholder([ng.make_axis(3), ng.make_axis(4)])
+    assert simplify(Dimshuffle(x, x.axes)) is x
+
+    result = simplify(Dimshuffle(x, ng.make_axes(reversed(x.axes))))
+    assert isinstance(result, Dimshuffle)
+
+
+def shuffles(transformer):
+    return [op for op in Op.ordered_ops(transformer.ops) if isinstance(op, Dimshuffle)]
+
+
+def transformer_without(*graph_pass_types):
+    transformer = NumPyTransformer(fusion=None)
+    transformer.graph_passes = [graph_pass for graph_pass in transformer.graph_passes
+                                if not isinstance(graph_pass, graph_pass_types)]
+    return transformer
+
+
+def test_layout_assignment_reads_transposed_dot_operands():
+    C, D, N = ng.make_axis(3), ng.make_axis(4), ng.make_axis(5)
+    x = ng.placeholder([N, C])
+    w = ng.placeholder([D, C - 1])
+    x_value = np.arange(15, dtype=np.float32).reshape(5, 3)
+    w_value = np.arange(12, dtype=np.float32).reshape(4, 3)
+
+    # Dots reduced to matrix products, as on transformers without TensorDot
+    transformer = transformer_without(NativeTensorDot)
+    computation = transformer.computation(ng.dot(w, x), x, w)
+    result = computation(x_value, w_value)
+    np.testing.assert_allclose(result, np.dot(w_value, x_value.T))
+    assert shuffles(transformer) == []
+    assert transformer.layout_assignment.shuffles_eliminated == 1
+    assert transformer.layout_assignment.bytes_eliminated == 15 * 4
+
+
+def test_layout_assignment_copies_views_that_do_not_flatten():
+    C, D = ng.make_axis(3), ng.make_axis(4)
+    x = ng.placeholder([C, D])
+    x_value = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    # Elementwise ops reduced to one dimension, as on transformers without strided ones
+    transformer = transformer_without(NativeElementwise)
+    x_t = ng.axes_with_order(x, ng.make_axes([D, C]))
+    result = transformer.computation(ng.tanh(x_t), x)(x_value)
+    np.testing.assert_allclose(result, np.tanh(x_value.T), rtol=1e-6)
+    assert len(shuffles(transformer)) == 1
+    assert transformer.layout_assignment.shuffles_eliminated == 0
+
+
+def test_native_tensor_dot():
+    A, B, C, D, E = (ng.make_axis(length) for length in (2, 3, 4, 5, 6))
+    x = ng.placeholder([B, A, C, D])
+    y = ng.placeholder([E, C - 1, B - 1])
+    rng = np.random.RandomState(0)
+    x_value = rng.uniform(-1, 1, (3, 2, 4, 5)).astype(np.float32)
+    y_value = rng.uniform(-1, 1, (6, 4, 3)).astype(np.float32)
+
+    transformer = NumPyTransformer(fusion=None)
+    result = transformer.computation(ng.dot(y, x), x, y)(x_value, y_value)
+    np.testing.assert_allclose(result, np.einsum('ecb,bacd->ead', y_value, x_value),
+                               rtol=1e-5)
+    ops = Op.ordered_ops(transformer.ops)
+    assert any(isinstance(op, TensorDot) for op in ops)
+    assert not any(isinstance(op, LowDimensionalDot) for op in ops)
+    assert shuffles(transformer) == []
+
+
+def test_native_reduction():
+    A, B, C = ng.make_axis(2), ng.make_axis(3), ng.make_axis(4)
+    x = ng.placeholder([A, B, C])
+    x_value = np.random.RandomState(0).uniform(-1, 1, (2, 3, 4)).astype(np.float32)
+
+    transformer = NumPyTransformer(fusion=None)
+    results = [ng.sum(x, reduction_axes=[A, C]),
+               ng.max(x, reduction_axes=[B], out_axes=[C, A]),
+               ng.argmax(x, reduction_axes=[B]),
+               ng.argmin(x, reduction_axes=[C])]
+    total, largest, argmax, argmin = transformer.computation(results, x)(x_value)
+    np.testing.assert_allclose(total, x_value.sum(axis=(0, 2)), rtol=1e-5)
+    np.testing.assert_allclose(largest, x_value.max(axis=1).T)
+    np.testing.assert_equal(argmax, x_value.argmax(axis=1))
+    np.testing.assert_equal(argmin, x_value.argmin(axis=2))
+    reductions = [op for op in Op.ordered_ops(transformer.ops) if isinstance(op, ReductionOp)]
+    assert len(reductions) == 4
+    assert all(reduction.args[0].forwarded is x for reduction in reductions)
+    assert shuffles(transformer) == []
+
+
+def test_native_elementwise():
+    C, N = ng.make_axis(3), ng.make_axis(4)
+    x = ng.placeholder([C, N])
+    b = ng.placeholder([C])
+    x_value = np.arange(12, dtype=np.float32).reshape(3, 4)
+    b_value = np.arange(3, dtype=np.float32)
+
+    transformer = NumPyTransformer(fusion=None)
+    x_t = ng.axes_with_order(x, ng.make_axes([N, C]))
+    results = [x + b, ng.tanh(x_t), x[:, 1:3] * 2]
+    biased, tanh, doubled = transformer.computation(results, x, b)(x_value, b_value)
+    np.testing.assert_allclose(biased, x_value + b_value[:, np.newaxis])
+    np.testing.assert_allclose(tanh, np.tanh(x_value.T), rtol=1e-6)
+    np.testing.assert_allclose(doubled, x_value[:, 1:3] * 2)
+    assert shuffles(transformer) == []
@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test concurrent execution of independent ops on the NumPy transformer.
+"""
+import numpy as np
+import pytest
+
+import ngraph as ng
+from ngraph.op_graph.op_graph import Fill, Function
+from ngraph.transformers.nptransform import NumPyTransformer
+
+rng = np.random.RandomState(0)
+
+
+def parallel_updates(inter_op_threads, fusion=None):
+    """
+    Builds independent updates of several variables, each read before it is written.
+
+    Returns:
+        The transformer and the computation.
+    """
+    C = ng.make_axis(20, name='C')
+    N = ng.make_axis(10, name='N')
+    xs = [ng.placeholder([C, N]) for _ in range(4)]
+    ws = [ng.variable([C, N], initial_value=1.) for _ in range(4)]
+    total = ws[0] + ws[1] + ws[2] + ws[3]
+    updates = [ng.assign(w, w * ng.tanh(x) + 0.5) for w, x in zip(ws, xs)]
+
+    transformer = NumPyTransformer(inter_op_threads=inter_op_threads, fusion=fusion)
+    computation = transformer.computation([total, ng.doall(updates)], *xs)
+    return transformer, computation
+
+
+@pytest.mark.parametrize('fusion', [None, True])
+def test_parallel_matches_sequential(fusion):
+    """
+    Updates run concurrently give the same values, and reads see the old variables.
+    """
+    values = [[rng.uniform(-1, 1, (20, 10)).astype(np.float32) for _ in range(4)]
+              for _ in range(3)]
+    _, sequential = parallel_updates(1, fusion)
+    expected = [np.copy(sequential(*x)[0]) for x in values]
+
+    transformer, parallel = parallel_updates(4, fusion)
+    for x, expected_total in zip(values, expected):
+        np.testing.assert_allclose(parallel(*x)[0], expected_total, rtol=1e-6)
+    assert 'run_parallel' in transformer.code.code
+
+
+def test_parallel_stages():
+    """
+    The independent updates of the variables share stages.
+    """
+    transformer, computation = parallel_updates(4)
+    computation(*[rng.uniform(-1, 1, (20, 10)).astype(np.float32) for _ in range(4)])
+
+    stages = transformer.parallel_stages(transformer.ops)
+    assert sum(len(stage) for stage in stages) == len(transformer.ops)
+    assert max(sum(op.is_device_op for op in stage) for stage in stages) >= 4
+
+
+def test_fill_waits_for_readers():
+    """
+    A Fill writes its tensor in place, so it never runs with the ops reading the tensor.
+    """
+    C = ng.make_axis(20, name='C')
+    N = ng.make_axis(10, name='N')
+    w = ng.variable([C, N], initial_value=1.)
+    total = ng.sum(w * 3, out_axes=())
+
+    with NumPyTransformer(inter_op_threads=4) as transformer:
+        computation = transformer.computation([total, Fill(w, 5.0)])
+        computation()
+
+        for stage in transformer.parallel_stages(transformer.ops):
+            instructions = [x for op in stage
+                            for x in (op.instructions if isinstance(op, Function) else [op])
+                            if x.is_device_op]
+            if any(isinstance(x, Fill) for x in instructions):
+                assert len(instructions) == 1
+    assert transformer.thread_pool is None
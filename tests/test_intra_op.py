@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test ops split into chunks run by several threads on the NumPy transformer.
+"""
+import numpy as np
+import pytest
+
+import ngraph as ng
+from ngraph.transformers.nptransform import NumPyTransformer
+
+rng = np.random.RandomState(0)
+
+
+def chunked_transformer():
+    # A low threshold splits every op of the small tests, which are left unfused
+    return NumPyTransformer(fusion=None, intra_op_threads=3, intra_op_threshold=64)
+
+
+def test_chunked_elementwise():
+    """
+    Elementwise ops, including ones with a scalar argument, split into chunks.
+    """
+    C = ng.make_axis(40, name='C')
+    N = ng.make_axis(30, name='N')
+    x = ng.placeholder([C, N])
+    y = ng.placeholder([C, N])
+    values = [rng.uniform(-1, 1, (40, 30)).astype(np.float32) for _ in range(2)]
+
+    transformer = chunked_transformer()
+    computation = transformer.computation(ng.tanh(x) * y + 2., x, y)
+    np.testing.assert_allclose(computation(*values),
+                               np.tanh(values[0]) * values[1] + 2., rtol=1e-6)
+    assert 'run_chunks' in transformer.code.code
+
+
+@pytest.mark.parametrize('reduction', ['sum', 'max', 'min'])
+@pytest.mark.parametrize('reduced', ['C', 'N', 'CN'])
+def test_chunked_reduction(reduction, reduced):
+    """
+    Reductions split along wide outputs, or into partial results of the reduced axis.
+    """
+    C = ng.make_axis(300, name='C')
+    N = ng.make_axis(4, name='N')
+    axes = {'C': ng.make_axes([C]), 'N': ng.make_axes([N]), 'CN': ng.make_axes([C, N])}
+    numpy_axes = {'C': 0, 'N': 1, 'CN': None}[reduced]
+    x = ng.placeholder([C, N])
+    value = rng.uniform(-1, 1, (300, 4)).astype(np.float32)
+
+    transformer = chunked_transformer()
+    result = getattr(ng, reduction)(x, reduction_axes=axes[reduced])
+    computation = transformer.computation(result, x)
+    np.testing.assert_allclose(computation(value),
+                               getattr(np, reduction)(value, axis=numpy_axes), rtol=1e-5)
+    assert 'run_chunks' in transformer.code.code
+
+
+@pytest.mark.parametrize('fusion_chunk_bytes', [1 << 13, 1 << 20])
+def test_chunked_fused_kernel(fusion_chunk_bytes):
+    """
+    Fused kernels split into ranges, each walked in cache blocks or in one block, with
+    the values kept inside the kernel in buffers of their own for each range.
+    """
+    C = ng.make_axis(20000, name='C')
+    x = ng.placeholder([C])
+    y = ng.placeholder([C])
+    values = [rng.uniform(-1, 1, 20000).astype(np.float32) for _ in range(2)]
+
+    transformer = NumPyTransformer(intra_op_threads=3, intra_op_threshold=64,
+                                   fusion_chunk_bytes=fusion_chunk_bytes)
+    computation = transformer.computation(ng.tanh(ng.exp(x) * y) + 2., x, y)
+    np.testing.assert_allclose(computation(*values),
+                               np.tanh(np.exp(values[0]) * values[1]) + 2., rtol=1e-6)
+    assert 'for lo in range(start, stop' in transformer.code.code
+    assert 'run_chunks' in transformer.code.code
@@ -16,6 +16,7 @@ import pytest
 
 import numpy as np
 import ngraph as ng
+from ngraph.op_graph.op_graph import DebugInfo
 from ngraph.util.utils import ExecutorFactory
 
 
@@ -133,3 +134,22 @@ def test_setting():
     assert np.allclose(e_v1, np_x + np_y)
     e_v2 = f_v2().copy()
     assert np.allclose(e_v2, np_x + np_y)
+
+
+def test_debug_info():
+    """
+    Ops record the user code that created them, not the op_graph code.
+    """
+    x = ng.placeholder(())
+    y = ng.tanh(x) * 2  # the op created here
+
+    assert y.filename == __file__.replace('.pyc', '.py')
+    assert y.code_context == ['    y = ng.tanh(x) * 2  # the op created here\n']
+    assert y.file_info == 'File "{}", line {}'.format(y.filename, y.lineno)
+
+    DebugInfo.capture = False
+    try:
+        z = ng.tanh(x)
+    finally:
+        DebugInfo.capture = True
+    assert z.filename is None and z.lineno is None and z.code_context is None
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ----------------------------------------------------------------------------
+import pytest
+
 import ngraph as ng
 
 
@@ -51,3 +53,21 @@ def test_metadata_capture():
     x = ng.constant(2)
     ret = layer.configure(x)
     assert ret.metadata['layer_type'] == 'convolution'
+
+
+def test_metadata_shared():
+    x = ng.constant(2)
+    with ng.metadata(layer_type='dense'):
+        y = ng.exp(x)
+        z = y + x
+    # Ops given the same metadata share one dict
+    assert y.metadata is z.metadata
+    assert y.metadata == dict(layer_type='dense')
+    assert len(x.metadata) == 0
+
+    ng.add_metadata([z], dict(step='1'))
+    assert z.metadata == dict(layer_type='dense', step='1')
+    assert y.metadata == dict(layer_type='dense')
+
+    with pytest.raises(TypeError):
+        x.metadata['layer_type'] = 'dense'
@@ -14,6 +14,7 @@
 # ----------------------------------------------------------------------------
 
 import numpy as np
+import pytest
 
 import ngraph as ng
 import ngraph.transformers as ngt
@@ -111,3 +112,102 @@ def test_pooling():
 
     # Compare bprop
     np.testing.assert_allclose(gradI_ng, gradI_ne, rtol=0, atol=1e-6)
+
+
+def reference_pool(input_value, delta, fshape, padding, strides, op, out_shape):
+    """
+    Direct pooling over the clipped windows of the input, and its gradient.
+    """
+    window = [fshape[name] for name in ('J', 'T', 'R', 'S')]
+    pads = [padding['pad_' + name] for name in ('c', 'd', 'h', 'w')]
+    strs = [strides['str_' + name] for name in ('c', 'd', 'h', 'w')]
+    N = input_value.shape[-1]
+    result = np.zeros(out_shape)
+    grad = np.zeros(input_value.shape)
+    for index in np.ndindex(*out_shape[:4]):
+        patch = tuple(slice(max(o * s - p, 0), min(o * s - p + f, X))
+                      for o, f, p, s, X in zip(index, window, pads, strs, input_value.shape))
+        values = input_value[patch].reshape((-1, N))
+        grads = grad[patch].reshape((-1, N))
+        if op == 'max':
+            argmax = np.argmax(values, axis=0)
+            result[index] = values[argmax, np.arange(N)]
+            grads[argmax, np.arange(N)] += delta[index]
+        else:
+            result[index] = values.mean(axis=0)
+            grads += delta[index] / values.shape[0]
+        grad[patch] = grads.reshape(grad[patch].shape)
+    return result, grad
+
+
+@pytest.mark.parametrize("op", ['max', 'avg'])
+def test_pooling_padding_strides(transformer_factory, op):
+    """
+    test pooling forward and backward path with padding and strides, including pooling
+    across channels, against a direct pooling
+    """
+    C, D, H, W, N = 6, 3, 9, 7, 4
+
+    padding = dict(pad_c=1, pad_d=1, pad_h=1, pad_w=0)
+    strides = dict(str_c=2, str_d=1, str_h=3, str_w=2)
+    fshape = dict(J=2, T=2, R=3, S=2)
+
+    pool_params = dict(op=op)
+    pool_params.update(padding)
+    pool_params.update(strides)
+    pool_params.update(fshape)
+
+    ax_i = ng.make_axes([ax.C, ax.D, ax.H, ax.W, ax.N])
+    ax_i.set_shape((C, D, H, W, N))
+    inputs = ng.placeholder(axes=ax_i)
+
+    ax_o = ng.make_axes([
+        spatial_axis(ax_i, fshape['J'], padding['pad_c'], strides['str_c'], role=ar.Channel),
+        spatial_axis(ax_i, fshape['T'], padding['pad_d'], strides['str_d'], role=ar.Depth),
+        spatial_axis(ax_i, fshape['R'], padding['pad_h'], strides['str_h'], role=ar.Height),
+        spatial_axis(ax_i, fshape['S'], padding['pad_w'], strides['str_w'], role=ar.Width),
+        ax.N
+    ])
+
+    output = ng.pooling(pool_params, inputs, axes=ax_o)
+    delta = ng.placeholder(axes=ax_o)
+    error = ng.sum(output * delta, out_axes=())
+    d_inputs = ng.deriv(error, inputs)
+
+    if op == 'max':
+        # The window has 24 elements, so its argmax fits in a byte
+        assert output.args[1].dtype == np.uint8
+        # It is only needed from the pooling to its bprop
+        assert not output.args[1].persistent
+
+    input_value = rng.uniform(-1, 1, ax_i)
+    delta_value = rng.uniform(-1, 1, ax_o)
+
+    result_ng, gradI_ng = executor([output, d_inputs], inputs, delta)(input_value, delta_value)
+    result_np, gradI_np = reference_pool(input_value, delta_value, fshape, padding, strides, op,
+                                         ax_o.lengths)
+
+    np.testing.assert_allclose(result_ng, result_np, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(gradI_ng, gradI_np, rtol=0, atol=1e-6)
+
+
+def test_pooling_windows_in_padding():
+    """
+    Pooling windows that lie entirely in the padding have no maximum or average.
+    """
+    ax_i = ng.make_axes([ax.C, ax.D, ax.H, ax.W, ax.N])
+    ax_i.set_shape((2, 1, 4, 4, 2))
+    inputs = ng.placeholder(axes=ax_i)
+
+    pool_params = dict(op='avg', J=1, T=1, R=2, S=2, pad_c=0, pad_d=0, pad_h=2, pad_w=0,
+                       str_c=1, str_d=1, str_h=1, str_w=1)
+    ax_o = ng.make_axes([
+        spatial_axis(ax_i, 1, 0, 1, role=ar.Channel),
+        spatial_axis(ax_i, 1, 0, 1, role=ar.Depth),
+        spatial_axis(ax_i, 2, 2, 1, role=ar.Height),
+        spatial_axis(ax_i, 2, 0, 1, role=ar.Width),
+        ax.N
+    ])
+
+    with pytest.raises(ValueError):
+        ng.pooling(pool_params, inputs, axes=ax_o)
@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test returning results in caller arrays and rotating result buffers.
+"""
+import numpy as np
+import pytest
+
+import ngraph as ng
+from ngraph.transformers.nptransform import NumPyTransformer
+
+
+def sum_and_doubled(**kwargs):
+    """
+    Returns:
+        The placeholder, the results and a computation of both results.
+    """
+    C = ng.make_axis(6, name='C')
+    N = ng.make_axis(4, name='N')
+    x = ng.placeholder([C, N])
+    total = ng.sum(x, out_axes=())
+    doubled = 2 * x
+    transformer = NumPyTransformer()
+    return x, total, doubled, transformer.computation([total, doubled], x, **kwargs)
+
+
+def batches(n):
+    return [np.arange(24, dtype=np.float32).reshape(6, 4) * (i + 1) for i in range(n)]
+
+
+def test_results_into_out():
+    """
+    Results are copied into the arrays passed as out, which later calls leave alone.
+    """
+    x, total, doubled, computation = sum_and_doubled()
+    a, b = batches(2)
+    out = np.empty((6, 4), dtype=np.float32)
+    a_total, a_doubled = computation(a, out=[None, out])
+    assert a_doubled is out
+    a_total = np.copy(a_total)
+
+    computation(b)
+    np.testing.assert_allclose(a_total, np.sum(a))
+    np.testing.assert_allclose(out, 2 * a)
+
+    scalar_out = np.empty((), dtype=np.float32)
+    b_total, _ = computation(b, out=(scalar_out, None))
+    assert b_total is scalar_out
+    np.testing.assert_allclose(scalar_out, np.sum(b))
+
+    with pytest.raises(ValueError):
+        computation(a, out=[out])
+
+
+def test_set_results_into_out():
+    """
+    Set returns are keyed by the ops they were made for, as is out.
+    """
+    C = ng.make_axis(6, name='C')
+    N = ng.make_axis(4, name='N')
+    x = ng.placeholder([C, N])
+    doubled = 2 * x
+    halved = x / 2
+    computation = NumPyTransformer().computation({doubled, halved}, x)
+    a, = batches(1)
+    out = np.empty((6, 4), dtype=np.float32)
+    results = computation(a, out={halved: out})
+    assert results[halved] is out
+    np.testing.assert_allclose(results[halved], a / 2)
+    np.testing.assert_allclose(results[doubled], 2 * a)
+
+
+def test_rotating_result_buffers():
+    """
+    With N result buffers the results of a call stay valid for N calls.
+    """
+    x, total, doubled, computation = sum_and_doubled(result_buffers=2)
+    values = batches(4)
+    results = [computation(value) for value in values]
+    for value, (value_total, value_doubled) in list(zip(values, results))[-2:]:
+        np.testing.assert_allclose(value_total, np.sum(value))
+        np.testing.assert_allclose(value_doubled, 2 * value)
+
+    # The buffers are reused rather than allocated for each call
+    assert results[0][1] is results[2][1]
+    assert results[1][1] is results[3][1]
+    assert results[0][1] is not results[1][1]
+
+
+def test_result_buffers_must_be_positive():
+    with pytest.raises(ValueError):
+        sum_and_doubled(result_buffers=0)
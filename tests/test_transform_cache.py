@@ -0,0 +1,121 @@
+# ----------------------------------------------------------------------------
+# Copyright 2016 Nervana Systems Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ----------------------------------------------------------------------------
+"""
+Test the on-disk cache of transformations.
+"""
+import os
+import types
+
+import numpy as np
+
+import ngraph as ng
+from ngraph.transformers.cache import TransformCache, code_version
+from ngraph.transformers.nptransform import NumPyTransformer
+
+
+def training_step(cache_dir, scale=3.0):
+    """
+    Builds a new graph updating a variable, and the transformer computing it.
+
+    The cost does not read the updated variable, as nothing orders that read before
+    or after the update.
+
+    Returns:
+        The transformer, the update computation and the computation reading the variable.
+    """
+    C = ng.make_axis(20, name='C')
+    N = ng.make_axis(8, name='N', batch=True)
+    x = ng.placeholder([C, N])
+    w = ng.variable([C], initial_value=np.arange(20, dtype=np.float32))
+    v = ng.variable([C], initial_value=np.arange(20, dtype=np.float32))
+    cost = ng.sum(ng.tanh(x) * w * scale, reduction_axes=[C])
+    update = ng.assign(v, v + ng.sum(x, reduction_axes=[N]))
+
+    transformer = NumPyTransformer(cache_dir=cache_dir)
+    step = transformer.computation([cost, update], x)
+    weights = transformer.computation(v)
+    return transformer, step, weights
+
+
+def run(step, weights):
+    x = np.linspace(0, 1, 160, dtype=np.float32).reshape(20, 8)
+    costs = [np.copy(step(x)[0]) for _ in range(2)]
+    return costs, np.copy(weights())
+
+
+def test_cached_transformation_matches(tmpdir):
+    """
+    A second graph with the same structure is loaded from the cache, and computes the
+    same values without being transformed.
+    """
+    cache_dir = str(tmpdir)
+    _, step, weights = training_step(None)
+    expected = run(step, weights)
+
+    _, step, weights = training_step(cache_dir)
+    first = run(step, weights)
+    assert len(os.listdir(cache_dir)) == 1
+
+    transformer, step, weights = training_step(cache_dir)
+    cached = run(step, weights)
+    assert not hasattr(transformer, 'dataflow')
+
+    for costs in (first, cached):
+        for result, expected_result in zip(costs[0], expected[0]):
+            np.testing.assert_allclose(result, expected_result, rtol=1e-6)
+        np.testing.assert_allclose(costs[1], expected[1])
+
+
+def test_different_constants_are_not_shared(tmpdir):
+    """
+    Graphs that only differ by a constant have different fingerprints.
+    """
+    cache_dir = str(tmpdir)
+    run(*training_step(cache_dir)[1:])
+    costs, _ = run(*training_step(cache_dir, scale=2.0)[1:])
+    assert len(os.listdir(cache_dir)) == 2
+
+    expected, _ = run(*training_step(None, scale=2.0)[1:])
+    np.testing.assert_allclose(costs[0], expected[0], rtol=1e-6)
+
+
+def test_code_version_covers_package(tmpdir):
+    """
+    Changing any module of a package changes its code version.
+    """
+    package = tmpdir.mkdir('package')
+    package.join('__init__.py').write('')
+    module = package.mkdir('sub').join('module.py')
+    module.write('x = 1\n')
+    loaded = types.ModuleType('package')
+    loaded.__file__ = str(package.join('__init__.py'))
+    loaded.__path__ = [str(package)]
+    versions = []
+    for source in ('x = 1\n', 'x = 2\n'):
+        module.write(source)
+        versions.append(code_version(loaded))
+    assert versions[0] != versions[1]
+
+
+def test_stale_transformation_is_a_miss(tmpdir):
+    """
+    Saved transformations that refer to code that no longer exists are not loaded.
+    """
+    cache = TransformCache(str(tmpdir))
+    for digest, data in (('attribute', b'cngraph.transformers.cache\nno_such_name\n.'),
+                         ('module', b'cno_such_module\nno_such_name\n.')):
+        with open(cache.path(digest), 'wb') as f:
+            f.write(data)
+        assert cache.load(digest) is None